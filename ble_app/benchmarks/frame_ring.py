@@ -0,0 +1,105 @@
+"""
+Frame transport from a capture process to an inference process.
+
+Frames go to a reader process either pickled through a multiprocessing.Queue,
+or written into a FrameRing with only their (slot, seq) sent through the
+queue, the reader getting a view of the shared memory. The reader only
+samples each frame, so the numbers are the transport cost. Frames are
+synthetic, or with --raw read from a memory-mapped raw video file (see
+RawVideo), which measures ingestion at disk speed.
+
+    python -m ble_app.benchmarks.frame_ring [--frames 1000] [--raw video.raw --shape 480 640 3]
+"""
+
+import argparse
+import multiprocessing
+import time
+
+import numpy as np
+
+from ..vision.frame_ring import FrameRing, RawVideo
+
+
+def read_queue(frames, done):
+    total = 0
+    while (message := frames.get()) is not None:
+        total += int(message[::64, ::64, 0].sum())
+    done.put(total)
+
+
+def read_ring(ring_name, frames, done):
+    ring = FrameRing(ring_name)
+    total, torn = 0, 0
+    while (message := frames.get()) is not None:
+        slot, seq = message
+        view = ring.acquire(0, slot, seq)
+        if view is not None:
+            total += int(view[::64, ::64, 0].sum())
+        if view is None or not ring.release(0, slot, seq):
+            torn += 1
+    ring.close()
+    done.put(torn)
+
+
+def run_queue(ctx, source, count):
+    frames, done = ctx.Queue(maxsize=4), ctx.Queue()
+    reader = ctx.Process(target=read_queue, args=(frames, done))
+    reader.start()
+    start = time.perf_counter()
+    for i in range(count):
+        frames.put(source[i % len(source)])
+    frames.put(None)
+    done.get()
+    elapsed = time.perf_counter() - start
+    reader.join()
+    return elapsed, 0
+
+
+def run_ring(ctx, source, count, slots):
+    ring = FrameRing(create=True, slots=slots, frame_bytes=source[0].nbytes)
+    frames, done = ctx.Queue(maxsize=slots - 2), ctx.Queue()
+    reader = ctx.Process(target=read_ring, args=(ring.name, frames, done))
+    reader.start()
+    start = time.perf_counter()
+    for i in range(count):
+        written = None
+        while written is None:
+            written = ring.write(source[i % len(source)])
+        # With at most slots - 2 queued and one held, the writer never reuses a frame not read yet
+        frames.put(written)
+    frames.put(None)
+    torn = done.get()
+    elapsed = time.perf_counter() - start
+    reader.join()
+    ring.close()
+    return elapsed, torn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=1000, help='frames to send')
+    parser.add_argument('--raw', help='raw video file to read the frames from')
+    parser.add_argument('--shape', type=int, nargs=3, default=(480, 640, 3), help='frame height, width and channels')
+    parser.add_argument('--slots', type=int, default=8, help='ring slots')
+    args = parser.parse_args()
+
+    if args.raw:
+        source = RawVideo(args.raw, args.shape)
+        name = f'{args.raw} ({len(source)} frames)'
+    else:
+        rng = np.random.default_rng(0)
+        source = [rng.integers(0, 256, args.shape, dtype=np.uint8) for _ in range(8)]
+        name = 'synthetic'
+    frame_mb = source[0].nbytes / 1e6
+
+    ctx = multiprocessing.get_context('spawn')
+    print(f'{name}, {args.frames} frames of {"x".join(map(str, args.shape))}')
+    for label, (elapsed, torn) in (('queue (pickled)', run_queue(ctx, source, args.frames)),
+                                   ('frame ring', run_ring(ctx, source, args.frames, args.slots))):
+        fps = args.frames / elapsed
+        print(f'  {label:<16} {fps:8.1f} fps  {fps * frame_mb:8.1f} MB/s  {elapsed / args.frames * 1e6:8.1f} us/frame'
+              f'  torn {torn}')
+
+
+if __name__ == '__main__':
+    main()
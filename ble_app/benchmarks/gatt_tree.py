@@ -0,0 +1,82 @@
+"""
+GetManagedObjects / GetAll latency on large GATT trees, cached vs rebuilt.
+
+The objects are created with dbus.service.Object.__init__ patched out, so
+nothing is exported, no bus is needed, and only the Python side of the calls
+is measured.
+
+    python -m ble_app.benchmarks.gatt_tree
+"""
+
+import argparse
+import time
+
+from unittest import mock
+
+import dbus.service
+
+from ..services.gatt import Application, Service, Characteristic, Descriptor, GATT_CHRC_IFACE
+
+
+def build_tree(services, chrcs_per_service, descs_per_chrc):
+    # dbus-python refuses an object path without a connection; skip the export altogether
+    with mock.patch.object(dbus.service.Object, '__init__', lambda self, *args, **kwargs: None):
+        return _build_tree(services, chrcs_per_service, descs_per_chrc)
+
+
+def _build_tree(services, chrcs_per_service, descs_per_chrc):
+    app = Application(None)
+    for i in range(services):
+        service = Service(None, i, '12345678-1234-5678-1234-56789abcdef0', True)
+        for j in range(chrcs_per_service):
+            chrc = Characteristic(None, j, '12345678-1234-5678-1234-56789abcdef1', ['read', 'notify'], service)
+            for k in range(descs_per_chrc):
+                chrc.add_descriptor(Descriptor(None, k, '2901', ['read'], chrc))
+            service.add_characteristic(chrc)
+        app.add_service(service)
+    return app
+
+
+def drop_caches(app):
+    app.managed_objects = None
+    for service in app.services:
+        service._properties = service._managed_objects = None
+        for chrc in service.characteristics:
+            chrc._properties = None
+            for desc in chrc.descriptors:
+                desc._properties = None
+
+
+def measure(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f'{"objects":>8} {"rebuilt us":>11} {"cached us":>10} {"GetAll rebuilt":>15} {"GetAll cached":>14}')
+    for services, chrcs, descs in ((4, 5, 1), (10, 10, 2), (20, 10, 3), (50, 10, 3)):
+        app = build_tree(services, chrcs, descs)
+        objects = len(app.GetManagedObjects())
+        chrc = app.services[-1].characteristics[-1]
+
+        def rebuilt():
+            drop_caches(app)
+            app.GetManagedObjects()
+
+        def getall_rebuilt():
+            chrc._properties = None
+            chrc.GetAll(GATT_CHRC_IFACE)
+
+        app.GetManagedObjects()
+        print(f'{objects:>8} {measure(rebuilt, args.repeat):>11.1f} {measure(app.GetManagedObjects, args.repeat):>10.2f}'
+              f' {measure(getall_rebuilt, args.repeat):>15.2f} {measure(lambda: chrc.GetAll(GATT_CHRC_IFACE), args.repeat):>14.2f}')
+
+
+if __name__ == '__main__':
+    main()
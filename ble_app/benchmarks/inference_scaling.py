@@ -0,0 +1,116 @@
+"""
+Hand detection throughput with 1 to N detector processes.
+
+Frames are submitted to an InferencePool as fast as it accepts them, or at
+--fps, and its results put back in capture order by a ReorderBuffer. For each
+pool size: frames per second out, end to end latency from submission to output
+(median, 99th percentile and max), the longest time a result was held for
+reordering, and the stale and skipped frames.
+
+The synthetic detector burns `--cost` ms of CPU per frame, with a random
+`--jitter` so results complete out of order; --detector mediapipe runs the real
+hand model on a blank frame instead.
+
+    python -m ble_app.benchmarks.inference_scaling [--max-workers 4] [--frames 300]
+"""
+
+import argparse
+import functools
+import os
+import time
+
+import numpy as np
+
+from ..vision.pipeline import InferencePool, ReorderBuffer
+
+POINTS = [(0.5, 0.5, 0.0)] * 21
+
+
+class SyntheticDetector:
+    def __init__(self, model_complexity=0, cost_ms=20.0, jitter=0.5):
+        self.model_complexity = model_complexity
+        self.cost = cost_ms / 1000
+        self.jitter = jitter
+        self.rng = np.random.default_rng(os.getpid())
+
+    def set_model_complexity(self, model_complexity):
+        self.model_complexity = model_complexity
+
+    def process(self, image):
+        deadline = time.perf_counter() + self.cost * (1.0 + self.jitter * self.rng.random())
+        while time.perf_counter() < deadline:
+            image.sum()
+        return POINTS
+
+    def close(self):
+        pass
+
+
+def mediapipe_detector(model_complexity=0):
+    from ..vision.gesture import HandDetector
+    return HandDetector(model_complexity)
+
+
+def run_pool(factory, workers, frames, image, fps, max_delay_ms, depth):
+    pool = InferencePool(factory, workers, depth=depth)
+    pool.wait_ready()
+    reorder = ReorderBuffer(max_delay_ms)
+    latency = []
+
+    def drain(timeout=0.0):
+        for seq, _, _, submitted in pool.collect(timeout):
+            reorder.push(seq, submitted)
+        now = time.monotonic()
+        latency.extend(now - submitted for _, submitted in reorder.pop(now))
+
+    start = time.monotonic()
+    for i in range(frames):
+        if fps:
+            time.sleep(max(0.0, start + i / fps - time.monotonic()))
+        while pool.busy:
+            drain(reorder.max_delay)
+        pool.submit(image, time.monotonic())
+        drain()
+    while any(pool.in_flight):
+        drain(reorder.max_delay)
+    while reorder.pending:
+        time.sleep(reorder.max_delay)
+        drain()
+    elapsed = time.monotonic() - start
+    pool.close()
+
+    latency = np.array(latency) * 1000
+    return len(latency) / elapsed, latency, reorder, pool.dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count(), help='largest pool size')
+    parser.add_argument('--frames', type=int, default=300, help='frames per pool size')
+    parser.add_argument('--fps', type=float, default=0, help='submission rate, 0 for as fast as possible')
+    parser.add_argument('--detector', choices=('synthetic', 'mediapipe'), default='synthetic')
+    parser.add_argument('--cost', type=float, default=20, help='synthetic detection time per frame in ms')
+    parser.add_argument('--jitter', type=float, default=0.5, help='synthetic detection time spread, fraction of --cost')
+    parser.add_argument('--max-delay', type=float, default=100, help='reorder buffer wait limit in ms')
+    parser.add_argument('--depth', type=int, default=2, help='frames in flight per worker')
+    args = parser.parse_args()
+
+    if args.detector == 'mediapipe':
+        factory = mediapipe_detector
+    else:
+        factory = functools.partial(SyntheticDetector, cost_ms=args.cost, jitter=args.jitter)
+    image = np.zeros((240, 320, 3), dtype=np.uint8)
+
+    base = None
+    for workers in range(1, args.max_workers + 1):
+        rate, latency, reorder, dropped = run_pool(factory, workers, args.frames, image, args.fps,
+                                                   args.max_delay, args.depth)
+        base = base or rate
+        print(f'{workers:>2} workers {rate:7.1f} fps (x{rate / base:4.2f})  '
+              f'latency {np.median(latency):6.1f} / {np.percentile(latency, 99):6.1f} / {latency.max():6.1f} ms  '
+              f'reorder wait max {reorder.max_wait * 1000:6.1f} ms  '
+              f'stale {reorder.stale}  skipped {reorder.skipped}  dropped {dropped}')
+
+
+if __name__ == '__main__':
+    main()
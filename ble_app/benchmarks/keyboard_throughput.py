@@ -0,0 +1,70 @@
+"""
+Keyboard text streaming throughput against a mock BlueZ.
+
+Sends a text through the same pacing policy as `Report1Characteristic.send`
+(`reports_per_tick` reports every `tick_ms`) and reports delivered chars/sec
+and dropped notifications for each setting.
+
+    python -m ble_app.benchmarks.keyboard_throughput
+"""
+
+import argparse
+import time
+
+from collections import deque
+
+from ..services.keyboard_codec import KeyboardReportEncoder, REPORT_MODES
+from .mock_bluez import MockBlueZ
+
+SAMPLE_TEXT = 'The quick brown fox jumps over the lazy dog. 0123456789 !@#$%^&*()\n'
+
+
+def run(text, mode, tick_ms, reports_per_tick, conn_interval_ms, per_event):
+    bluez = MockBlueZ(conn_interval_ms=conn_interval_ms, per_event=per_event)
+    pending = deque(KeyboardReportEncoder(mode).text_reports(text))
+    report_count = len(pending)
+
+    now_ms = 0.0
+    while pending:
+        now_ms += tick_ms
+        bluez.advance(now_ms)
+        for _ in range(min(reports_per_tick, len(pending))):
+            bluez.notify(pending.popleft())
+    bluez.flush()
+
+    elapsed_s = bluez.delivered[-1][0] / 1000 if bluez.delivered else float('inf')
+    return report_count, len(text) / elapsed_s, bluez.dropped
+
+
+def encode_rate(text, mode, repeat=200):
+    encoder = KeyboardReportEncoder(mode)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _ in encoder.text_reports(text):
+            pass
+    return len(text) * repeat / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20, help='copies of the sample text to send')
+    parser.add_argument('--conn-interval', type=float, default=7.5, help='connection interval in ms')
+    parser.add_argument('--per-event', type=int, default=4, help='notifications per connection event')
+    args = parser.parse_args()
+
+    text = SAMPLE_TEXT * args.repeat
+    print(f'{len(text)} chars, conn interval {args.conn_interval} ms, {args.per_event} notifications/event')
+    print(f'{"mode":>8} {"tick_ms":>7} {"per_tick":>8} {"reports":>8} {"chars/s":>9} {"dropped":>8}')
+    for mode in REPORT_MODES:
+        for tick_ms in (8, 15, 30):
+            for reports_per_tick in (1, 2, 4, 8):
+                reports, rate, dropped = run(text, mode, tick_ms, reports_per_tick,
+                                             args.conn_interval, args.per_event)
+                print(f'{mode:>8} {tick_ms:>7} {reports_per_tick:>8} {reports:>8} {rate:>9.1f} {dropped:>8}')
+
+    for mode in REPORT_MODES:
+        print(f'encoder {mode}: {encode_rate(text, mode):,.0f} chars/s')
+
+
+if __name__ == '__main__':
+    main()
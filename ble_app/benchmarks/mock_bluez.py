@@ -0,0 +1,42 @@
+"""
+Minimal stand-in for BlueZ and the LE controller used by the benchmarks.
+
+Notifications handed to `notify` go into a bounded controller queue. Every
+connection event the controller transmits up to `per_event` of them, and any
+notification arriving while the queue is full is dropped, as a real controller
+does when the host outpaces the link.
+"""
+
+from collections import deque
+
+
+class MockBlueZ:
+    def __init__(self, conn_interval_ms=7.5, per_event=4, queue_len=8):
+        self.conn_interval_ms = conn_interval_ms
+        self.per_event = per_event
+        self.queue = deque()
+        self.queue_len = queue_len
+        self.now_ms = 0.0
+        self.next_event_ms = conn_interval_ms
+        self.delivered = []
+        self.dropped = 0
+
+    def advance(self, now_ms):
+        while self.next_event_ms <= now_ms:
+            for _ in range(min(self.per_event, len(self.queue))):
+                self.delivered.append((self.next_event_ms, self.queue.popleft()))
+            self.next_event_ms += self.conn_interval_ms
+        self.now_ms = now_ms
+
+    def notify(self, value):
+        if len(self.queue) >= self.queue_len:
+            self.dropped += 1
+            return
+        self.queue.append(bytes(value))
+
+    def flush(self):
+        while self.queue:
+            self.advance(self.next_event_ms)
+
+    def PropertiesChanged(self, interface, changed, invalidated):
+        self.notify(changed['Value'])
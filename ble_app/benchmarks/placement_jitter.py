@@ -0,0 +1,116 @@
+"""
+Notify interval jitter of the GLib main loop under vision load, per placement profile.
+
+Each profile runs in its own process. A GLib timer of --interval ms stands in
+for a notifying characteristic on the main loop, pinned as the main role.
+Meanwhile a capture thread converts, resizes and blurs camera-sized frames
+with OpenCV, and an InferencePool of synthetic detectors keeps --workers
+processes busy. Reported: how far the timer intervals land from nominal,
+mean, 99th percentile and max, and how many frames the load processed.
+
+    python -m ble_app.benchmarks.placement_jitter [--profiles none shared isolated] [--seconds 10]
+"""
+
+import argparse
+import functools
+import multiprocessing
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from gi.repository import GLib as GObject
+
+from ..vision.pipeline import InferencePool
+from ..vision.placement import Placement
+from .inference_scaling import SyntheticDetector
+
+
+def capture_load(placement, stop, counts):
+    placement.pin('capture')
+    frame = np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    while not stop.is_set():
+        image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        image = cv2.resize(image, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+        cv2.GaussianBlur(image, (9, 9), 0)
+        counts['capture'] += 1
+
+
+def inference_load(pool, stop, counts):
+    image = np.zeros((240, 320, 3), dtype=np.uint8)
+    while not stop.is_set():
+        if pool.busy:
+            counts['inference'] += len(pool.collect(0.05))
+        else:
+            pool.submit(image)
+    counts['inference'] += len(pool.collect(0.0))
+
+
+def run_profile(spec, seconds, interval_ms, workers, cost_ms, results):
+    placement = Placement.parse(spec)
+    placement.configure_process()
+
+    # Pinned like a capture thread, which would create the pool
+    placement.pin('capture')
+    pool = InferencePool(functools.partial(SyntheticDetector, cost_ms=cost_ms, jitter=0.0), workers,
+                         placement=placement)
+    pool.wait_ready()
+    placement.pin('main')
+
+    stop = threading.Event()
+    counts = {'capture': 0, 'inference': 0}
+    threads = [threading.Thread(target=capture_load, args=(placement, stop, counts)),
+               threading.Thread(target=inference_load, args=(pool, stop, counts))]
+    for thread in threads:
+        thread.start()
+
+    ticks = []
+    mainloop = GObject.MainLoop()
+
+    def tick():
+        ticks.append(time.monotonic())
+        return True
+
+    GObject.timeout_add(interval_ms, tick)
+    GObject.timeout_add(int(seconds * 1000), mainloop.quit)
+    mainloop.run()
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+    pool.close()
+
+    deviation = np.abs(np.diff(ticks) * 1000 - interval_ms)
+    results.put((repr(placement), deviation, counts['capture'] / seconds, counts['inference'] / seconds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', nargs='+', default=['none', 'shared', 'isolated'],
+                        help='profile names or placement settings, see vision.placement')
+    parser.add_argument('--seconds', type=float, default=10, help='run time per profile')
+    parser.add_argument('--interval', type=int, default=8, help='timer interval in ms')
+    parser.add_argument('--workers', type=int, default=2, help='inference processes')
+    parser.add_argument('--cost', type=float, default=30, help='synthetic detection time per frame in ms')
+    args = parser.parse_args()
+
+    for spec in args.profiles:
+        # Report a bad setting here rather than from the profile process
+        Placement.parse(spec)
+
+    ctx = multiprocessing.get_context('spawn')
+    for spec in args.profiles:
+        results = ctx.Queue()
+        process = ctx.Process(target=run_profile,
+                              args=(spec, args.seconds, args.interval, args.workers, args.cost, results))
+        process.start()
+        placement, deviation, capture_fps, inference_fps = results.get()
+        process.join()
+        print(f'{spec}: {placement}')
+        print(f'  jitter {deviation.mean():6.2f} / {np.percentile(deviation, 99):6.2f} / {deviation.max():6.2f} ms'
+              f'  ({len(deviation)} intervals)  capture {capture_fps:6.1f} fps  inference {inference_fps:6.1f} fps')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Relative mouse delta engine over recorded cursor traces.
+
+A trace is a CSV file with a `t,x,y` row per camera frame, x and y being the
+normalized (0 ~ 1) cursor position. Without --trace a synthetic trace mixing
+slow drags and fast flicks is used. For each trace, the accumulator is compared
+with clamping and rounding every frame: reports sent, counts lost, and cost per frame.
+
+    python -m ble_app.benchmarks.relative_motion [--trace session.csv ...]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from ..services.relative_motion import DeltaAccumulator
+
+COUNTS_PER_UNIT = 1500
+
+
+def load_trace(path):
+    data = np.loadtxt(path, delimiter=',', skiprows=1, ndmin=2)
+    return data[:, 1:3]
+
+
+def synthetic_trace(frames=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(frames) / 30.0
+    slow = 0.5 + 0.3 * np.stack([np.sin(t * 0.7), np.cos(t * 0.5)], axis=1)
+    flicks = np.cumsum(rng.normal(0, 0.002, (frames, 2)) + (rng.random((frames, 1)) < 0.01) * rng.normal(0, 0.15, (frames, 2)), axis=0)
+    return slow + flicks
+
+
+def run_accumulator(deltas):
+    acc = DeltaAccumulator()
+    reports, sent = 0, np.zeros(2)
+    start = time.perf_counter()
+    for dx, dy in deltas.tolist():
+        for sx, sy in acc.add(dx, dy, accelerate=False):
+            reports += 1
+            sent += sx, sy
+    elapsed = time.perf_counter() - start
+    return reports, sent, elapsed
+
+
+def run_naive(deltas):
+    reports, sent = 0, np.zeros(2)
+    start = time.perf_counter()
+    for dx, dy in deltas.tolist():
+        x, y = max(-127, min(127, round(dx))), max(-127, min(127, round(dy)))
+        if x or y:
+            reports += 1
+            sent += x, y
+    elapsed = time.perf_counter() - start
+    return reports, sent, elapsed
+
+
+def run_accelerated(deltas):
+    acc = DeltaAccumulator()
+    start = time.perf_counter()
+    reports = sum(len(acc.add(dx, dy)) for dx, dy in deltas.tolist())
+    return reports, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trace', nargs='*', default=[], help='recorded t,x,y CSV traces')
+    args = parser.parse_args()
+
+    traces = [(path, load_trace(path)) for path in args.trace] or [('synthetic', synthetic_trace())]
+    for name, positions in traces:
+        deltas = np.diff(positions, axis=0) * COUNTS_PER_UNIT
+        ideal = deltas.sum(axis=0)
+        frames = len(deltas)
+        print(f'{name}: {frames} frames, net motion ({ideal[0]:.0f}, {ideal[1]:.0f}) counts')
+
+        for label, run in (('accumulator', run_accumulator), ('naive', run_naive)):
+            reports, sent, elapsed = run(deltas)
+            lost = np.abs(ideal - sent).sum()
+            print(f'  {label:<12} {reports:>6} reports  lost {lost:>8.1f} counts  {elapsed / frames * 1e6:6.2f} us/frame')
+
+        reports, elapsed = run_accelerated(deltas)
+        print(f'  {"accelerated":<12} {reports:>6} reports  {elapsed / frames * 1e6:6.2f} us/frame')
+
+
+if __name__ == '__main__':
+    main()
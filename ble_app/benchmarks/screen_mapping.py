@@ -0,0 +1,78 @@
+"""
+Per frame cost and accuracy of the camera to screen mapping.
+
+Random tip positions around a calibrated region are mapped four ways: the
+previous linear map of the full frame to 0 ~ 127, the homography evaluated
+for each tip, a single read of the nearest table node, and the bilinear
+ScreenMapping lookup. Reported: time per tip, and the error of each table
+lookup against the exact homography, in cursor units of the 0 ~ CURSOR_MAX
+range, for each --grid size.
+
+    python -m ble_app.benchmarks.screen_mapping [--tips 100000] [--grid 256 512 1024]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from ..vision.calibration import CURSOR_MAX, ScreenMapping
+
+CORNERS = ((0.72, 0.18), (0.28, 0.22), (0.31, 0.74), (0.69, 0.70))
+
+
+def linear(x, y):
+    return max(int(127 * (1.0 - x)), 0), max(int(127 * y), 0)
+
+
+def exact(homography):
+    def mapping(x, y):
+        u, v, w = homography @ (x, y, 1.0)
+        return round(min(max(u / w, 0.0), 1.0) * CURSOR_MAX), round(min(max(v / w, 0.0), 1.0) * CURSOR_MAX)
+    return mapping
+
+
+def nearest(mapping):
+    def lookup(x, y):
+        last = mapping.grid - 1
+        row = min(max(int(y * last + 0.5), 0), last)
+        column = min(max(int(x * last + 0.5), 0), last)
+        i = 2 * (row * mapping.grid + column)
+        return min(max(mapping.table[i], 0), CURSOR_MAX), min(max(mapping.table[i + 1], 0), CURSOR_MAX)
+    return lookup
+
+
+def time_per_tip(mapping, tips):
+    start = time.perf_counter()
+    mapped = [mapping(x, y) for x, y in tips]
+    return (time.perf_counter() - start) / len(tips), np.array(mapped)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tips', type=int, default=100000, help='tip positions to map')
+    parser.add_argument('--grid', type=int, nargs='+', default=[256, 512, 1024], help='lookup table sizes')
+    parser.add_argument('--margin', type=float, default=0.05, help='dead margin of the calibration')
+    args = parser.parse_args()
+
+    tips = np.random.default_rng(0).uniform(0.1, 0.9, (args.tips, 2)).tolist()
+
+    cost, _ = time_per_tip(linear, tips)
+    print(f'  {"linear 0 ~ 127":<22} {cost * 1e6:6.2f} us/tip')
+    reference = ScreenMapping(CORNERS, args.margin, grid=2)
+    cost, truth = time_per_tip(exact(reference.homography), tips)
+    print(f'  {"homography":<22} {cost * 1e6:6.2f} us/tip')
+    for grid in args.grid:
+        start = time.perf_counter()
+        mapping = ScreenMapping(CORNERS, args.margin, grid)
+        bake = time.perf_counter() - start
+        size = len(mapping.table) * mapping.table.itemsize
+        print(f'  lookup table {grid}, baked in {bake * 1000:.1f} ms ({size / 1e6:.1f} MB)')
+        for name, lookup in (('nearest node', nearest(mapping)), ('bilinear', mapping)):
+            cost, mapped = time_per_tip(lookup, tips)
+            error = np.abs(mapped - truth).max(axis=1)
+            print(f'    {name:<20} {cost * 1e6:6.2f} us/tip  error {error.mean():6.1f} mean {error.max():6.0f} max')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Per-frame cost of tracking two hands compared with one.
+
+The gesture stage (features, identity association and click state) runs on
+synthetic landmark traces of one and two moving hands, with the features of
+both hands computed in one batch and, for comparison, one hand at a time.
+With --video, the MediaPipe detection of each frame of a recording is timed
+too, with max_num_hands 1 and 2.
+
+    python -m ble_app.benchmarks.two_hands [--frames 3000] [--video hands.mp4]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from ..vision.hands import HandAssociator, PinchClick, hand_features
+
+LANDMARK_COUNT = 21
+
+
+def synthetic_hands(hands, frames=3000, seed=0):
+    """
+    (frames, hands, 21, 3) landmarks of hands drifting around their own side of the frame.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(frames)[:, None] / 30.0
+    centers = np.stack([0.3 + 0.4 * np.arange(hands) / max(1, hands - 1) + 0.1 * np.sin(t * 0.7),
+                        0.5 + 0.2 * np.cos(t * 0.5 + np.arange(hands))], axis=-1)
+    shape = rng.normal(0, 0.05, (hands, LANDMARK_COUNT, 3))
+    jitter = rng.normal(0, 0.003, (frames, hands, LANDMARK_COUNT, 3))
+    landmarks = shape[None] + jitter
+    landmarks[..., :2] += centers[:, :, None, :]
+    return landmarks.astype(np.float32)
+
+
+def run_gesture(landmarks, batched):
+    hands = landmarks.shape[1]
+    labels = ['Right', 'Left'][:hands]
+    associator = HandAssociator(max_hands=hands)
+    start = time.perf_counter()
+    for frame in landmarks:
+        if batched:
+            features = hand_features(frame)
+            centroids, pinched = features.centroid, features.pinched
+        else:
+            per_hand = [hand_features(frame[i:i + 1]) for i in range(hands)]
+            centroids = np.vstack([features.centroid for features in per_hand])
+            pinched = [bool(features.pinched[0]) for features in per_hand]
+        for track, hand_pinched in zip(associator.update(labels, centroids), pinched):
+            track.click.update(hand_pinched)
+    return (time.perf_counter() - start) / len(landmarks)
+
+
+def run_single_hand_baseline(landmarks):
+    # What HandGestureTracker.interpret costs for one hand, without identity tracking
+    click = PinchClick()
+    start = time.perf_counter()
+    for frame in landmarks:
+        points = frame[0]
+        xs, ys = points[:, 0].tolist(), points[:, 1].tolist()
+        _ = min(xs), min(ys), max(xs), max(ys)
+        click.update(points[4, 1] - points[8, 1] < 0.1)
+    return (time.perf_counter() - start) / len(landmarks)
+
+
+def run_detection(path, max_num_hands, limit):
+    import cv2
+    from ..vision.gesture import HandDetector
+
+    cap = cv2.VideoCapture(path)
+    detector = HandDetector(max_num_hands=max_num_hands)
+    elapsed, frames, found = 0.0, 0, 0
+    while frames < limit:
+        success, image = cap.read()
+        if not success:
+            break
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        start = time.perf_counter()
+        found += len(detector.process(image))
+        elapsed += time.perf_counter() - start
+        frames += 1
+    cap.release()
+    detector.close()
+    return elapsed / max(1, frames), found / max(1, frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=3000, help='synthetic frames')
+    parser.add_argument('--video', help='recording to time the MediaPipe detection on')
+    args = parser.parse_args()
+
+    one, two = synthetic_hands(1, args.frames), synthetic_hands(2, args.frames)
+    print(f'gesture stage, {args.frames} frames')
+    print(f'  {"1 hand, single hand tracker":<32} {run_single_hand_baseline(one) * 1e6:7.1f} us/frame')
+    print(f'  {"1 hand, batched":<32} {run_gesture(one, True) * 1e6:7.1f} us/frame')
+    print(f'  {"2 hands, batched":<32} {run_gesture(two, True) * 1e6:7.1f} us/frame')
+    print(f'  {"2 hands, one at a time":<32} {run_gesture(two, False) * 1e6:7.1f} us/frame')
+
+    if args.video:
+        print(f'detection, {args.video}')
+        for hands in (1, 2):
+            cost, found = run_detection(args.video, hands, args.frames)
+            print(f'  max_num_hands={hands}  {cost * 1000:6.2f} ms/frame  {found:.2f} hands/frame')
+
+
+if __name__ == '__main__':
+    main()
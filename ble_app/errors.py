@@ -24,3 +24,7 @@ class FailedException(dbus.exceptions.DBusException):
 
 class RejectedException(dbus.exceptions.DBusException):
     _dbus_error_name = "org.bluez.Error.Rejected"
+
+
+class InvalidOffsetException(dbus.exceptions.DBusException):
+    _dbus_error_name = 'org.bluez.Error.InvalidOffset'
@@ -8,10 +8,12 @@ import dbus.service
 import time
 
 from gi.repository import GLib as GObject
+from .services import Application
 from .services import HeartRateService
 from .services import BatteryService
 from .services import DeviceInfoService
 from .services import TestService
+from .services import setup_logging
 from .advertisement import TestAdvertisement
 from .agent import Agent
 
@@ -19,41 +21,6 @@ bus = None
 mainloop = None
 
 
-class Application(dbus.service.Object):
-    """
-    org.bluez.GattApplication1 interface implementation
-    """
-    def __init__(self, bus):
-        self.path = '/'
-        self.services = []
-        dbus.service.Object.__init__(self, bus, self.path)
-        self.add_service(HeartRateService(bus, 0))
-        self.add_service(BatteryService(bus, 1))
-        self.add_service(DeviceInfoService(bus, 2))
-        self.add_service(TestService(bus, 3))
-
-    def get_path(self):
-        return dbus.ObjectPath(self.path)
-
-    def add_service(self, service):
-        self.services.append(service)
-
-    @dbus.service.method('org.freedesktop.DBus.ObjectManager', out_signature='a{oa{sa{sv}}}')
-    def GetManagedObjects(self):
-        response = {}
-
-        for service in self.services:
-            response[service.get_path()] = service.get_properties()
-            chrcs = service.get_characteristics()
-            for chrc in chrcs:
-                response[chrc.get_path()] = chrc.get_properties()
-                descs = chrc.get_descriptors()
-                for desc in descs:
-                    response[desc.get_path()] = desc.get_properties()
-
-        return response
-
-
 def register_app_cb():
     print('GATT application registered')
 
@@ -72,6 +39,8 @@ def register_ad_error_cb(error):
 
 
 def main():
+    setup_logging()
+
     global mainloop
     dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
     mainloop = GObject.MainLoop()
@@ -82,6 +51,10 @@ def main():
     adapter_obj = bus.get_object('org.bluez', '/org/bluez/hci0')
     service_manager = dbus.Interface(adapter_obj, 'org.bluez.GattManager1')
     app = Application(bus)
+    app.add_service(HeartRateService(bus, 0))
+    app.add_service(BatteryService(bus, 1))
+    app.add_service(DeviceInfoService(bus, 2))
+    app.add_service(TestService(bus, 3))
     service_manager.RegisterApplication(app.get_path(), {},
                                         reply_handler=register_app_cb,
                                         error_handler=register_app_error_cb)
@@ -1,58 +1,38 @@
 #!/usr/bin/env python3
 # SPDX-License-Identifier: LGPL-2.1-or-later
 
+import argparse
 import dbus
 import dbus.exceptions
 import dbus.mainloop.glib
 import dbus.service
+import multiprocessing
 import time
 
 from gi.repository import GLib as GObject
+from .services import Application
 from .services import BatteryService
 from .services import DeviceInfoService
 from .services import HandGestureMouseService
 from .services import RelativeMouseService
+from .services import setup_logging
 from .advertisement import TestAdvertisement
 from .agent import Agent
+from .input_server import InputServer
+from .vision import CursorChannel
+from .vision import CursorFusion
+from .vision import DutyCycleController
+from .vision import GestureClassifier
+from .vision import Placement
+from .vision import QosController
+from .vision import ScreenMapping
+from .vision import load_mappings
+from .vision import worker as vision_worker
 
 bus = None
 mainloop = None
 
 
-class Application(dbus.service.Object):
-    """
-    org.bluez.GattApplication1 interface implementation
-    """
-    def __init__(self, bus):
-        self.path = '/'
-        self.services = []
-        dbus.service.Object.__init__(self, bus, self.path)
-        self.add_service(BatteryService(bus, 0))
-        self.add_service(DeviceInfoService(bus, 1))
-        self.add_service(HandGestureMouseService(bus, 2))
-
-    def get_path(self):
-        return dbus.ObjectPath(self.path)
-
-    def add_service(self, service):
-        self.services.append(service)
-
-    @dbus.service.method('org.freedesktop.DBus.ObjectManager', out_signature='a{oa{sa{sv}}}')
-    def GetManagedObjects(self):
-        response = {}
-
-        for service in self.services:
-            response[service.get_path()] = service.get_properties()
-            chrcs = service.get_characteristics()
-            for chrc in chrcs:
-                response[chrc.get_path()] = chrc.get_properties()
-                descs = chrc.get_descriptors()
-                for desc in descs:
-                    response[desc.get_path()] = desc.get_properties()
-
-        return response
-
-
 def register_app_cb():
     print('GATT application registered')
 
@@ -71,45 +51,145 @@ def register_ad_error_cb(error):
 
 
 def main():
-    global mainloop
-    dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
-    mainloop = GObject.MainLoop()
-
-    global bus
-    bus = dbus.SystemBus()
-
-    adapter_obj = bus.get_object('org.bluez', '/org/bluez/hci0')
-    service_manager = dbus.Interface(adapter_obj, 'org.bluez.GattManager1')
-    app = Application(bus)
-    service_manager.RegisterApplication(app.get_path(), {},
-                                        reply_handler=register_app_cb,
-                                        error_handler=register_app_error_cb)
-
-    time.sleep(1)
-
-    # https://www.kynetics.com/docs/2018/pairing_agents_bluez/#simple-agent
-    agent = Agent(bus)
-    ag_manager = dbus.Interface(bus.get_object('org.bluez', "/org/bluez"), "org.bluez.AgentManager1")
-    ag_manager.RegisterAgent(agent.path, 'DisplayYesNo')  # 'NoInputNoOutput'
-
-    adapter_props_interface = dbus.Interface(adapter_obj, 'org.freedesktop.DBus.Properties')
-    adapter_props_interface.Set('org.bluez.Adapter1', 'Powered', dbus.Boolean(1))
-    adapter_props_interface.Set('org.bluez.Adapter1', 'Discoverable', dbus.Boolean(1))
-    adapter_props_interface.Set('org.bluez.Adapter1', 'Alias', dbus.String('AIBot'))
-
-    ad_manager = dbus.Interface(adapter_obj, 'org.bluez.LEAdvertisingManager1')
-    test_advertisement = TestAdvertisement(bus, index=0)
-    ad_manager.RegisterAdvertisement(test_advertisement.get_path(), {},
-                                     reply_handler=register_ad_cb,
-                                     error_handler=register_ad_error_cb)
-    # ad_manager.UnregisterAdvertisement(advertisement)
-    # dbus.service.Object.remove_from_connection(advertisement)
-
+    parser = argparse.ArgumentParser(description='BLE hand gesture mouse')
+    parser.add_argument('--vision-process', action='store_true',
+                        help='run hand tracking in a separate process sharing the cursor through shared memory')
+    parser.add_argument('--camera', type=int, nargs='+', default=[0],
+                        help='camera indexes, with several a vision process runs per camera and their cursors are fused')
+    parser.add_argument('--calibration',
+                        help='JSON file mapping each camera cursor to the shared cursor space, see vision.fusion')
+    parser.add_argument('--screen-calibration',
+                        help='JSON file of the camera to screen mapping of each camera, see vision.calibration')
+    parser.add_argument('--gesture-model',
+                        help='GestureClassifier .npz file telling pinches, see vision.classifier')
+    parser.add_argument('--fusion', choices=('best', 'blend'), default='best',
+                        help='follow the most confident camera or blend the cameras by confidence')
+    parser.add_argument('--linger', type=float, default=30,
+                        help='seconds the camera and hand model stay open after the last host unsubscribes')
+    parser.add_argument('--active-fps', type=float, default=20, help='hand tracking frame rate while a hand is in view')
+    parser.add_argument('--scan-fps', type=float, default=4, help='frame rate of the presence scan without a hand')
+    parser.add_argument('--scan-scale', type=float, default=0.5, help='frame scale of the presence scan')
+    parser.add_argument('--output-hz', type=float, default=90,
+                        help='cursor report rate, positions are interpolated between camera frames')
+    parser.add_argument('--target-latency', type=float, default=40,
+                        help='hand tracking processing time target per frame in ms, detection quality adapts to it')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='hand detector processes, frames are detected in parallel and reordered above 1')
+    parser.add_argument('--two-hands', action='store_true',
+                        help='track two hands, the right one points and a pinch of the left one right clicks')
+    parser.add_argument('--head-pointer', action='store_true',
+                        help='move the cursor with the head, detected on the same frames as the hand that clicks')
+    parser.add_argument('--placement', default='none',
+                        help='thread and CPU placement, a profile (none, shared, isolated) or settings such as '
+                             '"main=0,capture=1,inference=2-3,cv-threads=1,inference-threads=1"')
+    parser.add_argument('--log-level', default='INFO', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'))
+    args = parser.parse_args()
+    if (args.workers > 1) + args.two_hands + args.head_pointer > 1:
+        parser.error('--workers, --two-hands and --head-pointer cannot be combined')
+    setup_logging(args.log_level)
+    placement = Placement.parse(args.placement)
+    placement.configure_process()
+    placement.configure_children()
+
+    screens = {camera: ScreenMapping.load(args.screen_calibration, camera) if args.screen_calibration else None
+               for camera in args.camera}
+    classifier = GestureClassifier.load(args.gesture_model) if args.gesture_model else None
+    duty_cycle = DutyCycleController(args.active_fps, args.scan_fps, args.scan_scale)
+    qos = QosController(args.target_latency)
+    channel, channels, visions, stop_vision = None, [], [], None
+    # Whatever fails from here on, the vision processes are stopped and the channels unlinked
     try:
-        mainloop.run()
-
-    except KeyboardInterrupt:
-        pass
+        if args.vision_process or len(args.camera) > 1:
+            ctx = multiprocessing.get_context('spawn')
+            stop_vision = ctx.Event()
+            for camera in args.camera:
+                camera_channel = CursorChannel(create=True)
+                channels.append(camera_channel)
+                vision = ctx.Process(target=vision_worker.run, args=(camera_channel.name, camera),
+                                     kwargs={'stop_event': stop_vision, 'duty_cycle': duty_cycle, 'qos': qos,
+                                             'workers': args.workers, 'two_hands': args.two_hands,
+                                             'head_pointer': args.head_pointer, 'placement': placement,
+                                             'mapping': screens[camera], 'classifier': classifier,
+                                             'log_level': args.log_level})
+                vision.start()
+                visions.append(vision)
+            if len(channels) == 1:
+                channel = channels[0]
+            else:
+                mappings = load_mappings(args.calibration, args.camera) if args.calibration else None
+                channel = CursorFusion(channels, mappings, args.fusion)
+
+        # After starting the vision processes, they would inherit it
+        placement.pin('main')
+
+        global mainloop
+        dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+        mainloop = GObject.MainLoop()
+
+        global bus
+        bus = dbus.SystemBus()
+
+        adapter_obj = bus.get_object('org.bluez', '/org/bluez/hci0')
+        service_manager = dbus.Interface(adapter_obj, 'org.bluez.GattManager1')
+        app = Application(bus)
+        app.add_service(BatteryService(bus, 0))
+        app.add_service(DeviceInfoService(bus, 1))
+        mouse = HandGestureMouseService(bus, 2, channel, linger_s=args.linger, duty_cycle=duty_cycle, qos=qos,
+                                        workers=args.workers, camera_index=args.camera[0], two_hands=args.two_hands,
+                                        head_pointer=args.head_pointer, placement=placement,
+                                        mapping=screens[args.camera[0]], classifier=classifier,
+                                        output_hz=args.output_hz)
+        app.add_service(mouse)
+        service_manager.RegisterApplication(app.get_path(), {},
+                                            reply_handler=register_app_cb,
+                                            error_handler=register_app_error_cb)
+
+        time.sleep(1)
+
+        # https://www.kynetics.com/docs/2018/pairing_agents_bluez/#simple-agent
+        agent = Agent(bus)
+        ag_manager = dbus.Interface(bus.get_object('org.bluez', "/org/bluez"), "org.bluez.AgentManager1")
+        ag_manager.RegisterAgent(agent.path, 'DisplayYesNo')  # 'NoInputNoOutput'
+
+        adapter_props_interface = dbus.Interface(adapter_obj, 'org.freedesktop.DBus.Properties')
+        adapter_props_interface.Set('org.bluez.Adapter1', 'Powered', dbus.Boolean(1))
+        adapter_props_interface.Set('org.bluez.Adapter1', 'Discoverable', dbus.Boolean(1))
+        adapter_props_interface.Set('org.bluez.Adapter1', 'Alias', dbus.String('AIBot'))
+
+        ad_manager = dbus.Interface(adapter_obj, 'org.bluez.LEAdvertisingManager1')
+        test_advertisement = TestAdvertisement(bus, index=0)
+        ad_manager.RegisterAdvertisement(test_advertisement.get_path(), {},
+                                         reply_handler=register_ad_cb,
+                                         error_handler=register_ad_error_cb)
+        # ad_manager.UnregisterAdvertisement(advertisement)
+        # dbus.service.Object.remove_from_connection(advertisement)
+
+        try:
+            input_server = InputServer(pointer=mouse.report)
+        except OSError as e:
+            input_server = None
+            print(f'Input server disabled: {e}')
+
+        try:
+            mainloop.run()
+
+        except KeyboardInterrupt:
+            pass
+
+        if input_server is not None:
+            input_server.close()
+
+        if mouse.report.lifecycle is not None:
+            mouse.report.lifecycle.close()
+    finally:
+        if stop_vision is not None:
+            stop_vision.set()
+        for vision in visions:
+            vision.join(timeout=5)
+            if vision.is_alive():
+                vision.terminate()
+        for camera_channel in channels:
+            camera_channel.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+
+"""
+Local input injection over a UNIX socket.
+
+Other processes connect to the socket and write frames, each made of a 2 byte
+header (type, payload length) followed by the payload. A client may write
+any number of frames at once. Every frame read in one wakeup is dispatched
+together to the report characteristics.
+
+    POINTER_REL  '<hhb'   dx, dy, wheel               -> relative mouse RepChrc
+    POINTER_ABS  '<HH'    x, y in logical units       -> absolute / hand gesture RepChrc
+    BUTTON       '<B'     button bits                 -> pointer RepChrc
+    KEY          '<BB'    keycode, 1=down 0=up        -> keyboard Report1Characteristic
+    TOUCH        '<BBHH'  contact id, tip, x, y       -> multitap ReportChrc
+    TEXT         utf-8    up to 255 bytes             -> keyboard Report1Characteristic
+    STATS        empty    server replies with a STATS frame '<IIII' count, mean, p99, max (us)
+"""
+
+import logging
+import os
+import socket
+import struct
+import time
+
+from array import array
+from gi.repository import GLib as GObject
+
+POINTER_REL = 0x01
+POINTER_ABS = 0x02
+BUTTON =      0x03
+KEY =         0x04
+TOUCH =       0x05
+TEXT =        0x06
+STATS =       0x7f
+
+HEADER = struct.Struct('<BB')
+PAYLOADS = {
+    POINTER_REL: struct.Struct('<hhb'),
+    POINTER_ABS: struct.Struct('<HH'),
+    BUTTON: struct.Struct('<B'),
+    KEY: struct.Struct('<BB'),
+    TOUCH: struct.Struct('<BBHH'),
+    STATS: struct.Struct('<IIII'),
+}
+
+DEFAULT_SOCKET_PATH = '/run/ble_app/input.sock'
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyStats:
+    """
+    Socket read to notify latency over the last `size` events, in nanoseconds.
+    """
+
+    def __init__(self, size=1024):
+        self.samples = array('q', bytes(8 * size))
+        self.size = size
+        self.count = 0
+
+    def record(self, latency_ns):
+        self.samples[self.count % self.size] = latency_ns
+        self.count += 1
+
+    def summary(self):
+        """
+        Returns (count, mean_us, p99_us, max_us).
+        """
+        n = min(self.count, self.size)
+        if n == 0:
+            return 0, 0, 0, 0
+        window = sorted(self.samples[:n])
+        return (self.count, sum(window) // n // 1000,
+                window[min(n - 1, n * 99 // 100)] // 1000, window[-1] // 1000)
+
+
+class InputServer:
+    """
+    GLib integrated UNIX socket server feeding input events into report characteristics.
+
+    `pointer`, `keyboard` and `touch` are the report characteristics events are
+    routed to; any of them may be None. When the keyboard has more than
+    `high_watermark` reports queued, the server stops reading from its clients
+    until the queue drops below `low_watermark`, so writers block on the full
+    socket instead of the server buffering without bound.
+    """
+
+    # Methods of the target by preference: positions are resampled by the characteristics with an output stage
+    TARGET_METHODS = {POINTER_REL: ('move',), POINTER_ABS: ('push_position', 'move_to'), BUTTON: ('set_buttons',),
+                      TOUCH: ('push_contact', 'touch')}
+
+    # Bounds the work done per wakeup so one busy client can't starve the main loop
+    RECV_SIZE = 4096
+
+    def __init__(self, path=DEFAULT_SOCKET_PATH, pointer=None, keyboard=None, touch=None,
+                 high_watermark=512, low_watermark=64):
+        self.path = path
+        self.pointer = pointer
+        self.keyboard = keyboard
+        self.touch = touch
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.latency = LatencyStats()
+        self.clients = {}
+        self.paused = False
+        self.dropped = 0
+
+        if os.path.exists(path):
+            os.unlink(path)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        self.sock.listen()
+        self.sock.setblocking(False)
+        self.accept_source = GObject.io_add_watch(self.sock.fileno(), GObject.PRIORITY_DEFAULT, GObject.IO_IN,
+                                                  self._on_accept)
+        logger.info('Input server listening on %s', path)
+
+    def close(self):
+        for fd in list(self.clients):
+            self._drop_client(fd)
+        GObject.source_remove(self.accept_source)
+        self.sock.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _on_accept(self, fd, condition):
+        conn, _ = self.sock.accept()
+        conn.setblocking(False)
+        self.clients[conn.fileno()] = [conn, bytearray(), None]
+        # While paused the client is watched from _maybe_resume, with the others
+        if not self.paused:
+            self._watch(conn.fileno())
+        return True
+
+    def _watch(self, fd):
+        self.clients[fd][2] = GObject.io_add_watch(
+            fd, GObject.PRIORITY_DEFAULT, GObject.IO_IN | GObject.IO_HUP | GObject.IO_ERR, self._on_readable)
+
+    def _drop_client(self, fd):
+        conn, _, source = self.clients.pop(fd)
+        if source is not None:
+            GObject.source_remove(source)
+        conn.close()
+
+    def _on_readable(self, fd, condition):
+        conn, buf, _ = self.clients[fd]
+        try:
+            data = conn.recv(self.RECV_SIZE)
+        except BlockingIOError:
+            return True
+        except OSError:
+            data = b''
+
+        if not data:
+            self.clients[fd][2] = None
+            self._drop_client(fd)
+            return False
+
+        read_at = time.monotonic_ns()
+        buf += data
+        consumed = self._dispatch(conn, buf, read_at)
+        del buf[:consumed]
+
+        if self._backlogged():
+            self.clients[fd][2] = None
+            self._pause()
+            return False
+        return True
+
+    def _dispatch(self, conn, buf, read_at):
+        offset, end = 0, len(buf)
+        while offset + HEADER.size <= end:
+            kind, length = HEADER.unpack_from(buf, offset)
+            start = offset + HEADER.size
+            if start + length > end:
+                break
+
+            if self._handle(conn, kind, buf, start, length):
+                if kind in (KEY, TEXT) and hasattr(self.keyboard, 'mark_input'):
+                    # Keyboard reports are queued, the keyboard records the latency once they are notified
+                    self.keyboard.mark_input(read_at, self.latency)
+                else:
+                    self.latency.record(time.monotonic_ns() - read_at)
+            offset = start + length
+
+        return offset
+
+    def _handle(self, conn, kind, buf, start, length):
+        """
+        Route one frame to its report characteristic. Returns False when it was not an input or was dropped.
+        """
+        if kind == TEXT:
+            try:
+                self.keyboard.type_text(bytes(buf[start:start + length]).decode('utf-8'))
+            except (AttributeError, ValueError) as e:
+                logger.warning('Dropped text input: %s', e)
+                self.dropped += 1
+                return False
+            return True
+
+        payload = PAYLOADS.get(kind)
+        if payload is None or length != (0 if kind == STATS else payload.size):
+            self.dropped += 1
+            return False
+
+        if kind == STATS:
+            try:
+                conn.send(HEADER.pack(STATS, payload.size) + payload.pack(*self.latency.summary()))
+            except OSError as e:
+                # BlockingIOError included, the client isn't reading its socket
+                logger.warning('Cannot send input latency stats: %s', e)
+            return False
+
+        values = payload.unpack_from(buf, start)
+        target = self.keyboard if kind == KEY else self.touch if kind == TOUCH else self.pointer
+        method = next((name for name in self.TARGET_METHODS.get(kind, ()) if hasattr(target, name)), None)
+
+        if kind == KEY and target is not None:
+            keycode, down = values
+            (target.key_down if down else target.key_up)(keycode)
+        elif method is not None:
+            getattr(target, method)(*values)
+        else:
+            self.dropped += 1
+            return False
+        return True
+
+    def _backlogged(self):
+        return self.keyboard is not None and len(self.keyboard.pending) > self.high_watermark
+
+    def _pause(self):
+        if self.paused:
+            return
+        self.paused = True
+        for client in self.clients.values():
+            if client[2] is not None:
+                GObject.source_remove(client[2])
+                client[2] = None
+        GObject.timeout_add(self.keyboard.tick_ms, self._maybe_resume)
+
+    def _maybe_resume(self):
+        if len(self.keyboard.pending) > self.low_watermark:
+            return True
+        self.paused = False
+        for fd, client in self.clients.items():
+            if client[2] is None:
+                self._watch(fd)
+        return False
+
+
+class InputClient:
+    """
+    Client side of the input socket. Events are buffered until flush(), so a
+    batch of events goes out in a single write.
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET_PATH):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.buf = bytearray()
+
+    def _frame(self, kind, *values):
+        payload = PAYLOADS[kind]
+        self.buf += HEADER.pack(kind, payload.size)
+        self.buf += payload.pack(*values)
+
+    def pointer_rel(self, dx, dy, wheel=0):
+        self._frame(POINTER_REL, dx, dy, wheel)
+
+    def pointer_abs(self, x, y):
+        self._frame(POINTER_ABS, x, y)
+
+    def button(self, buttons):
+        self._frame(BUTTON, buttons)
+
+    def key(self, keycode, down):
+        self._frame(KEY, keycode, 1 if down else 0)
+
+    def touch(self, contact_id, tip, x, y):
+        self._frame(TOUCH, contact_id, 1 if tip else 0, x, y)
+
+    def text(self, text):
+        data = text.encode('utf-8')
+        for i in range(0, len(data), 255):
+            chunk = data[i:i + 255]
+            self.buf += HEADER.pack(TEXT, len(chunk))
+            self.buf += chunk
+
+    def flush(self):
+        self.sock.sendall(self.buf)
+        self.buf.clear()
+
+    def stats(self):
+        """
+        Returns the server's (count, mean_us, p99_us, max_us) latency summary.
+        """
+        self.flush()
+        self.sock.sendall(HEADER.pack(STATS, 0))
+        reply = b''
+        size = HEADER.size + PAYLOADS[STATS].size
+        while len(reply) < size:
+            reply += self.sock.recv(size - len(reply))
+        return PAYLOADS[STATS].unpack_from(reply, HEADER.size)
+
+    def close(self):
+        self.sock.close()
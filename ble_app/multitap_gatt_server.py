@@ -8,48 +8,15 @@ import dbus.service
 import time
 
 from gi.repository import GLib as GObject
-from .services import (BatteryService, DeviceInfoService, MultitapService)
+from .services import (Application, BatteryService, DeviceInfoService, MultitapService, setup_logging)
 from .advertisement import TestAdvertisement
 from .agent import Agent
+from .input_server import InputServer
 
 bus = None
 mainloop = None
 
 
-class Application(dbus.service.Object):
-    """
-    org.bluez.GattApplication1 interface implementation
-    """
-    def __init__(self, bus):
-        self.path = '/'
-        self.services = []
-        dbus.service.Object.__init__(self, bus, self.path)
-        self.add_service(BatteryService(bus, 0))
-        self.add_service(DeviceInfoService(bus, 1))
-        self.add_service(MultitapService(bus, 2))
-
-    def get_path(self):
-        return dbus.ObjectPath(self.path)
-
-    def add_service(self, service):
-        self.services.append(service)
-
-    @dbus.service.method('org.freedesktop.DBus.ObjectManager', out_signature='a{oa{sa{sv}}}')
-    def GetManagedObjects(self):
-        response = {}
-
-        for service in self.services:
-            response[service.get_path()] = service.get_properties()
-            chrcs = service.get_characteristics()
-            for chrc in chrcs:
-                response[chrc.get_path()] = chrc.get_properties()
-                descs = chrc.get_descriptors()
-                for desc in descs:
-                    response[desc.get_path()] = desc.get_properties()
-
-        return response
-
-
 def register_app_cb():
     print('GATT application registered')
 
@@ -68,6 +35,8 @@ def register_ad_error_cb(error):
 
 
 def main():
+    setup_logging()
+
     global mainloop
     dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
     mainloop = GObject.MainLoop()
@@ -78,6 +47,10 @@ def main():
     adapter_obj = bus.get_object('org.bluez', '/org/bluez/hci0')
     service_manager = dbus.Interface(adapter_obj, 'org.bluez.GattManager1')
     app = Application(bus)
+    app.add_service(BatteryService(bus, 0))
+    app.add_service(DeviceInfoService(bus, 1))
+    multitap = MultitapService(bus, 2)
+    app.add_service(multitap)
     service_manager.RegisterApplication(app.get_path(), {},
                                         reply_handler=register_app_cb,
                                         error_handler=register_app_error_cb)
@@ -102,12 +75,21 @@ def main():
     # ad_manager.UnregisterAdvertisement(advertisement)
     # dbus.service.Object.remove_from_connection(advertisement)
 
+    try:
+        input_server = InputServer(touch=multitap.report)
+    except OSError as e:
+        input_server = None
+        print(f'Input server disabled: {e}')
+
     try:
         mainloop.run()
 
     except KeyboardInterrupt:
         pass
 
+    if input_server is not None:
+        input_server.close()
+
 
 if __name__ == '__main__':
     main()
@@ -1,3 +1,4 @@
+from .gatt import Application
 from .heart_rate_service import HeartRateService
 from .battery_service import BatteryService
 from .device_info_service import DeviceInfoService
@@ -6,3 +7,5 @@ from .hand_gesture_mouse_service import HandGestureMouseService
 from .relative_mouse_service import RelativeMouseService
 from .absolute_mouse_service import AbsoluteMouseService
 from .multitap_service import MultitapService
+from .composite_hid_service import CompositeHIDService
+from .log import setup_logging
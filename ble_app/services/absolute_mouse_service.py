@@ -2,9 +2,12 @@ import dbus
 import dbus.exceptions
 import dbus.mainloop.glib
 import dbus.service
+import logging
 
-from gi.repository import GLib as GObject
-from .gatt import Service, Characteristic, Descriptor
+from .gatt import Service, Characteristic, StaticCharacteristic, StaticDescriptor
+from .output_stage import OutputStage
+
+logger = logging.getLogger(__name__)
 
 BLUEZ_SERVICE_NAME = 'org.bluez'
 GATT_MANAGER_IFACE = 'org.bluez.GattManager1'
@@ -15,6 +18,45 @@ GATT_SERVICE_IFACE = 'org.bluez.GattService1'
 GATT_CHRC_IFACE =    'org.bluez.GattCharacteristic1'
 GATT_DESC_IFACE =    'org.bluez.GattDescriptor1'
 
+# Logical Maximum of the X and Y usages
+LOGICAL_MAX = 10000
+
+
+# https://gist.github.com/mbt28/406bdf15a248029c774085832c7c0c0c
+# https://github.com/csash7/mbed-BLE-Mouse/issues/1
+# https://github.com/xcarcelle/mbed-BLE-Mouse/commit/d39d37bcf9bde178a3a2f47167cd8301cd68140a
+ABSOLUTE_MOUSE_REPORT_MAP = [
+    # Report Description: describes what we communicate
+    0x05, 0x01,                    # USAGE_PAGE (Generic Desktop)
+    0x09, 0x02,                    # USAGE (Mouse)
+    0xa1, 0x01,                    # COLLECTION (Application)
+    0x85, 0x01,                    #   REPORT_ID (1)
+    0x09, 0x01,                    #   USAGE (Pointer)
+    0xa1, 0x00,                    #   COLLECTION (Physical)
+    0x05, 0x09,                    #         Usage Page (Buttons)
+    0x19, 0x01,                    #         Usage Minimum (1)
+    0x29, 0x03,                    #         Usage Maximum (3)
+    0x15, 0x00,                    #         Logical Minimum (0)
+    0x25, 0x01,                    #         Logical Maximum (1)
+    0x95, 0x03,                    #         Report Count (3)
+    0x75, 0x01,                    #         Report Size (1)
+    0x81, 0x02,                    #         Input(Data, Variable, Absolute); 3 button bits
+    0x95, 0x01,                    #         Report Count(1)
+    0x75, 0x05,                    #         Report Size(5)
+    0x81, 0x03,                    #         Input(Constant);                 5 bit padding
+    0x05, 0x01,                    #         Usage Page (Generic Desktop)
+    0x09, 0x30,                    #         Usage (X)
+    0x09, 0x31,                    #         Usage (Y)
+    0x16, 0x00, 0x00,              #         Logical Minimum (0)
+    0x26, 0x10, 0x27,              #         Logical Maximum (10,000)
+    0x66, 0x00, 0x00,              #         UNIT(None)
+    0x75, 0x10,                    #         Report Size (3)
+    0x95, 0x02,                    #         Report Count (2)
+    0x81, 0x02,                    #         Input(Data, Variable, Relative); 3 position bytes (X,Y,Wheel)
+    0xc0,                          #   END_COLLECTION
+    0xc0                           # END_COLLECTION
+]
+
 
 class AbsoluteMouseService(Service):
     """
@@ -23,16 +65,18 @@ class AbsoluteMouseService(Service):
     """
     HID_UUID = '1812'
 
-    def __init__(self, bus, index):
+    def __init__(self, bus, index, output_hz=90):
         Service.__init__(self, bus, index, self.HID_UUID, primary=True)
+        self.output_hz = output_hz
         self.add_characteristic(InfoChrc(bus, 0, self))
         self.add_characteristic(InputRepMapChrc(bus, 1, self))
         self.add_characteristic(CtrlPntChrc(bus, 2, self))
-        self.add_characteristic(RepChrc(bus, 3, self))
+        self.report = RepChrc(bus, 3, self)
+        self.add_characteristic(self.report)
         self.add_characteristic(ProtoModeChrc(bus, 4, self))
 
 
-class InfoChrc(Characteristic):
+class InfoChrc(StaticCharacteristic):
     """
     HID Information.
     """
@@ -40,16 +84,11 @@ class InfoChrc(Characteristic):
     INFO_UUID = '2a4a'
 
     def __init__(self, bus, index, service):
-        Characteristic.__init__(self, bus, index, self.INFO_UUID, ['read'], service)
-        self.value = dbus.Array(bytearray.fromhex('01010002'), signature=dbus.Signature('y'))
-
-    def ReadValue(self, options):
         # HID info: ver=1.1, country=0, flags=normal
-        print('HID Information Chrc called')
-        return self.value
+        StaticCharacteristic.__init__(self, bus, index, self.INFO_UUID, ['read'], service, bytes.fromhex('01010002'))
 
 
-class InputRepMapChrc(Characteristic):
+class InputRepMapChrc(StaticCharacteristic):
     """
     HID input report map.
     """
@@ -57,48 +96,7 @@ class InputRepMapChrc(Characteristic):
     REP_MAP_UUID = '2a4b'
 
     def __init__(self, bus, index, service):
-        Characteristic.__init__(self, bus, index, self.REP_MAP_UUID, ['read'], service)
-
-    def ReadValue(self, options):
-        print('HID Input Report Map Chrc called')
-        # https://gist.github.com/mbt28/406bdf15a248029c774085832c7c0c0c
-        # https://github.com/csash7/mbed-BLE-Mouse/issues/1
-        # https://github.com/xcarcelle/mbed-BLE-Mouse/commit/d39d37bcf9bde178a3a2f47167cd8301cd68140a
-        hex_list = [
-            # Report Description: describes what we communicate
-            0x05, 0x01,                    # USAGE_PAGE (Generic Desktop)
-            0x09, 0x02,                    # USAGE (Mouse)
-            0xa1, 0x01,                    # COLLECTION (Application)
-            0x85, 0x01,                    #   REPORT_ID (1)
-            0x09, 0x01,                    #   USAGE (Pointer)
-            0xa1, 0x00,                    #   COLLECTION (Physical)
-            0x05, 0x09,                    #         Usage Page (Buttons)
-            0x19, 0x01,                    #         Usage Minimum (1)
-            0x29, 0x03,                    #         Usage Maximum (3)
-            0x15, 0x00,                    #         Logical Minimum (0)
-            0x25, 0x01,                    #         Logical Maximum (1)
-            0x95, 0x03,                    #         Report Count (3)
-            0x75, 0x01,                    #         Report Size (1)
-            0x81, 0x02,                    #         Input(Data, Variable, Absolute); 3 button bits
-            0x95, 0x01,                    #         Report Count(1)
-            0x75, 0x05,                    #         Report Size(5)
-            0x81, 0x03,                    #         Input(Constant);                 5 bit padding
-            0x05, 0x01,                    #         Usage Page (Generic Desktop)
-            0x09, 0x30,                    #         Usage (X)
-            0x09, 0x31,                    #         Usage (Y)
-            0x16, 0x00, 0x00,              #         Logical Minimum (0)
-            0x26, 0x10, 0x27,              #         Logical Maximum (10,000)
-            0x66, 0x00, 0x00,              #         UNIT(None)
-            0x75, 0x10,                    #         Report Size (3)
-            0x95, 0x02,                    #         Report Count (2)
-            0x81, 0x02,                    #         Input(Data, Variable, Relative); 3 position bytes (X,Y,Wheel)
-            0xc0,                          #   END_COLLECTION
-            0xc0                           # END_COLLECTION
-        ]
-
-        hex_string = ''.join(['{:02x}'.format(b) for b in hex_list])
-        print(hex_string)
-        return dbus.Array(bytearray.fromhex(hex_string))
+        StaticCharacteristic.__init__(self, bus, index, self.REP_MAP_UUID, ['read'], service, ABSOLUTE_MOUSE_REPORT_MAP)
 
 
 class CtrlPntChrc(Characteristic):
@@ -129,52 +127,71 @@ class RepChrc(Characteristic):
         self.notifying = False
         # y, x, s
         self.value = [dbus.Byte(0x00), dbus.Byte(0x10), dbus.Byte(0x00), dbus.Byte(0x00), dbus.Byte(0x00)]
-        GObject.timeout_add(5000, self.notify_report)
-
-    def notify_report(self):
-        if not self.notifying:
-            return True
-
-        self.PropertiesChanged('org.bluez.GattCharacteristic1', {
-            'Value': self.value
-        }, [])
-
-        return True
+        self.buttons, self.x, self.y = 0, 0, 0
+        # Positions pushed at the camera rate are resampled to output_hz
+        self.output = OutputStage(self._emit_positions, channels=1, rate_hz=service.output_hz, max_position=LOGICAL_MAX)
+
+    def push_position(self, x, y, t=None):
+        self.output.push(0, x, y, t)
+
+    def _emit_positions(self, channels, positions):
+        x, y = positions[0].round().astype(int).tolist()
+        if (x, y) != (self.x, self.y):
+            self.move_to(x, y)
+
+    def move_to(self, x, y):
+        self.x, self.y = x, y
+        self.send_report()
+
+    def set_buttons(self, buttons):
+        self.buttons = buttons
+        self.send_report()
+
+    def send_report(self):
+        # buttons, x (uint16 LE), y (uint16 LE)
+        x, y = self.x, self.y
+        self.value = [
+            dbus.Byte(self.buttons),
+            dbus.Byte(x & 0x00ff), dbus.Byte((x >> 8) & 0x00ff),
+            dbus.Byte(y & 0x00ff), dbus.Byte((y >> 8) & 0x00ff),
+        ]
+        if self.notifying:
+            self.PropertiesChanged('org.bluez.GattCharacteristic1', {
+                'Value': self.value
+            }, [])
 
     def ReadValue(self, options):
-        print('Read Report Chrc')
+        logger.debug('Read Report Chrc')
         return self.value
 
     def WriteValue(self, value, options):
-        print(f'Write Report {self.value}')
+        logger.debug('Write Report %s', self.value)
         self.value = value
 
     def StartNotify(self):
-        print('Start Report Chrc Notification')
+        logger.info('Start Report Chrc Notification')
         if self.notifying:
-            print('Already notifying, nothing to do')
+            logger.debug('Already notifying, nothing to do')
             return
 
         self.notifying = True
+        self.output.start()
 
     def StopNotify(self):
         if not self.notifying:
-            print('Not notifying, nothing to do')
+            logger.debug('Not notifying, nothing to do')
             return
 
         self.notifying = False
+        self.output.stop()
 
 
-class RepDescriptor(Descriptor):
+class RepDescriptor(StaticDescriptor):
     def __init__(self, bus, index, characteristic):
-        Descriptor.__init__(self, bus, index,
-                            '2908', ['read'],
-                            characteristic)
-
-    def ReadValue(self, options):
-        print('Read Rep Descriptor')
         # HID reference: id=1, type=input
-        return dbus.Array(bytearray.fromhex('0101'), signature=dbus.Signature('y'))
+        StaticDescriptor.__init__(self, bus, index,
+                                  '2908', ['read'],
+                                  characteristic, bytes.fromhex('0101'))
 
 
 class ProtoModeChrc(Characteristic):
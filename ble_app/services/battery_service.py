@@ -1,12 +1,14 @@
-import subprocess
 import dbus
 import dbus.exceptions
 import dbus.mainloop.glib
 import dbus.service
+import logging
 
-from gi.repository import GLib as GObject
+from .battery_source import default_battery_source
 from .gatt import Service, Characteristic
 
+logger = logging.getLogger(__name__)
+
 BLUEZ_SERVICE_NAME = 'org.bluez'
 GATT_MANAGER_IFACE = 'org.bluez.GattManager1'
 DBUS_OM_IFACE =      'org.freedesktop.DBus.ObjectManager'
@@ -19,20 +21,22 @@ GATT_DESC_IFACE =    'org.bluez.GattDescriptor1'
 
 class BatteryService(Service):
     """
-    Fake Battery service that emulates a draining battery.
+    Battery service reporting the level of a BatterySource.
 
+    Without a source, the machine battery is read from sysfs or UPower.
     """
     BATTERY_UUID = '180f'
 
-    def __init__(self, bus, index):
+    def __init__(self, bus, index, source=None):
         Service.__init__(self, bus, index, self.BATTERY_UUID, True)
+        self.source = default_battery_source(bus) if source is None else source
         self.add_characteristic(BatteryLevelCharacteristic(bus, 0, self))
 
 
 class BatteryLevelCharacteristic(Characteristic):
     """
-    Fake Battery Level characteristic. The battery level is drained by 2 points
-    every 5 seconds.
+    Battery Level characteristic. The source is only watched while notifying,
+    and a notification is sent only when the level changes.
 
     """
     BATTERY_LVL_UUID = '2a19'
@@ -45,50 +49,43 @@ class BatteryLevelCharacteristic(Characteristic):
             service)
 
         self.notifying = False
-        self.battery_lvl = 100
-        GObject.timeout_add(5000, self.notify_battery_level)
-
-    def notify_battery_level(self):
-        proc = subprocess.run(
-            ['upower', '-i', '/org/freedesktop/UPower/devices/battery_BAT1'],
-            capture_output=True
-        )
-
-        if proc.returncode == 0:
-            fields_list = [
-                [v.strip() for v in l.split(':')]
-                for l in proc.stdout.decode('utf-8').split('\n')
-            ]
-            # FIXME: Error occurs when a item length is not `2`.
-            fields_dict = {
-                item[0]: item[1] for item in fields_list if len(item) == 2
-            }
-            if 'percentage' in fields_dict:
-                self.battery_lvl = int(fields_dict['percentage'].replace('%', ''))
-            else:
-                self.battery_lvl = 100
-        else:
-            self.battery_lvl = 100
+        self.source = service.source
+        self.source.add_callback(self.notify_battery_level)
+
+    @property
+    def battery_lvl(self):
+        level = self.source.level
+        if level is None:
+            level = self.source.refresh()
+        return 100 if level is None else level
 
+    def notify_battery_level(self, level):
         if self.notifying:
-            payload = {'Value': [dbus.Byte(self.battery_lvl)]}
+            payload = {'Value': [dbus.Byte(level)]}
             self.PropertiesChanged(GATT_CHRC_IFACE, payload, [])
 
-        return True
-
     def ReadValue(self, options):
-        print('Battery Level read: ' + repr(self.battery_lvl))
-        return [dbus.Byte(self.battery_lvl)]
+        if not self.notifying:
+            # Not watched while nobody is subscribed, read the current level
+            self.source.refresh()
+        level = self.battery_lvl
+        logger.debug('Battery Level read: %r', level)
+        return [dbus.Byte(level)]
 
     def StartNotify(self):
         if self.notifying:
             return
 
         self.notifying = True
-        self.notify_battery_level()
+        level = self.source.level
+        self.source.start()
+        if self.source.level == level:
+            # start() only notifies a changed level, the new subscriber still gets the current one
+            self.notify_battery_level(self.battery_lvl)
 
     def StopNotify(self):
         if not self.notifying:
             return
 
         self.notifying = False
+        self.source.stop()
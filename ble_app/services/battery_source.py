@@ -0,0 +1,241 @@
+"""
+Battery level sources for the Battery Service.
+
+A source keeps the last known level (0 ~ 100) and calls its callbacks only
+when the level actually changes. It only watches for changes between start()
+and stop(), which the Battery Level characteristic ties to its notify state.
+"""
+
+import abc
+import glob
+import logging
+import os
+import shutil
+import tempfile
+
+import dbus
+import dbus.exceptions
+
+from gi.repository import GLib as GObject
+
+logger = logging.getLogger(__name__)
+
+POWER_SUPPLY_ROOT = '/sys/class/power_supply'
+
+UPOWER_SERVICE_NAME = 'org.freedesktop.UPower'
+UPOWER_DEVICE_IFACE = 'org.freedesktop.UPower.Device'
+UPOWER_DISPLAY_DEVICE = '/org/freedesktop/UPower/devices/DisplayDevice'
+DBUS_PROP_IFACE = 'org.freedesktop.DBus.Properties'
+# UPower Device Type of a battery
+UPOWER_TYPE_BATTERY = 2
+
+
+class BatterySource(abc.ABC):
+    """
+    Last known battery level with change callbacks.
+    """
+
+    def __init__(self):
+        self.level = None
+        self.callbacks = []
+        self.running = False
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def update(self, level):
+        if level is None or level == self.level:
+            return
+        self.level = level
+        for callback in self.callbacks:
+            callback(level)
+
+    @abc.abstractmethod
+    def read(self):
+        """
+        Returns the current level, or None if it can't be read.
+        """
+
+    def refresh(self):
+        self.update(self.read())
+        return self.level
+
+    def start(self):
+        self.running = True
+        self.refresh()
+
+    def stop(self):
+        self.running = False
+
+
+class SysfsBatterySource(BatterySource):
+    """
+    Reads `<supply>/capacity` of a power supply with one pread on a file kept open.
+
+    sysfs attributes can't be watched for changes, so the capacity is polled
+    every `interval` seconds while the source is running.
+    """
+
+    def __init__(self, supply, interval=30):
+        BatterySource.__init__(self)
+        self.supply = supply
+        self.interval = interval
+        self.fd = os.open(os.path.join(supply, 'capacity'), os.O_RDONLY)
+        self.timer = None
+
+    @staticmethod
+    def find(root=POWER_SUPPLY_ROOT):
+        """
+        Path of the first battery power supply under `root`, or None.
+        """
+        for supply in sorted(glob.glob(os.path.join(root, '*'))):
+            try:
+                with open(os.path.join(supply, 'type')) as f:
+                    kind = f.read().strip()
+            except OSError:
+                continue
+            if kind == 'Battery' and os.path.exists(os.path.join(supply, 'capacity')):
+                return supply
+        return None
+
+    def read(self):
+        try:
+            return max(0, min(100, int(os.pread(self.fd, 8, 0))))
+        except (OSError, ValueError) as e:
+            logger.warning('Cannot read battery capacity of %s: %s', self.supply, e)
+            return None
+
+    def start(self):
+        BatterySource.start(self)
+        if self.timer is None:
+            self.timer = GObject.timeout_add_seconds(self.interval, self.poll)
+
+    def stop(self):
+        BatterySource.stop(self)
+        if self.timer is not None:
+            GObject.source_remove(self.timer)
+            self.timer = None
+
+    def poll(self):
+        self.refresh()
+        return True
+
+    def close(self):
+        self.stop()
+        os.close(self.fd)
+
+
+class UPowerBatterySource(BatterySource):
+    """
+    Battery level of a UPower device, updated from its PropertiesChanged signal.
+    """
+
+    def __init__(self, bus, device=UPOWER_DISPLAY_DEVICE):
+        BatterySource.__init__(self)
+        self.bus = bus
+        self.device = device
+        self.props = dbus.Interface(bus.get_object(UPOWER_SERVICE_NAME, device), DBUS_PROP_IFACE)
+        self.match = None
+
+    def is_battery(self):
+        """
+        Whether the device is a battery that is present. Without one the display
+        device still exists, as a present-less device reporting 0%.
+        """
+        try:
+            props = self.props.GetAll(UPOWER_DEVICE_IFACE)
+        except dbus.exceptions.DBusException as e:
+            logger.warning('Cannot read UPower device %s: %s', self.device, e)
+            return False
+        return bool(props.get('IsPresent')) and props.get('Type') == UPOWER_TYPE_BATTERY
+
+    def read(self):
+        try:
+            return int(round(self.props.Get(UPOWER_DEVICE_IFACE, 'Percentage')))
+        except dbus.exceptions.DBusException as e:
+            logger.warning('Cannot read UPower battery level of %s: %s', self.device, e)
+            return None
+
+    def start(self):
+        BatterySource.start(self)
+        if self.match is None:
+            self.match = self.bus.add_signal_receiver(
+                self.properties_changed,
+                dbus_interface=DBUS_PROP_IFACE,
+                signal_name='PropertiesChanged',
+                bus_name=UPOWER_SERVICE_NAME,
+                path=self.device)
+
+    def stop(self):
+        BatterySource.stop(self)
+        if self.match is not None:
+            self.match.remove()
+            self.match = None
+
+    def properties_changed(self, interface, changed, invalidated):
+        if interface == UPOWER_DEVICE_IFACE and 'Percentage' in changed:
+            self.update(int(round(changed['Percentage'])))
+
+
+class FixedBatterySource(BatterySource):
+    """
+    Constant level, for devices running from mains power.
+    """
+
+    def __init__(self, level=100):
+        BatterySource.__init__(self)
+        self.fixed = level
+        self.level = level
+
+    def read(self):
+        return self.fixed
+
+
+class FakeSysfs:
+    """
+    Temporary power_supply directory with one battery, for SysfsBatterySource
+    tests and demos without a battery.
+
+        fake = FakeSysfs(80)
+        source = SysfsBatterySource(SysfsBatterySource.find(fake.root))
+        fake.set_capacity(79)
+    """
+
+    def __init__(self, capacity=100, name='BAT0'):
+        self.root = tempfile.mkdtemp(prefix='power_supply_')
+        self.supply = os.path.join(self.root, name)
+        os.mkdir(self.supply)
+        with open(os.path.join(self.supply, 'type'), 'w') as f:
+            f.write('Battery\n')
+        self.set_capacity(capacity)
+
+    def set_capacity(self, capacity):
+        # Rewrite in place, the source keeps the file open
+        with open(os.path.join(self.supply, 'capacity'), 'r+' if self.exists() else 'w') as f:
+            f.write(f'{capacity}\n')
+            f.truncate()
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.supply, 'capacity'))
+
+    def cleanup(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def default_battery_source(bus):
+    """
+    sysfs battery if the machine has one, else the UPower display device if it is a
+    present battery, else a fixed 100%.
+    """
+    supply = SysfsBatterySource.find()
+    if supply is not None:
+        return SysfsBatterySource(supply)
+
+    try:
+        source = UPowerBatterySource(bus)
+        if source.is_battery() and source.read() is not None:
+            return source
+    except dbus.exceptions.DBusException as e:
+        logger.info('UPower not available: %s', e)
+
+    return FixedBatterySource()
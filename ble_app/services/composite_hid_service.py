@@ -0,0 +1,239 @@
+import dbus
+import dbus.exceptions
+import dbus.mainloop.glib
+import dbus.service
+import logging
+
+from collections import deque
+from gi.repository import GLib as GObject
+from .gatt import Service, Characteristic, StaticCharacteristic, StaticDescriptor
+from .keyboard_codec import KeyboardReportEncoder
+from .keyboard_service import KEYBOARD_REPORT_MAPS
+from .multitap_service import CONTACT_SLOT, IN_RANGE, TIP_SWITCH, touch_report_map
+from .relative_motion import DeltaAccumulator
+from .relative_mouse_service import MOUSE_REPORT_MAP, to_int8
+
+logger = logging.getLogger(__name__)
+
+BLUEZ_SERVICE_NAME = 'org.bluez'
+GATT_MANAGER_IFACE = 'org.bluez.GattManager1'
+DBUS_OM_IFACE =      'org.freedesktop.DBus.ObjectManager'
+DBUS_PROP_IFACE =    'org.freedesktop.DBus.Properties'
+
+GATT_SERVICE_IFACE = 'org.bluez.GattService1'
+GATT_CHRC_IFACE =    'org.bluez.GattCharacteristic1'
+GATT_DESC_IFACE =    'org.bluez.GattDescriptor1'
+
+FUNCTIONS = ('keyboard', 'mouse', 'touch')
+
+
+def with_report_id(fragment, report_id):
+    # Every fragment opens with USAGE_PAGE, USAGE, COLLECTION (Application), REPORT_ID
+    fragment = bytearray(fragment)
+    if fragment[6] != 0x85:
+        raise ValueError('Report map fragment must declare its REPORT_ID right after the application collection')
+    fragment[7] = report_id
+    return bytes(fragment)
+
+
+class CompositeHIDService(Service):
+    """
+    One HID service carrying keyboard, mouse and touch input.
+
+    The report map is assembled from the per-function descriptor fragments,
+    function N in `functions` getting report ID N + 1 and its own report
+    characteristic with a matching report reference descriptor. All reports go
+    through one encoder front end and one notification queue, which sends at
+    most `reports_per_tick` reports every `tick_ms` across all functions.
+    """
+    HID_UUID = '1812'
+
+    def __init__(self, bus, index, functions=FUNCTIONS, keyboard_mode='6kro', max_contacts=10):
+        Service.__init__(self, bus, index, self.HID_UUID, primary=True)
+
+        self.report_ids = {}
+        self.reports = {}
+        fragments = b''
+        for i, function in enumerate(functions):
+            if function not in FUNCTIONS:
+                raise ValueError(f'Unknown HID function {function!r}')
+            report_id = i + 1
+            if function == 'keyboard':
+                fragment = bytes.fromhex(KEYBOARD_REPORT_MAPS[keyboard_mode])
+            elif function == 'mouse':
+                fragment = bytes(MOUSE_REPORT_MAP)
+            else:
+                fragment = bytes(touch_report_map(max_contacts, 1))
+            fragments += with_report_id(fragment, report_id)
+            self.report_ids[function] = report_id
+
+        self.report_map = fragments
+        self.keyboard = KeyboardReportEncoder(keyboard_mode)
+        self.motion = DeltaAccumulator()
+        self.buttons = 0
+        self.pending = deque()
+        self.tick_ms = 8
+        self.reports_per_tick = 2
+        self.timer = None
+
+        self.add_characteristic(InfoChrc(bus, 0, self))
+        self.add_characteristic(InputRepMapChrc(bus, 1, self))
+        self.add_characteristic(CtrlPntChrc(bus, 2, self))
+        self.add_characteristic(ProtoModeChrc(bus, 3, self))
+        for i, function in enumerate(functions):
+            report = ReportChrc(bus, 4 + i, self, self.report_ids[function])
+            self.reports[function] = report
+            self.add_characteristic(report)
+
+    def queue(self, function, payload):
+        report = self.reports.get(function)
+        if report is None:
+            logger.warning('No %s function in this composite HID service', function)
+            return
+        self.pending.append((report, payload))
+        if self.timer is None:
+            self.timer = GObject.timeout_add(self.tick_ms, self.send)
+
+    def send(self):
+        for _ in range(self.reports_per_tick):
+            if not self.pending:
+                break
+            report, payload = self.pending.popleft()
+            report.notify(payload)
+
+        if self.pending:
+            return True
+
+        self.timer = None
+        return False
+
+    # keyboard
+    def type_text(self, text):
+        for payload in self.keyboard.text_reports(text):
+            self.queue('keyboard', payload)
+
+    def key_down(self, code):
+        self.keyboard.key_down(code)
+        self.queue('keyboard', self.keyboard.held_report())
+
+    def key_up(self, code):
+        self.keyboard.key_up(code)
+        self.queue('keyboard', self.keyboard.held_report())
+
+    # mouse: buttons, x, y, wheel
+    def move(self, dx, dy, wheel=0):
+        steps = self.motion.add(dx, dy, accelerate=False) or ([(0, 0)] if wheel else [])
+        for x, y in steps:
+            self.queue('mouse', bytes((self.buttons, x & 0xff, y & 0xff, to_int8(wheel))))
+            wheel = 0
+
+    def set_buttons(self, buttons):
+        self.buttons = buttons
+        self.queue('mouse', bytes((buttons, 0, 0, 0)))
+
+    # touch: contact count, one contact slot
+    def touch(self, contact_id, tip, x, y):
+        state = (TIP_SWITCH | IN_RANGE) if tip else 0
+        self.queue('touch', bytes((1,)) + CONTACT_SLOT.pack(contact_id, state, x, y))
+
+
+class InfoChrc(StaticCharacteristic):
+    """
+    HID Information.
+    """
+
+    INFO_UUID = '2a4a'
+
+    def __init__(self, bus, index, service):
+        # HID info: ver=1.1, country=0, flags=normal
+        StaticCharacteristic.__init__(self, bus, index, self.INFO_UUID, ['read'], service, bytes.fromhex('01010002'))
+
+
+class InputRepMapChrc(StaticCharacteristic):
+    """
+    HID input report map, the concatenation of the function fragments.
+    """
+
+    REP_MAP_UUID = '2a4b'
+
+    def __init__(self, bus, index, service):
+        StaticCharacteristic.__init__(self, bus, index, self.REP_MAP_UUID, ['read'], service, service.report_map)
+
+
+class CtrlPntChrc(Characteristic):
+    """
+    HID Control Point.
+    """
+
+    CTRL_PNT_UUID = '2a4c'
+
+    def __init__(self, bus, index, service):
+        Characteristic.__init__(self, bus, index, self.CTRL_PNT_UUID, ['write-without-response'], service)
+        self.value = dbus.Array(bytearray.fromhex('00'), signature=dbus.Signature('y'))
+
+    def WriteValue(self, value, options):
+        self.value = value
+
+
+class ReportChrc(Characteristic):
+    """
+    HID Report of one function of the composite service.
+    """
+
+    REP_UUID = '2a4d'
+
+    def __init__(self, bus, index, service, report_id):
+        Characteristic.__init__(self, bus, index, self.REP_UUID, ['secure-read', 'notify'], service)
+        self.add_descriptor(RepDescriptor(bus, 0, self, report_id))
+        self.notifying = False
+        self.value = dbus.Array([], signature=dbus.Signature('y'))
+
+    def notify(self, payload):
+        self.value = dbus.Array(payload, signature=dbus.Signature('y'))
+        if self.notifying:
+            self.PropertiesChanged('org.bluez.GattCharacteristic1', {
+                'Value': self.value
+            }, [])
+
+    def ReadValue(self, options):
+        return self.value
+
+    def StartNotify(self):
+        if self.notifying:
+            logger.debug('Already notifying, nothing to do')
+            return
+
+        self.notifying = True
+
+    def StopNotify(self):
+        if not self.notifying:
+            logger.debug('Not notifying, nothing to do')
+            return
+
+        self.notifying = False
+
+
+class RepDescriptor(StaticDescriptor):
+    def __init__(self, bus, index, characteristic, report_id):
+        # HID reference: id=report_id, type=input
+        StaticDescriptor.__init__(self, bus, index, '2908', ['read'], characteristic, bytes((report_id, 0x01)))
+
+
+class ProtoModeChrc(Characteristic):
+    """
+    HID protocol mode.
+    """
+
+    PROTO_MODE_UUID = '2a4e'
+
+    def __init__(self, bus, index, service):
+        Characteristic.__init__(self, bus, index, self.PROTO_MODE_UUID, ['read', 'write-without-response'], service)
+        self.parent = service
+        self.value = dbus.Array(bytearray.fromhex('01'), signature=dbus.Signature('y'))
+
+    def ReadValue(self, options):
+        # HID protocol mode: report
+        return self.value
+
+    def WriteValue(self, value, options):
+        self.value = value
@@ -1,10 +1,6 @@
-import dbus
-import dbus.exceptions
-import dbus.mainloop.glib
-import dbus.service
 import struct
 
-from .gatt import Service, Characteristic
+from .gatt import Service, StaticCharacteristic
 
 BLUEZ_SERVICE_NAME = 'org.bluez'
 GATT_MANAGER_IFACE = 'org.bluez.GattManager1'
@@ -38,66 +34,43 @@ class DeviceInfoService(Service):
         self.add_characteristic(PnpChrc(bus, 6, self))
 
 
-class ModelNumberChrc(Characteristic):
+class ModelNumberChrc(StaticCharacteristic):
     def __init__(self, bus, index, service):
-        Characteristic.__init__(self, bus, index, '2a24', ['read'], service)
-        self.value = dbus.Array('smartRemotes'.encode(), signature=dbus.Signature('y'))
+        StaticCharacteristic.__init__(self, bus, index, '2a24', ['read'], service, string_pack('smartRemotes'))
 
-    def ReadValue(self, options):
-        return self.value
 
-
-class SerialNumberChrc(Characteristic):
+class SerialNumberChrc(StaticCharacteristic):
     def __init__(self, bus, index, service):
-        Characteristic.__init__(self, bus, index, '2a25', ['read'], service)
-
-    def ReadValue(self, options):
-        return string_pack('0000-0000-0000-0000')
+        StaticCharacteristic.__init__(self, bus, index, '2a25', ['read'], service, string_pack('0000-0000-0000-0000'))
 
 
-class FwChrc(Characteristic):
+class FwChrc(StaticCharacteristic):
     def __init__(self, bus, index, service):
-        Characteristic.__init__(self, bus, index, '2a26', ['read'], service)
+        StaticCharacteristic.__init__(self, bus, index, '2a26', ['read'], service, string_pack('0000-0000-0000-0000'))
 
-    def ReadValue(self, options):
-        return string_pack('0000-0000-0000-0000')
 
-
-class HwChrc(Characteristic):
+class HwChrc(StaticCharacteristic):
     def __init__(self, bus, index, service):
-        Characteristic.__init__(self, bus, index, '2a27', ['read'], service)
-
-    def ReadValue(self, options):
-        return string_pack('0000-0000-0000-0000')
+        StaticCharacteristic.__init__(self, bus, index, '2a27', ['read'], service, string_pack('0000-0000-0000-0000'))
 
 
-class SwChrc(Characteristic):
+class SwChrc(StaticCharacteristic):
     def __init__(self, bus, index, service):
-        Characteristic.__init__(self, bus, index, '2a28', ['read'], service)
-        self.value = dbus.Array('version 1.0.0'.encode(), signature=dbus.Signature('y'))
+        StaticCharacteristic.__init__(self, bus, index, '2a28', ['read'], service, string_pack('version 1.0.0'))
 
-    def ReadValue(self, options):
-        return self.value
 
-
-class MfChrc(Characteristic):
+class MfChrc(StaticCharacteristic):
     # Manifacture Name
     # Vendor Characteristics
     def __init__(self, bus, index, service):
-        Characteristic.__init__(self, bus, index, '2a29', ['read'], service)
-        self.value = dbus.Array('HodgeCode'.encode(), signature=dbus.Signature('y'))
-
-    def ReadValue(self, options):
-        return self.value
+        StaticCharacteristic.__init__(self, bus, index, '2a29', ['read'], service, string_pack('HodgeCode'))
 
 
-class PnpChrc(Characteristic):
+class PnpChrc(StaticCharacteristic):
     def __init__(self, bus, index, service):
-        Characteristic.__init__(self, bus, index, '2a50', ['read'], service)
-
-    def ReadValue(self, options):
         pnp_manufacturer_source = 0x01     # Bluetooth uuid list
         pnp_manufacturer_uuid = 0xFE61     # 0xFEB2 for Microsoft, 0xFE61 for Logitech, 0xFD65 for Razer
         pnp_product_id = 0x01              # ID 1
         pnp_product_version = 0x0123       # Version 1.2.3
-        return struct.pack("<BHHH", pnp_manufacturer_source, pnp_manufacturer_uuid, pnp_product_id, pnp_product_version)
+        pnp_id = struct.pack("<BHHH", pnp_manufacturer_source, pnp_manufacturer_uuid, pnp_product_id, pnp_product_version)
+        StaticCharacteristic.__init__(self, bus, index, '2a50', ['read'], service, pnp_id)
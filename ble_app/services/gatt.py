@@ -2,8 +2,12 @@ import dbus
 import dbus.exceptions
 import dbus.mainloop.glib
 import dbus.service
+import logging
 
-from .errors import InvalidArgsException, NotSupportedException
+from .errors import InvalidArgsException, InvalidOffsetException, NotSupportedException
+from .scheduler import NotifyScheduler, default_scheduler
+
+logger = logging.getLogger(__name__)
 
 
 BLUEZ_SERVICE_NAME = 'org.bluez'
@@ -16,9 +20,91 @@ GATT_CHRC_IFACE =    'org.bluez.GattCharacteristic1'
 GATT_DESC_IFACE =    'org.bluez.GattDescriptor1'
 
 
+class Application(dbus.service.Object):
+    """
+    org.bluez.GattApplication1 interface implementation
+
+    Services can be added and removed while the application is registered.
+    Changes are announced with InterfacesAdded / InterfacesRemoved using the
+    cached property snapshots, so switching profiles doesn't need the
+    application to be registered again. Hot-added services need an index no
+    other service uses, as it determines their object path.
+
+    The application also owns the scheduler running the periodic tasks of
+    notifying characteristics.
+    """
+    def __init__(self, bus, path='/'):
+        self.path = path
+        self.bus = bus
+        self.services = []
+        self.scheduler = NotifyScheduler()
+        self.managed_objects = None
+        self.managed_subtrees = []
+        dbus.service.Object.__init__(self, bus, self.path)
+
+    def get_path(self):
+        return dbus.ObjectPath(self.path)
+
+    def add_service(self, service):
+        self.services.append(service)
+        service.application = self
+        self.managed_objects = None
+        for path, interfaces in service.get_managed_objects().items():
+            self.InterfacesAdded(path, interfaces)
+
+    def remove_service(self, service):
+        self.services.remove(service)
+        self.managed_objects = None
+
+        # Children go first so no removed path is left with a dangling parent
+        objects = list(service.get_managed_objects().items())
+        for path, interfaces in reversed(objects):
+            self.InterfacesRemoved(path, dbus.Array(interfaces.keys(), signature='s'))
+
+        for chrc in service.get_characteristics():
+            self.scheduler.disarm_owner(chrc)
+            for desc in chrc.get_descriptors():
+                unexport(desc)
+            unexport(chrc)
+        unexport(service)
+        service.application = None
+
+    @dbus.service.method(DBUS_OM_IFACE, out_signature='a{oa{sa{sv}}}')
+    def GetManagedObjects(self):
+        # Each service caches its subtree, rebuild the merged response only when one of them changed
+        subtrees = [service.get_managed_objects() for service in self.services]
+        changed = len(subtrees) != len(self.managed_subtrees) or any(a is not b for a, b in zip(subtrees, self.managed_subtrees))
+        if self.managed_objects is None or changed:
+            response = {}
+            for objects in subtrees:
+                response.update(objects)
+            self.managed_objects, self.managed_subtrees = response, subtrees
+
+        return self.managed_objects
+
+    @dbus.service.signal(DBUS_OM_IFACE, signature='oa{sa{sv}}')
+    def InterfacesAdded(self, path, interfaces):
+        pass
+
+    @dbus.service.signal(DBUS_OM_IFACE, signature='oas')
+    def InterfacesRemoved(self, path, interfaces):
+        pass
+
+
+def unexport(obj):
+    try:
+        obj.remove_from_connection()
+    except LookupError:
+        # never exported, e.g. created without a bus
+        pass
+
+
 class Service(dbus.service.Object):
     """
     org.bluez.GattService1 interface implementation
+
+    Property dicts of the service and of its whole subtree are built once and
+    cached until a characteristic or descriptor is added.
     """
     PATH_BASE = '/org/bluez/example/service'
 
@@ -28,24 +114,47 @@ class Service(dbus.service.Object):
         self.uuid = uuid
         self.primary = primary
         self.characteristics = []
+        self.application = None
+        self._properties = None
+        self._managed_objects = None
         dbus.service.Object.__init__(self, bus, self.path)
 
     def get_properties(self):
-        return {
-            GATT_SERVICE_IFACE: {
-                'UUID': self.uuid,
-                'Primary': self.primary,
-                'Characteristics': dbus.Array(
-                    self.get_characteristic_paths(),
-                    signature='o')
+        if self._properties is None:
+            self._properties = {
+                GATT_SERVICE_IFACE: {
+                    'UUID': self.uuid,
+                    'Primary': self.primary,
+                    'Characteristics': dbus.Array(
+                        self.get_characteristic_paths(),
+                        signature='o')
+                }
             }
-        }
+        return self._properties
+
+    def get_managed_objects(self):
+        """
+        ObjectManager entries of the service, its characteristics and their descriptors.
+        """
+        if self._managed_objects is None:
+            objects = {self.get_path(): self.get_properties()}
+            for chrc in self.characteristics:
+                objects[chrc.get_path()] = chrc.get_properties()
+                for desc in chrc.get_descriptors():
+                    objects[desc.get_path()] = desc.get_properties()
+            self._managed_objects = objects
+        return self._managed_objects
+
+    def invalidate_managed_objects(self):
+        self._managed_objects = None
 
     def get_path(self):
         return dbus.ObjectPath(self.path)
 
     def add_characteristic(self, characteristic):
         self.characteristics.append(characteristic)
+        self._properties = None
+        self._managed_objects = None
 
     def get_characteristic_paths(self):
         result = []
@@ -75,25 +184,30 @@ class Characteristic(dbus.service.Object):
         self.service = service
         self.flags = flags
         self.descriptors = []
+        self._properties = None
         dbus.service.Object.__init__(self, bus, self.path)
 
     def get_properties(self):
-        return {
-            GATT_CHRC_IFACE: {
-                'Service': self.service.get_path(),
-                'UUID': self.uuid,
-                'Flags': self.flags,
-                'Descriptors': dbus.Array(
-                    self.get_descriptor_paths(),
-                    signature='o')
+        if self._properties is None:
+            self._properties = {
+                GATT_CHRC_IFACE: {
+                    'Service': self.service.get_path(),
+                    'UUID': self.uuid,
+                    'Flags': self.flags,
+                    'Descriptors': dbus.Array(
+                        self.get_descriptor_paths(),
+                        signature='o')
+                }
             }
-        }
+        return self._properties
 
     def get_path(self):
         return dbus.ObjectPath(self.path)
 
     def add_descriptor(self, descriptor):
         self.descriptors.append(descriptor)
+        self._properties = None
+        self.service.invalidate_managed_objects()
 
     def get_descriptor_paths(self):
         result = []
@@ -104,6 +218,19 @@ class Characteristic(dbus.service.Object):
     def get_descriptors(self):
         return self.descriptors
 
+    def get_scheduler(self):
+        application = self.service.application
+        return default_scheduler if application is None else application.scheduler
+
+    def arm(self, task, interval_ms):
+        """
+        Run `task` every `interval_ms` on the application scheduler, usually from StartNotify.
+        """
+        self.get_scheduler().arm(task, interval_ms)
+
+    def disarm(self, task):
+        self.get_scheduler().disarm(task)
+
     @dbus.service.method(DBUS_PROP_IFACE, in_signature='s', out_signature='a{sv}')
     def GetAll(self, interface):
         if interface != GATT_CHRC_IFACE:
@@ -113,22 +240,22 @@ class Characteristic(dbus.service.Object):
 
     @dbus.service.method(GATT_CHRC_IFACE, in_signature='a{sv}', out_signature='ay')
     def ReadValue(self, options):
-        print('Default ReadValue called, returning error')
+        logger.warning('Default ReadValue called, returning error')
         raise NotSupportedException()
 
     @dbus.service.method(GATT_CHRC_IFACE, in_signature='aya{sv}')
     def WriteValue(self, value, options):
-        print('Default WriteValue called, returning error')
+        logger.warning('Default WriteValue called, returning error')
         raise NotSupportedException()
 
     @dbus.service.method(GATT_CHRC_IFACE)
     def StartNotify(self):
-        print('Default StartNotify called, returning error')
+        logger.warning('Default StartNotify called, returning error')
         raise NotSupportedException()
 
     @dbus.service.method(GATT_CHRC_IFACE)
     def StopNotify(self):
-        print('Default StopNotify called, returning error')
+        logger.warning('Default StopNotify called, returning error')
         raise NotSupportedException()
 
     @dbus.service.signal(DBUS_PROP_IFACE,
@@ -147,16 +274,19 @@ class Descriptor(dbus.service.Object):
         self.uuid = uuid
         self.flags = flags
         self.chrc = characteristic
+        self._properties = None
         dbus.service.Object.__init__(self, bus, self.path)
 
     def get_properties(self):
-        return {
-            GATT_DESC_IFACE: {
-                'Characteristic': self.chrc.get_path(),
-                'UUID': self.uuid,
-                'Flags': self.flags,
+        if self._properties is None:
+            self._properties = {
+                GATT_DESC_IFACE: {
+                    'Characteristic': self.chrc.get_path(),
+                    'UUID': self.uuid,
+                    'Flags': self.flags,
+                }
             }
-        }
+        return self._properties
 
     def get_path(self):
         return dbus.ObjectPath(self.path)
@@ -170,10 +300,61 @@ class Descriptor(dbus.service.Object):
 
     @dbus.service.method(GATT_DESC_IFACE, in_signature='a{sv}', out_signature='ay')
     def ReadValue(self, options):
-        print('Default ReadValue called, returning error')
+        logger.warning('Default ReadValue called, returning error')
         raise NotSupportedException()
 
     @dbus.service.method(GATT_DESC_IFACE, in_signature='aya{sv}')
     def WriteValue(self, value, options):
-        print('Default WriteValue called, returning error')
+        logger.warning('Default WriteValue called, returning error')
         raise NotSupportedException()
+
+
+class StaticValue:
+    """
+    Immutable value marshalled once, served with the offset and MTU of each read.
+
+    Long values (report maps, DIS strings) are read by the client in several
+    requests at increasing offsets, each answer holding at most MTU - 1 bytes.
+    Every slice is built on its first read and reused afterwards.
+    """
+    def __init__(self, value):
+        self.data = bytes(value)
+        self.slices = {}
+
+    def read(self, options):
+        offset = int(options.get('offset', 0))
+        if offset > len(self.data):
+            raise InvalidOffsetException()
+
+        end = len(self.data)
+        if 'mtu' in options:
+            end = min(end, offset + int(options['mtu']) - 1)
+
+        value = self.slices.get((offset, end))
+        if value is None:
+            value = self.slices[(offset, end)] = dbus.Array(self.data[offset:end], signature=dbus.Signature('y'))
+        return value
+
+
+class StaticCharacteristic(Characteristic):
+    """
+    Read-only characteristic with a constant value.
+    """
+    def __init__(self, bus, index, uuid, flags, service, value):
+        Characteristic.__init__(self, bus, index, uuid, flags, service)
+        self.static = StaticValue(value)
+
+    def ReadValue(self, options):
+        return self.static.read(options)
+
+
+class StaticDescriptor(Descriptor):
+    """
+    Read-only descriptor with a constant value.
+    """
+    def __init__(self, bus, index, uuid, flags, characteristic, value):
+        Descriptor.__init__(self, bus, index, uuid, flags, characteristic)
+        self.static = StaticValue(value)
+
+    def ReadValue(self, options):
+        return self.static.read(options)
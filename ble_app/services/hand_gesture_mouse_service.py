@@ -2,14 +2,16 @@ import dbus
 import dbus.exceptions
 import dbus.mainloop.glib
 import dbus.service
+import logging
 import threading
 import struct
-import numpy as np
-import cv2
-import mediapipe as mp
 
-from gi.repository import GLib as GObject
-from .gatt import Service, Characteristic, Descriptor
+from ..vision import CURSOR_MAX, DutyCycleController, Placement, QosController, create_tracker
+from .gatt import Service, Characteristic, StaticCharacteristic, StaticDescriptor
+from .output_stage import OutputStage
+from .tracker_lifecycle import TrackerLifecycle
+
+logger = logging.getLogger(__name__)
 
 BLUEZ_SERVICE_NAME = 'org.bluez'
 GATT_MANAGER_IFACE = 'org.bluez.GattManager1'
@@ -21,23 +23,113 @@ GATT_CHRC_IFACE =    'org.bluez.GattCharacteristic1'
 GATT_DESC_IFACE =    'org.bluez.GattDescriptor1'
 
 
+HAND_GESTURE_MOUSE_REPORT_MAP = [
+    # Report Description: describes what we communicate
+    0x05, 0x01,                    # USAGE_PAGE (Generic Desktop)
+    0x09, 0x02,                    # USAGE (Mouse)
+    0xa1, 0x01,                    # COLLECTION (Application)
+    0x85, 0x01,                    #   REPORT_ID (1)
+    0x09, 0x01,                    #   USAGE (Pointer)
+    0xa1, 0x00,                    #   COLLECTION (Physical)
+    0x05, 0x09,                    #         Usage Page (Buttons)
+    0x19, 0x01,                    #         Usage Minimum (1)
+    0x29, 0x03,                    #         Usage Maximum (3)
+    0x15, 0x00,                    #         Logical Minimum (0)
+    0x25, 0x01,                    #         Logical Maximum (1)
+    0x95, 0x03,                    #         Report Count (3)
+    0x75, 0x01,                    #         Report Size (1)
+    0x81, 0x02,                    #         Input(Data, Variable, Absolute); 3 button bits
+    0x95, 0x01,                    #         Report Count(1)
+    0x75, 0x05,                    #         Report Size(5)
+    0x81, 0x03,                    #         Input(Constant);                 5 bit padding
+    0x05, 0x01,                    #         Usage Page (Generic Desktop)
+    0x09, 0x30,                    #         Usage (X)
+    0x09, 0x31,                    #         Usage (Y)
+    0x16, 0x00, 0x00,              #         Logical Minimum (0)
+    0x26, 0xff, 0x7f,              #         Logical Maximum (32,767)
+    0x66, 0x00, 0x00,              #         UNIT(None)
+    0x75, 0x10,                    #         Report Size (10)
+    0x95, 0x02,                    #         Report Count (2)
+    0x81, 0x02,                    #         Input(Data, Variable, Relative); 3 position bytes (X,Y,Wheel)
+    0xc0,                          #   END_COLLECTION
+    0xc0                           # END_COLLECTION
+]
+
+
 class HandGestureMouseService(Service):
     """
     Fake HID Mouse that simulates a mouse controls behaviour.
 
+    Without a cursor channel, the camera and hand model run in process and only
+    while needed: they are loaded in the background when the service is created
+    and when a device connects, used while the report is notifying, and closed
+    `linger_s` seconds after the last host unsubscribes. While no hand is in
+    view, the `duty_cycle` controller lowers the frame rate and resolution,
+    and the `qos` controller adjusts detection cost to the frame latency target.
+    With `workers` above 1, frames are detected in parallel by as many processes.
+
+    With `two_hands`, one hand points and a pinch of the other right clicks.
+    With `head_pointer`, the head moves the cursor and a hand pinch clicks.
+    The hand model is loaded and runs on the inference CPUs of `placement`.
+    `mapping` is the ScreenMapping of the camera to the absolute cursor, and
+    with a `classifier`, pinches are told by its confidence instead of a threshold.
+
+    The channel may also be a CursorFusion of the channels of several cameras.
+    Cursor positions, from the channel or the tracker, are resampled to
+    `output_hz` and clicks are sent as they come.
     """
     HID_UUID = '1812'
 
-    def __init__(self, bus, index):
+    def __init__(self, bus, index, channel=None, linger_s=30, duty_cycle=None, qos=None, workers=1, camera_index=0,
+                 two_hands=False, head_pointer=False, placement=None, mapping=None, classifier=None, output_hz=90):
         Service.__init__(self, bus, index, self.HID_UUID, primary=True)
+        self.channel = channel
+        self.linger_s = linger_s
+        self.duty_cycle = duty_cycle
+        self.qos = qos
+        self.workers = workers
+        self.camera_index = camera_index
+        self.two_hands = two_hands
+        self.head_pointer = head_pointer
+        self.placement = placement or Placement()
+        self.mapping = mapping
+        self.classifier = classifier
+        self.output_hz = output_hz
         self.add_characteristic(InfoChrc(bus, 0, self))
         self.add_characteristic(InputRepMapChrc(bus, 1, self))
         self.add_characteristic(CtrlPntChrc(bus, 2, self))
-        self.add_characteristic(RepChrc(bus, 3, self))
+        self.report = RepChrc(bus, 3, self)
+        self.add_characteristic(self.report)
         self.add_characteristic(ProtoModeChrc(bus, 4, self))
 
+        if bus is not None and self.report.lifecycle is not None:
+            bus.add_signal_receiver(self.device_properties_changed,
+                                    dbus_interface=DBUS_PROP_IFACE,
+                                    signal_name='PropertiesChanged',
+                                    arg0='org.bluez.Device1')
+
+    def device_properties_changed(self, interface, changed, invalidated):
+        if 'Connected' not in changed:
+            return
 
-class InfoChrc(Characteristic):
+        if changed['Connected']:
+            # A subscription usually follows shortly, load the tracker meanwhile
+            self.report.lifecycle.prepare()
+        elif self.report.notifying:
+            self.report.StopNotify()
+
+    @property
+    def resume_latency_ms(self):
+        """
+        Time from the last subscription to the first camera frame, None before the first frame.
+        """
+        lifecycle = self.report.lifecycle
+        if lifecycle is None or lifecycle.resume_latency is None:
+            return None
+        return lifecycle.resume_latency * 1000
+
+
+class InfoChrc(StaticCharacteristic):
     """
     HID Information.
     """
@@ -45,16 +137,11 @@ class InfoChrc(Characteristic):
     INFO_UUID = '2a4a'
 
     def __init__(self, bus, index, service):
-        Characteristic.__init__(self, bus, index, self.INFO_UUID, ['read'], service)
-        self.value = dbus.Array(bytearray.fromhex('01010002'), signature=dbus.Signature('y'))
-
-    def ReadValue(self, options):
         # HID info: ver=1.1, country=0, flags=normal
-        print('HID Information Chrc called')
-        return self.value
+        StaticCharacteristic.__init__(self, bus, index, self.INFO_UUID, ['read'], service, bytes.fromhex('01010002'))
 
 
-class InputRepMapChrc(Characteristic):
+class InputRepMapChrc(StaticCharacteristic):
     """
     HID input report map.
     """
@@ -62,44 +149,7 @@ class InputRepMapChrc(Characteristic):
     REP_MAP_UUID = '2a4b'
 
     def __init__(self, bus, index, service):
-        Characteristic.__init__(self, bus, index, self.REP_MAP_UUID, ['read'], service)
-
-    def ReadValue(self, options):
-        print('HID Input Report Map Chrc called')
-        hex_list = [
-            # Report Description: describes what we communicate
-            0x05, 0x01,                    # USAGE_PAGE (Generic Desktop)
-            0x09, 0x02,                    # USAGE (Mouse)
-            0xa1, 0x01,                    # COLLECTION (Application)
-            0x85, 0x01,                    #   REPORT_ID (1)
-            0x09, 0x01,                    #   USAGE (Pointer)
-            0xa1, 0x00,                    #   COLLECTION (Physical)
-            0x05, 0x09,                    #         Usage Page (Buttons)
-            0x19, 0x01,                    #         Usage Minimum (1)
-            0x29, 0x03,                    #         Usage Maximum (3)
-            0x15, 0x00,                    #         Logical Minimum (0)
-            0x25, 0x01,                    #         Logical Maximum (1)
-            0x95, 0x03,                    #         Report Count (3)
-            0x75, 0x01,                    #         Report Size (1)
-            0x81, 0x02,                    #         Input(Data, Variable, Absolute); 3 button bits
-            0x95, 0x01,                    #         Report Count(1)
-            0x75, 0x05,                    #         Report Size(5)
-            0x81, 0x03,                    #         Input(Constant);                 5 bit padding
-            0x05, 0x01,                    #         Usage Page (Generic Desktop)
-            0x09, 0x30,                    #         Usage (X)
-            0x09, 0x31,                    #         Usage (Y)
-            0x16, 0x01, 0x80,              #         Logical Minimum (0)
-            0x26, 0xff, 0x7f,              #         Logical Maximum (10,000)
-            0x66, 0x00, 0x00,              #         UNIT(None)
-            0x75, 0x10,                    #         Report Size (10)
-            0x95, 0x02,                    #         Report Count (2)
-            0x81, 0x02,                    #         Input(Data, Variable, Relative); 3 position bytes (X,Y,Wheel)
-            0xc0,                          #   END_COLLECTION
-            0xc0                           # END_COLLECTION
-        ]
-
-        hex_string = ''.join(['{:02x}'.format(b) for b in hex_list])
-        return dbus.Array(bytearray.fromhex(hex_string))
+        StaticCharacteristic.__init__(self, bus, index, self.REP_MAP_UUID, ['read'], service, HAND_GESTURE_MOUSE_REPORT_MAP)
 
 
 class CtrlPntChrc(Characteristic):
@@ -130,105 +180,157 @@ class RepChrc(Characteristic):
         self.notifying = False
         # y, x, s
         self.value = [dbus.Byte(0x00), dbus.Byte(0x00), dbus.Byte(0x00), dbus.Byte(0x00), dbus.Byte(0x00)]
-        self.cap = cv2.VideoCapture(0)
-        mp_hands = mp.solutions.hands
-        self.history = np.array([], dtype=np.uint8)
-        self.max_history_count = 60
-        self.hands_detector = mp_hands.Hands(model_complexity=0, max_num_hands=1,
-                                             min_detection_confidence=0.5, min_tracking_confidence=0.5)
-        GObject.timeout_add(50, self.notify_report)
+        # With a cursor channel the tracker runs in a separate vision process
+        self.channel = service.channel
+        self.clicks = 0
+        self.lifecycle = None
+        self.duty = None
+        self.qos = None
+        self.workers = service.workers
+        self.camera_index = service.camera_index
+        self.two_hands = service.two_hands
+        self.head_pointer = service.head_pointer
+        self.placement = service.placement
+        self.mapping = service.mapping
+        self.classifier = service.classifier
+        if self.channel is None:
+            self.duty = service.duty_cycle or DutyCycleController()
+            self.qos = service.qos or QosController()
+            self.lifecycle = TrackerLifecycle(self.start_tracker, service.linger_s)
+            self.lifecycle.prepare()
+        # Cursor positions arriving at the camera rate are resampled to output_hz
+        self.output = OutputStage(self._emit_positions, channels=1, rate_hz=service.output_hz, max_position=CURSOR_MAX)
+
+    def start_tracker(self):
+        # Runs on the loading thread, pinned for the detector threads to inherit it
+        self.placement.pin('inference')
+        tracker = create_tracker(self.camera_index, self.qos.level.model_complexity, self.workers, self.two_hands,
+                                 self.head_pointer, self.placement, self.mapping, self.classifier)
+        self.qos.apply(tracker, self.duty)
+        tracker.warm_up()
+        return tracker
+
+    def position(self):
+        return self.value[1] | (self.value[2] << 8), self.value[3] | (self.value[4] << 8)
+
+    def push_position(self, x, y, t=None):
+        self.output.push(0, x, y, t)
+
+    def _emit_positions(self, channels, positions):
+        x, y = positions[0].round().astype(int).tolist()
+        if (x, y) != self.position():
+            self.move_to(x, y)
+
+    def move_to(self, x, y):
+        self.send_report(self.value[0], x, y)
+
+    def set_buttons(self, buttons):
+        self.send_report(buttons, *self.position())
+
+    def click(self, button, x, y):
+        # At the position of the sample completing it, the button released in a second report
+        self.send_report(button, x, y)
+        self.send_report(0, x, y)
+
+    def send_report(self, button, x, y):
+        # button, x (int16 LE), y (int16 LE)
+        self.value = [
+            dbus.Byte(button),
+            dbus.Byte(x & 0x00ff), dbus.Byte((x >> 8) & 0x00ff),
+            dbus.Byte(y & 0x00ff), dbus.Byte((y >> 8) & 0x00ff),
+        ]
+        if self.notifying:
+            self.PropertiesChanged('org.bluez.GattCharacteristic1', {
+                'Value': self.value
+            }, [])
 
     def notify_report(self):
         if not self.notifying:
             return True
 
-        success, image = self.cap.read()
-
-        if not success:
-            print('Ignoring empty camera frame')
-            return True
-
-        image.flags.writeable = False
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        detection_result = self.hands_detector.process(image)
-
-        if not detection_result.multi_hand_landmarks:
-            self.history = np.array([], dtype=np.uint8)
-            return True
-
-        detection_hand = detection_result.multi_hand_landmarks[0]
-        landmark = detection_hand.landmark
-        button = 0
-        x = max(int(127 * (1.0 - landmark[8].x)), 0)
-        y = max(int(127 * landmark[8].y), 0)
-
-        dx, dy = landmark[4].x - landmark[8].x, landmark[4].y - landmark[8].y
-        self.history = np.append(self.history, 1 if dy < 0.1 else 0)[-self.max_history_count:]
-        grad = self.history[1:] - self.history[:-1]
-
-        if self.history.size == self.max_history_count:
-            state_on_at, state_off_at, on_off_count = 0, 0, 0
-            for i in range(grad.size):
-                if grad[i] == 1:
-                    state_on_at = i
-                    on_off_count += 1
-                elif grad[i] == -1:
-                    state_off_at = i
-                    on_off_count += 1
-
-                if (state_off_at - state_on_at < 10) and on_off_count == 2:
-                    button = 1
-                    self.history = np.array([], dtype=np.uint8)
-
-
-
-        # 0 ~ 127 normalized to 0 ~ 1
-        self.value = [dbus.Byte(button), dbus.Byte(0x00), dbus.Byte(x), dbus.Byte(0x00), dbus.Byte(y)]
-        self.PropertiesChanged('org.bluez.GattCharacteristic1', {
-            'Value': self.value
-        }, [])
-
-        self.value = [dbus.Byte(0x00), dbus.Byte(0x00), dbus.Byte(x), dbus.Byte(0), dbus.Byte(y)]
-        self.PropertiesChanged('org.bluez.GattCharacteristic1', {
-            'Value': self.value
-        }, [])
-
+        if self.channel is not None:
+            snapshot = self.channel.read_new()
+            if snapshot is None:
+                return True
+
+            _, x, y, buttons, hand, clicks, t, _ = snapshot
+            button = (buttons or 1) if clicks != self.clicks else 0
+            self.clicks = clicks
+            if not hand:
+                # The hand was lost before the click was read, click where the cursor is
+                if button:
+                    self.click(button, *self.position())
+                return True
+            x, y = int(x), int(y)
+        else:
+            if self.lifecycle.tracker is None:
+                return True
+
+            scanning = self.duty.scanning
+            self.duty.begin_frame()
+            result = self.lifecycle.update(self.duty.scale * self.qos.scale)
+            changed = self.duty.end_frame(result is not None)
+            if not scanning and self.qos.observe(self.lifecycle.tracker.latency):
+                self.qos.apply(self.lifecycle.tracker, self.duty)
+                changed = True
+            if changed:
+                self.arm(self.notify_report, self.duty.interval_ms)
+            if result is None:
+                return True
+
+            button, x, y, _ = result
+            t = None
+
+        # Absolute x, y in 0 ~ CURSOR_MAX resampled to the output rate, a click sent at once
+        self.push_position(x, y, t)
+        if button:
+            self.click(button, x, y)
+
+        if self.duty is not None:
+            self.duty.cursor_sent()
         return True
 
     def ReadValue(self, options):
-        print('Read Report Chrc')
+        logger.debug('Read Report Chrc')
         return self.value
 
     def WriteValue(self, value, options):
-        print(f'Write Report {self.value}')
+        logger.debug('Write Report %s', self.value)
         self.value = value
 
     def StartNotify(self):
-        print('Start Report Chrc Notification')
+        logger.info('Start Report Chrc Notification')
         if self.notifying:
-            print('Already notifying, nothing to do')
+            logger.debug('Already notifying, nothing to do')
             return
 
         self.notifying = True
+        if self.lifecycle is not None:
+            self.lifecycle.acquire()
+        self.arm(self.notify_report, 50 if self.duty is None else self.duty.interval_ms)
+        self.output.start()
 
     def StopNotify(self):
         if not self.notifying:
-            print('Not notifying, nothing to do')
+            logger.debug('Not notifying, nothing to do')
             return
 
         self.notifying = False
+        self.disarm(self.notify_report)
+        self.output.stop()
+        if self.lifecycle is not None:
+            self.lifecycle.release()
+            cpu, scan, latency, worst = self.duty.summary()
+            logger.info('Hand tracker CPU %.1f%%, %.0f%% scan frames, first cursor %.0f ms mean %.0f ms max',
+                        cpu, scan * 100, latency, worst)
 
 
-class RepDescriptor(Descriptor):
+class RepDescriptor(StaticDescriptor):
     def __init__(self, bus, index, characteristic):
-        Descriptor.__init__(self, bus, index,
-                            '2908', ['read'],
-                            characteristic)
-
-    def ReadValue(self, options):
-        print('Read Rep Descriptor')
         # HID reference: id=1, type=input
-        return dbus.Array(bytearray.fromhex('0101'), signature=dbus.Signature('y'))
+        StaticDescriptor.__init__(self, bus, index,
+                                  '2908', ['read'],
+                                  characteristic, bytes.fromhex('0101'))
 
 
 class ProtoModeChrc(Characteristic):
@@ -2,12 +2,14 @@ import dbus
 import dbus.exceptions
 import dbus.mainloop.glib
 import dbus.service
+import logging
 
-from gi.repository import GLib as GObject
 from random import randint
 from .errors import InvalidValueLengthException, FailedException
 from .gatt import Service, Characteristic
 
+logger = logging.getLogger(__name__)
+
 BLUEZ_SERVICE_NAME = 'org.bluez'
 GATT_MANAGER_IFACE = 'org.bluez.GattManager1'
 DBUS_OM_IFACE =      'org.freedesktop.DBus.ObjectManager'
@@ -57,35 +59,27 @@ class HeartRateMeasurementChrc(Characteristic):
             min(0xffff, self.service.energy_expended + 1)
         self.hr_ee_count += 1
 
-        print('Updating value: ' + repr(value))
+        logger.debug('Updating value: %r', value)
 
         self.PropertiesChanged(GATT_CHRC_IFACE, {'Value': value}, [])
 
         return self.notifying
 
-    def _update_hr_msrmt_simulation(self):
-        print('Update HR Measurement Simulation')
-
-        if not self.notifying:
-            return
-
-        GObject.timeout_add(1000, self.hr_msrmt_cb)
-
     def StartNotify(self):
         if self.notifying:
-            print('Already notifying, nothing to do')
+            logger.debug('Already notifying, nothing to do')
             return
 
         self.notifying = True
-        self._update_hr_msrmt_simulation()
+        self.arm(self.hr_msrmt_cb, 1000)
 
     def StopNotify(self):
         if not self.notifying:
-            print('Not notifying, nothing to do')
+            logger.debug('Not notifying, nothing to do')
             return
 
         self.notifying = False
-        self._update_hr_msrmt_simulation()
+        self.disarm(self.hr_msrmt_cb)
 
 
 class BodySensorLocationChrc(Characteristic):
@@ -106,16 +100,16 @@ class HeartRateControlPointChrc(Characteristic):
         Characteristic.__init__(self, bus, index, self.HR_CTRL_PT_UUID, ['write'], service)
 
     def WriteValue(self, value, options):
-        print('Heart Rate Control Point WriteValue called')
+        logger.debug('Heart Rate Control Point WriteValue called')
 
         if len(value) != 1:
             raise InvalidValueLengthException()
 
         byte = value[0]
-        print('Control Point value: ' + repr(byte))
+        logger.debug('Control Point value: %r', byte)
 
         if byte != 1:
             raise FailedException("0x80")
 
-        print('Energy Expended field reset!')
+        logger.info('Energy Expended field reset!')
         self.service.energy_expended = 0
@@ -0,0 +1,220 @@
+"""
+Text to HID keyboard report encoding.
+
+Characters are looked up in a table built once at import time, so encoding a
+string is a single indexed read per character.
+Key codes: https://www.usb.org/sites/default/files/documents/hut1_12v2.pdf
+"""
+
+# Keyboard Modifier bits
+MOD_NONE =   0x00
+MOD_LCTRL =  0x01
+MOD_LSHIFT = 0x02
+MOD_LALT =   0x04
+MOD_LGUI =   0x08
+MOD_RCTRL =  0x10
+MOD_RSHIFT = 0x20
+MOD_RALT =   0x40
+MOD_RGUI =   0x80
+
+KEY_NONE = 0x00
+
+# Named keys usable in macros, e.g. ('ctrl', 'c') or ('enter',)
+NAMED_KEYS = {
+    'enter': 0x28, 'esc': 0x29, 'backspace': 0x2a, 'tab': 0x2b, 'space': 0x2c,
+    'capslock': 0x39,
+    'f1': 0x3a, 'f2': 0x3b, 'f3': 0x3c, 'f4': 0x3d, 'f5': 0x3e, 'f6': 0x3f,
+    'f7': 0x40, 'f8': 0x41, 'f9': 0x42, 'f10': 0x43, 'f11': 0x44, 'f12': 0x45,
+    'printscreen': 0x46, 'scrolllock': 0x47, 'pause': 0x48,
+    'insert': 0x49, 'home': 0x4a, 'pageup': 0x4b, 'delete': 0x4c, 'end': 0x4d, 'pagedown': 0x4e,
+    'right': 0x4f, 'left': 0x50, 'down': 0x51, 'up': 0x52,
+}
+
+NAMED_MODIFIERS = {
+    'ctrl': MOD_LCTRL, 'shift': MOD_LSHIFT, 'alt': MOD_LALT, 'gui': MOD_LGUI,
+    'rctrl': MOD_RCTRL, 'rshift': MOD_RSHIFT, 'ralt': MOD_RALT, 'rgui': MOD_RGUI,
+}
+
+
+def _build_ascii_table():
+    table = [None] * 128
+
+    for i, ch in enumerate('abcdefghijklmnopqrstuvwxyz'):
+        table[ord(ch)] = (MOD_NONE, 0x04 + i)
+        table[ord(ch.upper())] = (MOD_LSHIFT, 0x04 + i)
+
+    for i, ch in enumerate('1234567890'):
+        table[ord(ch)] = (MOD_NONE, 0x1e + i)
+    for i, ch in enumerate('!@#$%^&*()'):
+        table[ord(ch)] = (MOD_LSHIFT, 0x1e + i)
+
+    # US layout punctuation: (unshifted, shifted, keycode)
+    for plain, shifted, code in [
+        ('-', '_', 0x2d), ('=', '+', 0x2e), ('[', '{', 0x2f), (']', '}', 0x30),
+        ('\\', '|', 0x31), (';', ':', 0x33), ("'", '"', 0x34), ('`', '~', 0x35),
+        (',', '<', 0x36), ('.', '>', 0x37), ('/', '?', 0x38),
+    ]:
+        table[ord(plain)] = (MOD_NONE, code)
+        table[ord(shifted)] = (MOD_LSHIFT, code)
+
+    table[ord('\n')] = (MOD_NONE, NAMED_KEYS['enter'])
+    table[ord('\t')] = (MOD_NONE, NAMED_KEYS['tab'])
+    table[ord(' ')] = (MOD_NONE, NAMED_KEYS['space'])
+    table[0x08] = (MOD_NONE, NAMED_KEYS['backspace'])
+    table[0x1b] = (MOD_NONE, NAMED_KEYS['esc'])
+    return tuple(table)
+
+
+# ASCII code point -> (modifier, keycode), or None if the character can't be typed
+ASCII_TO_HID = _build_ascii_table()
+
+
+def encode_char(ch):
+    code = ord(ch)
+    entry = ASCII_TO_HID[code] if code < 128 else None
+    if entry is None:
+        raise ValueError(f'Character {ch!r} has no HID keycode')
+    return entry
+
+
+def encode_macro(names):
+    """
+    Resolve a macro step such as ('ctrl', 'shift', 't') into (modifier, [keycodes]).
+    """
+    modifier, keycodes = MOD_NONE, []
+    for name in names:
+        if name in NAMED_MODIFIERS:
+            modifier |= NAMED_MODIFIERS[name]
+        elif name in NAMED_KEYS:
+            keycodes.append(NAMED_KEYS[name])
+        elif len(name) == 1:
+            mod, code = encode_char(name)
+            modifier |= mod
+            keycodes.append(code)
+        else:
+            raise ValueError(f'Unknown key name {name!r}')
+    return modifier, keycodes
+
+
+# Keyboard report layouts, see ReportMapCharacteristic for the descriptors
+#   single: [Modifier, KeyCode]
+#   6kro:   [Modifier, Reserved, KeyCode x 6]       (boot keyboard layout)
+#   nkro:   [Modifier, KeyCode bitmap of NKRO_KEY_COUNT bits]
+REPORT_MODES = ('single', '6kro', 'nkro')
+NKRO_KEY_COUNT = 0x68
+KEY_ERROR_ROLLOVER = 0x01
+
+
+class KeyboardReportEncoder:
+    """
+    Builds keyboard input reports and turns text into press/release report pairs.
+
+    Consecutive characters that share a modifier and use different keys are
+    pressed together in one report, up to the rollover of the report mode, so a
+    string needs fewer notifications than two per character.
+    Held keys are tracked in a preallocated bitmap indexed by keycode.
+    """
+
+    def __init__(self, mode='single'):
+        if mode not in REPORT_MODES:
+            raise ValueError(f'Unknown keyboard report mode {mode!r}')
+
+        self.mode = mode
+        if mode == 'single':
+            self.rollover, self.report_len = 1, 2
+        elif mode == '6kro':
+            self.rollover, self.report_len = 6, 8
+        else:
+            self.rollover, self.report_len = NKRO_KEY_COUNT, 1 + NKRO_KEY_COUNT // 8
+
+        self.release_report = bytes(self.report_len)
+        self._buf = bytearray(self.report_len)
+        self.held_modifier = MOD_NONE
+        self.held = bytearray(32)
+
+    def encode(self, modifier, keycodes):
+        buf = self._buf
+        buf[:] = self.release_report
+        buf[0] = modifier
+
+        if self.mode == 'nkro':
+            for code in keycodes:
+                if code < NKRO_KEY_COUNT:
+                    buf[1 + (code >> 3)] |= 1 << (code & 7)
+        elif len(keycodes) > self.rollover:
+            # Too many keys for the array: report phantom state
+            start = self.report_len - self.rollover
+            buf[start:] = bytes([KEY_ERROR_ROLLOVER]) * self.rollover
+        else:
+            start = self.report_len - self.rollover
+            buf[start:start + len(keycodes)] = bytes(keycodes)
+
+        return bytes(buf)
+
+    def key_down(self, code):
+        if 0xe0 <= code <= 0xe7:
+            self.held_modifier |= 1 << (code - 0xe0)
+        else:
+            self.held[code >> 3] |= 1 << (code & 7)
+
+    def key_up(self, code):
+        if 0xe0 <= code <= 0xe7:
+            self.held_modifier &= ~(1 << (code - 0xe0))
+        else:
+            self.held[code >> 3] &= ~(1 << (code & 7))
+
+    def release_all(self):
+        self.held_modifier = MOD_NONE
+        self.held[:] = bytes(len(self.held))
+
+    def held_report(self):
+        """
+        Report for the keys currently held via key_down/key_up.
+        """
+        if self.mode == 'nkro':
+            buf = self._buf
+            buf[0] = self.held_modifier
+            buf[1:] = self.held[:NKRO_KEY_COUNT // 8]
+            return bytes(buf)
+
+        keycodes = [
+            (i << 3) | bit
+            for i, byte in enumerate(self.held) if byte
+            for bit in range(8) if byte >> bit & 1
+        ]
+        return self.encode(self.held_modifier, keycodes)
+
+    def chords(self, text):
+        """
+        Group text into (modifier, keycodes) chords, each pressed in a single report.
+        """
+        modifier, keycodes = None, []
+        for ch in text:
+            mod, code = encode_char(ch)
+            # A bitmap report presses keys in keycode order, so only ascending runs keep the text order
+            descending = self.mode == 'nkro' and keycodes and code < keycodes[-1]
+            if mod != modifier or code in keycodes or len(keycodes) >= self.rollover or descending:
+                if keycodes:
+                    yield modifier, keycodes
+                modifier, keycodes = mod, []
+            keycodes.append(code)
+
+        if keycodes:
+            yield modifier, keycodes
+
+    def text_reports(self, text):
+        release = self.release_report
+        for modifier, keycodes in self.chords(text):
+            yield self.encode(modifier, keycodes)
+            yield release
+
+    def macro_reports(self, steps):
+        """
+        Reports for a macro: a sequence of key name tuples, each pressed then released.
+        """
+        release = self.release_report
+        for step in steps:
+            modifier, keycodes = encode_macro(step)
+            for i in range(0, max(len(keycodes), 1), self.rollover):
+                yield self.encode(modifier, keycodes[i:i + self.rollover])
+                yield release
@@ -3,15 +3,21 @@ import dbus.exceptions
 import dbus.mainloop.glib
 import dbus.service
 
+import logging
 import struct
 import array
 import sys
 import time
 
+from collections import deque
+
 from gi.repository import GLib as GObject
 from random import randint
 from .errors import InvalidArgsException, NotPermittedException, InvalidValueLengthException, FailedException
-from .gatt import Service, Characteristic, Descriptor
+from .gatt import Service, Characteristic, StaticCharacteristic, StaticDescriptor
+from .keyboard_codec import KeyboardReportEncoder, REPORT_MODES
+
+logger = logging.getLogger(__name__)
 
 BLUEZ_SERVICE_NAME = 'org.bluez'
 GATT_MANAGER_IFACE = 'org.bluez.GattManager1'
@@ -22,14 +28,31 @@ GATT_SERVICE_IFACE = 'org.bluez.GattService1'
 GATT_CHRC_IFACE =    'org.bluez.GattCharacteristic1'
 GATT_DESC_IFACE =    'org.bluez.GattDescriptor1'
 
+# Keyboard input (ReportId 1) descriptors for each report mode
+KEYBOARD_REPORT_MAPS = {
+    # [Modifier, KeyCode]
+    'single': '05010906a1018501050719e029e71500250175019508810295017508150025650507190029658100c0',
+    # [Modifier, Reserved, KeyCode x 6], the boot keyboard report layout
+    '6kro': '05010906a1018501050719e029e71500250175019508810295017508810195067508150025650507190029658100c0',
+    # [Modifier, bitmap of keycodes 0x00-0x67]
+    'nkro': '05010906a1018501050719e029e71500250175019508810205071900296715002501750195688102c0',
+}
+
+# Consumer input (ReportId 2) descriptor
+CONSUMER_REPORT_MAP = '050C0901A101850275109501150126ff0719012Aff078100C0'
+
 
 #name="Human Interface Device" sourceId="org.bluetooth.service.human_interface_device" type="primary" uuid="1812"
 class KeyboardService(Service):
     SERVICE_UUID = '1812'
 
-    def __init__(self, bus, index):
+    def __init__(self, bus, index, report_mode='single'):
         Service.__init__(self, bus, index, self.SERVICE_UUID, True)
 
+        if report_mode not in REPORT_MODES:
+            raise ValueError(f'Unknown keyboard report mode {report_mode!r}')
+        self.report_mode = report_mode
+
         self.protocolMode = ProtocolModeCharacteristic(bus, 0, self)
         self.hidInfo = HIDInfoCharacteristic(bus, 1, self)
         self.controlPoint = ControlPointCharacteristic(bus, 2, self)
@@ -71,28 +94,29 @@ class ProtocolModeCharacteristic(Characteristic):
         #self.value = dbus.Array([1], signature=dbus.Signature('y'))
         self.parent = service
         self.value = dbus.Array(bytearray.fromhex('01'), signature=dbus.Signature('y'))
-        print(f'***ProtocolMode value***: {self.value}')
+        logger.debug('***ProtocolMode value***: %s', self.value)
 
     def ReadValue(self, options):
-        print(f'Read ProtocolMode: {self.value}')
+        logger.debug('Read ProtocolMode: %s', self.value)
         return self.value
 
     def WriteValue(self, value, options):
-        print(f'Write ProtocolMode {value}')
+        logger.debug('Write ProtocolMode %s', value)
         self.value = value
 
 
 #id="hid_information" name="HID Information" sourceId="org.bluetooth.characteristic.hid_information" uuid="2A4A"
-class HIDInfoCharacteristic(Characteristic):
+class HIDInfoCharacteristic(StaticCharacteristic):
 
     CHARACTERISTIC_UUID = '2A4A'
 
     def __init__(self, bus, index, service):
-        Characteristic.__init__(
+        StaticCharacteristic.__init__(
                 self, bus, index,
                 self.CHARACTERISTIC_UUID,
                 ['read'],
-                service)
+                service,
+                bytes.fromhex('01110002'))
 
         '''
         <Field name="bcdHID">
@@ -130,13 +154,6 @@ class HIDInfoCharacteristic(Characteristic):
         </Field>
         '''
 
-        self.value = dbus.Array(bytearray.fromhex('01110002'), signature=dbus.Signature('y'))
-        print(f'***HIDInformation value***: {self.value}')
-
-    def ReadValue(self, options):
-        print(f'Read HIDInformation: {self.value}')
-        return self.value
-
 #sourceId="org.bluetooth.characteristic.hid_control_point" uuid="2A4C"
 class ControlPointCharacteristic(Characteristic):
 
@@ -150,24 +167,32 @@ class ControlPointCharacteristic(Characteristic):
                 service)
 
         self.value = dbus.Array(bytearray.fromhex('00'), signature=dbus.Signature('y'))
-        print(f'***ControlPoint value***: {self.value}')
+        logger.debug('***ControlPoint value***: %s', self.value)
 
     def WriteValue(self, value, options):
-        print(f'Write ControlPoint {value}')
+        logger.debug('Write ControlPoint %s', value)
         self.value = value
 
 
 #sourceId="org.bluetooth.characteristic.report_map" uuid="2A4B"
-class ReportMapCharacteristic(Characteristic):
+class ReportMapCharacteristic(StaticCharacteristic):
 
     CHARACTERISTIC_UUID = '2A4B'
 
     def __init__(self, bus, index, service):
-        Characteristic.__init__(
+        # The keyboard report layout depends on the service report mode:
+        #   single: the layout below
+        #   6kro:   [Modifier, Reserved, KeyCode x 6]
+        #   nkro:   [Modifier, 13 bytes bitmap where bit N is keycode N pressed]
+
+        #USB HID Report Descriptor
+        report_map = KEYBOARD_REPORT_MAPS[service.report_mode] + CONSUMER_REPORT_MAP
+        StaticCharacteristic.__init__(
                 self, bus, index,
                 self.CHARACTERISTIC_UUID,
                 ['read'],
-                service)
+                service,
+                bytes.fromhex(report_map))
         '''
         <Field name="Report Map Value">
             <Requirement>Mandatory</Requirement>
@@ -219,14 +244,6 @@ class ReportMapCharacteristic(Characteristic):
         # </Report Layouts>
         ##############################################################################################
 
-        #USB HID Report Descriptor
-        self.value = dbus.Array(bytearray.fromhex('05010906a1018501050719e029e71500250175019508810295017508150025650507190029658100c0050C0901A101850275109501150126ff0719012Aff078100C0'))
-        print(f'***ReportMap value***: {self.value}')
-
-    def ReadValue(self, options):
-        print(f'Read ReportMap: {self.value}')
-        return self.value
-
 
 #id="report" name="Report" sourceId="org.bluetooth.characteristic.report" uuid="2A4D"
 class Report1Characteristic(Characteristic):
@@ -252,45 +269,102 @@ class Report1Characteristic(Characteristic):
 
         self.add_descriptor(Report1ReferenceDescriptor(bus, 1, self))
 
-        self.value = [dbus.Byte(0x00),dbus.Byte(0x00)]
-        print(f'***Report value***: {self.value}')
+        self.encoder = KeyboardReportEncoder(service.report_mode)
+        self.value = dbus.Array(self.encoder.release_report, signature=dbus.Signature('y'))
+        logger.debug('***Report value***: %s', self.value)
+
+        # Reports waiting to be sent. They are drained `reports_per_tick` at a time
+        # every `tick_ms`, which should roughly match the connection interval so the
+        # controller's notification queue never overflows and drops key releases.
+        self.pending = deque()
+        self.tick_ms = 8
+        self.reports_per_tick = 2
+        self.notifying = False
+        self.timer = None
+        # Inputs waiting for their last report to be notified: (reports sent by then, read time, stats)
+        self.sent = 0
+        self.marks = deque()
+
+    def type_text(self, text):
+        self.pending.extend(self.encoder.text_reports(text))
+        self._schedule()
+
+    def type_macro(self, steps):
+        # e.g. [('ctrl', 'a'), ('ctrl', 'c'), ('enter',)]
+        self.pending.extend(self.encoder.macro_reports(steps))
+        self._schedule()
+
+    def key_down(self, code):
+        self.encoder.key_down(code)
+        self.pending.append(self.encoder.held_report())
+        self._schedule()
+
+    def key_up(self, code):
+        self.encoder.key_up(code)
+        self.pending.append(self.encoder.held_report())
+        self._schedule()
+
+    def mark_input(self, read_at, stats):
+        """
+        Record in `stats` the latency from `read_at` to the notification of the last report queued so far.
+        """
+        self.marks.append((self.sent + len(self.pending), read_at, stats))
+
+    def _schedule(self):
+        if self.notifying and self.timer is None and self.pending:
+            self.timer = GObject.timeout_add(self.tick_ms, self.send)
 
     def send(self):
+        for _ in range(self.reports_per_tick):
+            if not self.pending:
+                break
+            self.value = dbus.Array(self.pending.popleft(), signature=dbus.Signature('y'))
+            self.PropertiesChanged(GATT_CHRC_IFACE, { 'Value': self.value }, [])
+            self.sent += 1
 
-        #send keyCode: 'M'
-        print(f'***send keyCode: "M"***');
-        self.PropertiesChanged(GATT_CHRC_IFACE, { 'Value': [dbus.Byte(0x02),dbus.Byte(0x10)] }, [])
-        self.PropertiesChanged(GATT_CHRC_IFACE, { 'Value': [dbus.Byte(0x00),dbus.Byte(0x00)] }, [])
-        print(f'***sent***')
-        return True
+        if self.marks and self.marks[0][0] <= self.sent:
+            now = time.monotonic_ns()
+            while self.marks and self.marks[0][0] <= self.sent:
+                _, read_at, stats = self.marks.popleft()
+                stats.record(now - read_at)
+
+        if self.notifying and self.pending:
+            return True
+
+        self.timer = None
+        return False
 
     def ReadValue(self, options):
-        print(f'Read Report: {self.value}')
+        logger.debug('Read Report: %s', self.value)
         return self.value
 
     def WriteValue(self, value, options):
-        print(f'Write Report {self.value}')
+        logger.debug('Write Report %s', self.value)
         self.value = value
 
     def StartNotify(self):
-        print(f'Start Start Report Keyboard Input')
-        GObject.timeout_add(10000, self.send)
+        logger.info('Start Start Report Keyboard Input')
+        self.notifying = True
+        self._schedule()
 
     def StopNotify(self):
-        print(f'Stop Report Keyboard Input')
+        logger.info('Stop Report Keyboard Input')
+        self.notifying = False
 
 
 #type="org.bluetooth.descriptor.report_reference" uuid="2908"
-class Report1ReferenceDescriptor(Descriptor):
+class Report1ReferenceDescriptor(StaticDescriptor):
 
     DESCRIPTOR_UUID = '2908'
 
     def __init__(self, bus, index, characteristic):
-        Descriptor.__init__(
+        # This report uses ReportId 1 as defined in the ReportMap characteristic
+        StaticDescriptor.__init__(
                 self, bus, index,
                 self.DESCRIPTOR_UUID,
                 ['read'],
-                characteristic)
+                characteristic,
+                bytes.fromhex('0101'))
 
         '''
         <Field name="Report ID">
@@ -315,14 +389,6 @@ class Report1ReferenceDescriptor(Descriptor):
         </Field>
         '''
 
-        # This report uses ReportId 1 as defined in the ReportMap characteristic
-        self.value = dbus.Array(bytearray.fromhex('0101'), signature=dbus.Signature('y'))
-        print(f'***ReportReference***: {self.value}')
-
-    def ReadValue(self, options):
-        print(f'Read ReportReference: {self.value}')
-        return self.value
-
 
 #id="report" name="Report" sourceId="org.bluetooth.characteristic.report" uuid="2A4D"
 class Report2Characteristic(Characteristic):
@@ -349,44 +415,47 @@ class Report2Characteristic(Characteristic):
         self.add_descriptor(Report2ReferenceDescriptor(bus, 1, self))
 
         self.value = [dbus.Byte(0x00),dbus.Byte(0x00)]
-        print(f'***Report value***: {self.value}')
+        logger.debug('***Report value***: %s', self.value)
 
     def send(self):
 
         #send keyCode: 'VolumeUp'
-        print(f'***send keyCode: "VolumeUp"***');
+        logger.debug('***send keyCode: "VolumeUp"***')
         self.PropertiesChanged(GATT_CHRC_IFACE, { 'Value': [dbus.Byte(0xe9), dbus.Byte(0x00)] }, [])
         self.PropertiesChanged(GATT_CHRC_IFACE, { 'Value': [dbus.Byte(0x00), dbus.Byte(0x00)] }, [])
-        print(f'***sent***')
+        logger.debug('***sent***')
         return True
 
     def ReadValue(self, options):
-        print(f'Read Report: {self.value}')
+        logger.debug('Read Report: %s', self.value)
         return self.value
 
     def WriteValue(self, value, options):
-        print(f'Write Report {self.value}')
+        logger.debug('Write Report %s', self.value)
         self.value = value
 
     def StartNotify(self):
-        print(f'Start Report Consumer Input')
-        GObject.timeout_add(15000, self.send)
+        logger.info('Start Report Consumer Input')
+        self.arm(self.send, 15000)
 
     def StopNotify(self):
-        print(f'Stop Start Report Consumer Input')
+        logger.info('Stop Start Report Consumer Input')
+        self.disarm(self.send)
 
 
 #type="org.bluetooth.descriptor.report_reference" uuid="2908"
-class Report2ReferenceDescriptor(Descriptor):
+class Report2ReferenceDescriptor(StaticDescriptor):
 
     DESCRIPTOR_UUID = '2908'
 
     def __init__(self, bus, index, characteristic):
-        Descriptor.__init__(
+        # This report uses ReportId 2 as defined in the ReportMap characteristic
+        StaticDescriptor.__init__(
                 self, bus, index,
                 self.DESCRIPTOR_UUID,
                 ['read'],
-                characteristic)
+                characteristic,
+                bytes.fromhex('0201'))
 
         '''
         <Field name="Report ID">
@@ -410,11 +479,3 @@ class Report2ReferenceDescriptor(Descriptor):
             </Enumerations>
         </Field>
         '''
-
-        # This report uses ReportId 2 as defined in the ReportMap characteristic
-        self.value = dbus.Array(bytearray.fromhex('0201'), signature=dbus.Signature('y'))
-        print(f'***ReportReference***: {self.value}')
-
-    def ReadValue(self, options):
-        print(f'Read ReportReference: {self.value}')
-        return self.value
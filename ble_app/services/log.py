@@ -0,0 +1,97 @@
+"""
+Logging for the GATT services.
+
+Services log through `logging.getLogger(__name__)` with %-style arguments, so
+a record below the enabled level costs one cached level check and no
+formatting. setup_logging() puts a QueueHandler on the `ble_app` logger: the
+main loop only enqueues records, and a QueueListener thread does the
+formatting and the possibly blocking write to stderr / journald. Records
+from the same call site are rate limited before they are queued.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import time
+
+LOGGER_NAME = 'ble_app'
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most `burst` records per `interval` seconds from each call site.
+
+    A call site is the (file, line) of the logging call, so a chatty ReadValue
+    doesn't hide records from anywhere else. The number of records dropped is
+    added to the next record let through from the same call site.
+    """
+
+    def __init__(self, interval=1.0, burst=5):
+        logging.Filter.__init__(self)
+        self.interval = interval
+        self.burst = burst
+        self.sites = {}
+
+    def filter(self, record):
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        start, count, dropped = self.sites.get(key, (now, 0, 0))
+
+        if now - start >= self.interval:
+            start, count = now, 0
+
+        if count >= self.burst:
+            self.sites[key] = (start, count, dropped + 1)
+            return False
+
+        if dropped:
+            record.msg = f'{record.msg} ({dropped} similar messages suppressed)'
+        self.sites[key] = (start, count + 1, 0)
+        return True
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler for a listener in the same process: records are queued as they
+    are, leaving the message formatting to the listener thread.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class LogListener(logging.handlers.QueueListener):
+    """
+    QueueListener that can be stopped more than once, e.g. by the caller and again at exit.
+    """
+
+    def stop(self):
+        if self._thread is not None:
+            logging.handlers.QueueListener.stop(self)
+
+
+def setup_logging(level=logging.INFO, interval=1.0, burst=5, handler=None):
+    """
+    Route `ble_app` logs through a rate limiter and a background writer thread.
+
+    Returns the QueueListener, which is also stopped (flushing pending records) at exit.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+    logger.propagate = False
+
+    if handler is None:
+        handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    records = queue.SimpleQueue()
+    queue_handler = LocalQueueHandler(records)
+    queue_handler.addFilter(RateLimitFilter(interval, burst))
+    logger.handlers[:] = [queue_handler]
+
+    listener = LogListener(records, handler)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -2,9 +2,15 @@ import dbus
 import dbus.exceptions
 import dbus.mainloop.glib
 import dbus.service
+import logging
+import struct
 
+from array import array
 from gi.repository import GLib as GObject
-from .gatt import Service, Characteristic, Descriptor
+from .gatt import Service, Characteristic, StaticCharacteristic, StaticDescriptor
+from .output_stage import OutputStage
+
+logger = logging.getLogger(__name__)
 
 BLUEZ_SERVICE_NAME = 'org.bluez'
 GATT_MANAGER_IFACE = 'org.bluez.GattManager1'
@@ -15,20 +21,111 @@ GATT_SERVICE_IFACE = 'org.bluez.GattService1'
 GATT_CHRC_IFACE =    'org.bluez.GattCharacteristic1'
 GATT_DESC_IFACE =    'org.bluez.GattDescriptor1'
 
+# contact identifier, Tip Switch / In Range bits, x, y
+CONTACT_SLOT = struct.Struct('<BBHH')
+TIP_SWITCH = 0x01
+IN_RANGE =   0x02
+# Logical Maximum of the X and Y usages
+LOGICAL_MAX = 10000
+
+
+def touch_report_map(max_contacts, contacts_per_report):
+    # https://docs.microsoft.com/en-us/windows-hardware/design/component-guidelines/sample-report-descriptor-for-a-touch-digitizer-device
+    hex_list = [
+        0x05, 0x0D,                    # USAGE_PAGE(Digitizers)
+        0x09, 0x04,                    # USAGE     (Touch Screen)
+        0xA1, 0x01,                    # COLLECTION(Application)
+        0x85, 0x01,                    #   REPORT_ID (Touch)
+        # define the maximum amount of fingers that the device supports
+        0x09, 0x55,                    #   USAGE (Contact Count Maximum)
+        0x15, 0x00,                    #   LOGICAL_MINIMUM (0)
+        0x25, max_contacts,            #   LOGICAL_MAXIMUM (CONTACT_COUNT_MAXIMUM)
+        0x75, 0x08,                    #   REPORT_SIZE (8)
+        0x95, 0x01,                    #   REPORT_COUNT(1)
+        0xB1, 0x02,                    #   FEATURE (Data,Var,Abs)
+        # define the amount of fingers in this frame, sent in the first report of the frame and 0 in the rest
+        0x09, 0x54,                    #   USAGE (Contact count)
+        0x81, 0x02,                    #   INPUT (Data,Var,Abs)
+    ]
+
+    # declare one finger collection per contact slot in a report
+    for _ in range(contacts_per_report):
+        hex_list += [
+            0x05, 0x0D,                #   USAGE_PAGE(Digitizers)
+            0x09, 0x22,                #   USAGE (Finger)
+            0xA1, 0x02,                #   COLLECTION (Logical)
+            # declare an identifier for the finger
+            0x09, 0x51,                #     USAGE (Contact Identifier)
+            0x15, 0x00,                #     LOGICAL_MINIMUM (0)
+            0x25, 0x7F,                #     LOGICAL_MAXIMUM (127)
+            0x75, 0x08,                #     REPORT_SIZE (8)
+            0x95, 0x01,                #     REPORT_COUNT (1)
+            0x81, 0x02,                #     INPUT (Data,Var,Abs)
+            # declare Tip Switch and In Range
+            0x09, 0x42,                #     USAGE (Tip Switch)
+            0x09, 0x32,                #     USAGE (In Range)
+            0x25, 0x01,                #     LOGICAL_MAXIMUM (1)
+            0x75, 0x01,                #     REPORT_SIZE (1)
+            0x95, 0x02,                #     REPORT_COUNT(2)
+            0x81, 0x02,                #     INPUT (Data,Var,Abs)
+            # declare the remaining 6 bits of the first data byte as constant -> the driver will ignore them
+            0x95, 0x06,                #     REPORT_COUNT (6)
+            0x81, 0x03,                #     INPUT (Cnst,Ary,Abs)
+            # define absolute X and Y coordinates of 16 bit each (percent values multiplied with 100)
+            0x05, 0x01,                #     USAGE_PAGE (Generic Desktop)
+            0x09, 0x30,                #     Usage (X)
+            0x09, 0x31,                #     Usage (Y)
+            0x16, 0x00, 0x00,          #     Logical Minimum (0)
+            0x26, 0x10, 0x27,          #     Logical Maximum (10000)
+            0x36, 0x00, 0x00,          #     Physical Minimum (0)
+            0x46, 0x10, 0x27,          #     Physical Maximum (10000)
+            0x66, 0x00, 0x00,          #     UNIT (None)
+            0x75, 0x10,                #     Report Size (16),
+            0x95, 0x02,                #     Report Count (2),
+            0x81, 0x02,                #     Input (Data,Var,Abs)
+            0xC0,                      #   END_COLLECTION
+        ]
+
+    hex_list += [
+        0xC0                           # END_COLLECTION
+    ]
+
+    # with this declaration a data packet must be sent as:
+    # byte 1       -> "contact count"        (contacts in the frame, 0 for the following reports of the frame)
+    # per slot:
+    #   byte 1     -> "contact identifier"   (any value)
+    #   byte 2     -> "Tip Switch" state     (bit 0 = Tip Switch up/down, bit 1 = In Range)
+    #   byte 3,4   -> absolute X coordinate  (0...10000)
+    #   byte 5,6   -> absolute Y coordinate  (0...10000)
+    return hex_list
+
 
 class MultitapService(Service):
+    """
+    HID touch screen reporting up to `max_contacts` fingers.
+
+    Reports use hybrid mode: each report carries `contacts_per_report` contact
+    slots, and a frame with more changed contacts is split over sequential
+    reports. The default of 3 slots keeps a report within the 20 byte
+    notification payload of the default ATT MTU. Contact positions pushed with
+    ReportChrc.push_contact are resampled to `output_hz`.
+    """
     HID_UUID = '1812'
 
-    def __init__(self, bus, index):
+    def __init__(self, bus, index, max_contacts=10, contacts_per_report=3, output_hz=90):
         Service.__init__(self, bus, index, self.HID_UUID, primary=True)
+        self.output_hz = output_hz
+        self.max_contacts = max_contacts
+        self.contacts_per_report = contacts_per_report
         self.add_characteristic(InfoChrc(bus, 0, self))
         self.add_characteristic(InputRepMapChrc(bus, 1, self))
         self.add_characteristic(CtrlPntChrc(bus, 2, self))
-        self.add_characteristic(ReportChrc(bus, 3, self))
+        self.report = ReportChrc(bus, 3, self)
+        self.add_characteristic(self.report)
         self.add_characteristic(ProtoModeChrc(bus, 4, self))
 
 
-class InfoChrc(Characteristic):
+class InfoChrc(StaticCharacteristic):
     """
     HID Information.
     """
@@ -36,15 +133,11 @@ class InfoChrc(Characteristic):
     INFO_UUID = '2a4a'
 
     def __init__(self, bus, index, service):
-        Characteristic.__init__(self, bus, index, self.INFO_UUID, ['read'], service)
-        self.value = dbus.Array(bytearray.fromhex('01020002'), signature=dbus.Signature('y'))
-
-    def ReadValue(self, options):
         # HID info: ver=1.1, country=0, flags=normal
-        return self.value
+        StaticCharacteristic.__init__(self, bus, index, self.INFO_UUID, ['read'], service, bytes.fromhex('01020002'))
 
 
-class InputRepMapChrc(Characteristic):
+class InputRepMapChrc(StaticCharacteristic):
     """
     HID input report map.
     """
@@ -52,69 +145,8 @@ class InputRepMapChrc(Characteristic):
     REP_MAP_UUID = '2a4b'
 
     def __init__(self, bus, index, service):
-        Characteristic.__init__(self, bus, index, self.REP_MAP_UUID, ['read'], service)
-
-    def ReadValue(self, options):
-        # https://docs.microsoft.com/en-us/windows-hardware/design/component-guidelines/sample-report-descriptor-for-a-touch-digitizer-device
-
-        hex_list = [
-            0x05, 0x0D,                    # USAGE_PAGE(Digitizers)
-            0x09, 0x04,                    # USAGE     (Touch Screen)
-            0xA1, 0x01,                    # COLLECTION(Application)
-            0x85, 0x01,          #   REPORT_ID (Touch)
-            # define the maximum amount of fingers that the device supports
-            0x09, 0x55,                    #   USAGE (Contact Count Maximum)
-            0x25, 0x01,   #   LOGICAL_MAXIMUM (CONTACT_COUNT_MAXIMUM)
-            0xB1, 0x02,                    #   FEATURE (Data,Var,Abs)
-            # define the actual amount of fingers that are concurrently touching the screen
-            0x09, 0x54,                    #   USAGE (Contact count)
-            0x95, 0x01,                    #   REPORT_COUNT(1)
-            0x75, 0x08,                    #   REPORT_SIZE (8)
-            0x81, 0x02,                    #   INPUT (Data,Var,Abs)
-            # declare a finger collection
-            0x09, 0x22,                    #   USAGE (Finger)
-            0xA1, 0x02,                    #   COLLECTION (Logical)
-            # declare an identifier for the finger
-            0x09, 0x51,                    #     USAGE (Contact Identifier)
-            0x75, 0x08,                    #     REPORT_SIZE (8)
-            0x95, 0x01,                    #     REPORT_COUNT (1)
-            0x81, 0x02,                    #     INPUT (Data,Var,Abs)
-            # declare Tip Switch and In Range
-            0x09, 0x42,                    #     USAGE (Tip Switch)
-            0x09, 0x32,                    #     USAGE (In Range)
-            0x15, 0x00,                    #     LOGICAL_MINIMUM (0)
-            0x25, 0x01,                    #     LOGICAL_MAXIMUM (1)
-            0x75, 0x01,                    #     REPORT_SIZE (1)
-            0x95, 0x02,                    #     REPORT_COUNT(2)
-            0x81, 0x02,                    #     INPUT (Data,Var,Abs)
-            # declare the remaining 6 bits of the first data byte as constant -> the driver will ignore them
-            0x95, 0x06,                    #     REPORT_COUNT (6)
-            0x81, 0x03,                    #     INPUT (Cnst,Ary,Abs)
-            # define absolute X and Y coordinates of 16 bit each (percent values multiplied with 100)
-            0x05, 0x01,                    #     USAGE_PAGE (Generic Desktop)
-            0x09, 0x30,                    #     Usage (X)
-            0x09, 0x31,                    #     Usage (Y)
-            0x16, 0x00, 0x00,              #     Logical Minimum (0)
-            0x26, 0x10, 0x27,              #     Logical Maximum (10000)
-            0x36, 0x00, 0x00,              #     Physical Minimum (0)
-            0x46, 0x10, 0x27,              #     Physical Maximum (10000)
-            0x66, 0x00, 0x00,              #     UNIT (None)
-            0x75, 0x10,                    #     Report Size (16),
-            0x95, 0x02,                    #     Report Count (2),
-            0x81, 0x02,                    #     Input (Data,Var,Abs)
-            0xC0,                          #   END_COLLECTION
-            0xC0                           # END_COLLECTION
-
-            # with this declaration a data packet must be sent as:
-            # byte 1   -> "contact count"        (always == 1)
-            # byte 2   -> "contact identifier"   (any value)
-            # byte 3   -> "Tip Switch" state     (bit 0 = Tip Switch up/down, bit 1 = In Range)
-            # byte 4,5 -> absolute X coordinate  (0...10000)
-            # byte 6,7 -> absolute Y coordinate  (0...10000)
-        ]
-
-        hex_string = ''.join(['{:02x}'.format(b) for b in hex_list])
-        return dbus.Array(bytearray.fromhex(hex_string))
+        StaticCharacteristic.__init__(self, bus, index, self.REP_MAP_UUID, ['read'], service,
+                                      touch_report_map(service.max_contacts, service.contacts_per_report))
 
 
 class CtrlPntChrc(Characteristic):
@@ -135,6 +167,9 @@ class CtrlPntChrc(Characteristic):
 class ReportChrc(Characteristic):
     """
     HID Report.
+
+    Contact state lives in preallocated per-contact arrays indexed by contact
+    identifier. Only contacts that changed since the last frame are sent.
     """
 
     REP_UUID = '2a4d'
@@ -144,71 +179,110 @@ class ReportChrc(Characteristic):
         self.add_descriptor(RepDescriptor(bus, 0, self))
         self.notifying = False
         self.value = []
-        GObject.timeout_add(5000, self.notify_report)
-
-    def notify_report(self):
-        if not self.notifying:
-            return True
-
-        x, y = 1500, 1000
-
-        self.value = [
-            dbus.Byte(0x01),
-            dbus.Byte(0x01),
-            dbus.Byte(0xff),
-            dbus.Byte(x & 0x00ff), dbus.Byte((x >> 8) & 0x00ff), # x
-            dbus.Byte(y & 0x00ff), dbus.Byte((y >> 8) & 0x00ff), # y
-        ]
 
-        self.PropertiesChanged('org.bluez.GattCharacteristic1', {
-            'Value': self.value
-        }, [])
-
-        self.value = [
-            dbus.Byte(0x01),
-            dbus.Byte(0x01),
-            dbus.Byte(0x00),
-            dbus.Byte(x & 0x00ff), dbus.Byte((x >> 8) & 0x00ff), # x
-            dbus.Byte(y & 0x00ff), dbus.Byte((y >> 8) & 0x00ff), # y
-        ]
-
-        self.PropertiesChanged('org.bluez.GattCharacteristic1', {
-            'Value': self.value
-        }, [])
-
-        return True
+        n = service.max_contacts
+        self.slots = service.contacts_per_report
+        self.state = array('B', bytes(n))       # Tip Switch / In Range bits
+        self.x = array('H', bytes(2 * n))
+        self.y = array('H', bytes(2 * n))
+        self.dirty = array('B', bytes(n))
+        self.report = bytearray(1 + CONTACT_SLOT.size * self.slots)
+        self.flush_pending = False
+        self.output = OutputStage(self._emit_contacts, channels=n, rate_hz=service.output_hz, max_position=LOGICAL_MAX)
+
+    def set_contact(self, contact_id, tip, x, y):
+        state = (TIP_SWITCH | IN_RANGE) if tip else 0
+        if state == self.state[contact_id] and (not tip or (x == self.x[contact_id] and y == self.y[contact_id])):
+            return
+        self.state[contact_id] = state
+        self.x[contact_id] = x
+        self.y[contact_id] = y
+        self.dirty[contact_id] = 1
+
+    def touch(self, contact_id, tip, x, y):
+        # Contacts arriving in the same main loop iteration are sent as one frame
+        if contact_id >= len(self.state):
+            logger.warning('Ignoring contact %s, max %s contacts', contact_id, len(self.state))
+            return
+        self.set_contact(contact_id, tip, x, y)
+        if not self.flush_pending:
+            self.flush_pending = True
+            GObject.idle_add(self.flush)
+
+    def push_contact(self, contact_id, tip, x, y, t=None):
+        # Timestamped contact sample, sent at the output rate instead of the input rate
+        if contact_id >= len(self.state):
+            logger.warning('Ignoring contact %s, max %s contacts', contact_id, len(self.state))
+            return
+        if tip:
+            self.output.push(contact_id, x, y, t)
+        else:
+            self.output.release(contact_id)
+            self.touch(contact_id, False, x, y)
+
+    def _emit_contacts(self, channels, positions):
+        for i, (x, y) in zip(channels.tolist(), positions.round().astype(int).tolist()):
+            self.set_contact(i, True, x, y)
+        self.flush()
+
+    def frame_reports(self):
+        """
+        Pack the changed contacts into hybrid mode reports and clear their dirty flags.
+        """
+        changed = [i for i, d in enumerate(self.dirty) if d]
+        report, slot_size = self.report, CONTACT_SLOT.size
+        reports = []
+
+        for start in range(0, len(changed), self.slots):
+            report[:] = bytes(len(report))
+            report[0] = len(changed) if start == 0 else 0
+            for k, i in enumerate(changed[start:start + self.slots]):
+                CONTACT_SLOT.pack_into(report, 1 + k * slot_size, i, self.state[i], self.x[i], self.y[i])
+                self.dirty[i] = 0
+            reports.append(bytes(report))
+
+        return reports
+
+    def flush(self):
+        self.flush_pending = False
+        for report in self.frame_reports():
+            self.value = dbus.Array(report, signature=dbus.Signature('y'))
+            if self.notifying:
+                self.PropertiesChanged('org.bluez.GattCharacteristic1', {
+                    'Value': self.value
+                }, [])
+        return False
 
     def ReadValue(self, options):
-        print('Read Report Chrc')
+        logger.debug('Read Report Chrc')
         return self.value
 
     def WriteValue(self, value, options):
-        print(f'Write Report {self.value}')
+        logger.debug('Write Report %s', self.value)
         self.value = value
 
     def StartNotify(self):
-        print('Start Report Chrc Notification')
+        logger.info('Start Report Chrc Notification')
         if self.notifying:
-            print('Already notifying, nothing to do')
+            logger.debug('Already notifying, nothing to do')
             return
 
         self.notifying = True
+        self.output.start()
 
     def StopNotify(self):
         if not self.notifying:
-            print('Not notifying, nothing to do')
+            logger.debug('Not notifying, nothing to do')
             return
 
         self.notifying = False
+        self.output.stop()
 
 
-class RepDescriptor(Descriptor):
+class RepDescriptor(StaticDescriptor):
     def __init__(self, bus, index, characteristic):
-        Descriptor.__init__(self, bus, index, '2908', ['read'], characteristic)
-
-    def ReadValue(self, options):
         # HID reference: id=1, type=input
-        return dbus.Array(bytearray.fromhex('0101'), signature=dbus.Signature('y'))
+        StaticDescriptor.__init__(self, bus, index, '2908', ['read'], characteristic, bytes.fromhex('0101'))
 
 
 class ProtoModeChrc(Characteristic):
@@ -0,0 +1,145 @@
+import logging
+import time
+
+import numpy as np
+
+from gi.repository import GLib as GObject
+
+logger = logging.getLogger(__name__)
+
+
+def interpolate(t, t0, t1, p0, p1, max_extrapolate, max_position=None):
+    """
+    Positions of every channel at time `t` from its last two samples.
+
+    t0, t1: (C,) sample times, p0, p1: (C, 2) sample positions.
+    Between the samples the position is interpolated, past the newest one it is
+    extrapolated along the last velocity for at most `max_extrapolate` seconds.
+    Channels with a single sample (t0 == t1) hold their position. With
+    `max_position`, positions are clamped to 0 ~ max_position, extrapolation
+    overshooting the edge of the logical range.
+    """
+    span = t1 - t0
+    single = span <= 0
+    alpha = (t - t0) / np.where(single, 1.0, span)
+    alpha = np.clip(alpha, 0.0, 1.0 + max_extrapolate / np.where(single, 1.0, span))
+    alpha[single] = 1.0
+    positions = p0 + alpha[:, None] * (p1 - p0)
+    if max_position is not None:
+        np.clip(positions, 0, max_position, out=positions)
+    return positions
+
+
+class TimerJitter:
+    """
+    Deviation of the actual tick interval from the requested period, over the last `size` ticks.
+    """
+
+    def __init__(self, period, size=512):
+        self.period = period
+        self.deviation = np.zeros(size)
+        self.size = size
+        self.count = 0
+        self.last = None
+
+    def tick(self, now):
+        if self.last is not None:
+            self.deviation[self.count % self.size] = (now - self.last) - self.period
+            self.count += 1
+        self.last = now
+
+    def reset(self):
+        self.last = None
+
+    def summary(self):
+        """
+        Returns (ticks, mean, std, max abs) deviation in milliseconds.
+        """
+        n = min(self.count, self.size)
+        if n == 0:
+            return 0, 0.0, 0.0, 0.0
+        window = self.deviation[:n] * 1000
+        return self.count, float(window.mean()), float(window.std()), float(np.abs(window).max())
+
+
+class OutputStage:
+    """
+    Resamples timestamped position samples to a fixed output rate.
+
+    Input samples arrive through push() at whatever rate the source produces
+    them. Every 1 / rate_hz the positions of all active channels are computed in
+    one vectorized step at `now - delay` and passed to `sink(channels, positions)`.
+    The timer only runs while some channel has had a sample within
+    `delay + max_extrapolate`, so an idle stage doesn't wake the main loop.
+    Positions are clamped to 0 ~ `max_position`, the logical range of the report.
+    A sink raising stops the timer, the next sample starts it again.
+    """
+
+    def __init__(self, sink, channels=1, rate_hz=90, delay_ms=33, max_extrapolate_ms=50, max_position=None):
+        self.sink = sink
+        self.max_position = max_position
+        self.period = 1.0 / rate_hz
+        self.delay = delay_ms / 1000
+        self.max_extrapolate = max_extrapolate_ms / 1000
+        self.t0 = np.zeros(channels)
+        self.t1 = np.zeros(channels)
+        self.p0 = np.zeros((channels, 2))
+        self.p1 = np.zeros((channels, 2))
+        self.active = np.zeros(channels, dtype=bool)
+        self.jitter = TimerJitter(self.period)
+        self.enabled = False
+        self.timer = None
+
+    def push(self, channel, x, y, t=None):
+        t = time.monotonic() if t is None else t
+        if self.active[channel]:
+            self.t0[channel], self.p0[channel] = self.t1[channel], self.p1[channel]
+        else:
+            self.t0[channel], self.p0[channel] = t, (x, y)
+            self.active[channel] = True
+        self.t1[channel], self.p1[channel] = t, (x, y)
+        self._start()
+
+    def release(self, channel):
+        self.active[channel] = False
+
+    def start(self):
+        self.enabled = True
+        self._start()
+
+    def stop(self):
+        self.enabled = False
+        ticks, mean, std, worst = self.jitter.summary()
+        if ticks:
+            logger.info('Output stage %s ticks, jitter mean %.2f ms std %.2f ms max %.2f ms', ticks, mean, std, worst)
+        if self.timer is not None:
+            GObject.source_remove(self.timer)
+            self.timer = None
+
+    def _start(self):
+        if self.enabled and self.timer is None and self.active.any():
+            self.jitter.reset()
+            self.timer = GObject.timeout_add(max(1, round(self.period * 1000)), self.tick)
+
+    def tick(self):
+        now = time.monotonic()
+        self.jitter.tick(now)
+        t = now - self.delay
+
+        # Channels whose newest sample is too old to extrapolate from go idle
+        self.active &= (t - self.t1) <= self.max_extrapolate
+        channels = np.flatnonzero(self.active)
+        if channels.size == 0:
+            self.timer = None
+            return False
+
+        positions = interpolate(t, self.t0[channels], self.t1[channels],
+                                self.p0[channels], self.p1[channels], self.max_extrapolate, self.max_position)
+        try:
+            self.sink(channels, positions)
+        except Exception:
+            # Returning False removes the source, so the timer has to be forgotten for _start()
+            logger.exception('Output stage sink failed, stopping the timer')
+            self.timer = None
+            return False
+        return True
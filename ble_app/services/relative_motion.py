@@ -0,0 +1,74 @@
+"""
+Continuous motion to relative mouse report deltas.
+
+The relative mouse report carries signed 8 bit deltas (-127 ~ 127). Motion
+comes in as float deltas per frame. It is scaled by an acceleration curve
+looked up in a precomputed table. The fractional part carries over to the next
+frame, and moves larger than 127 are split evenly over the fewest reports.
+"""
+
+import math
+
+import numpy as np
+
+INT8_MAX = 127
+
+
+def build_accel_lut(size=256, step=0.5, sensitivity=1.0, accel=0.08, exponent=1.0, max_gain=6.0):
+    """
+    Gain per speed bucket: sensitivity * min(1 + accel * speed ** exponent, max_gain),
+    where bucket i covers speeds [i * step, (i + 1) * step) in counts per frame.
+    """
+    speed = np.arange(size) * step
+    return sensitivity * np.minimum(1.0 + accel * speed ** exponent, max_gain)
+
+
+def split_deltas(dx, dy):
+    """
+    Split an integer move into the fewest (dx, dy) steps that fit in int8, spread evenly.
+    """
+    n = max(1, -(-max(abs(dx), abs(dy)) // INT8_MAX))
+    if n == 1:
+        return [(dx, dy)]
+
+    steps, px, py = [], 0, 0
+    for k in range(1, n + 1):
+        x, y = round(k * dx / n), round(k * dy / n)
+        steps.append((x - px, y - py))
+        px, py = x, y
+    return steps
+
+
+class DeltaAccumulator:
+    """
+    Accumulates float motion, keeping the sub-unit remainder between frames.
+    """
+
+    def __init__(self, lut=None, step=0.5):
+        self.lut = build_accel_lut(step=step) if lut is None else lut
+        # Plain list indexing is cheaper than numpy scalar access on the per-frame path
+        self.gains = self.lut.tolist()
+        self.inv_step = 1.0 / step
+        self.last_index = len(self.lut) - 1
+        self.rx = 0.0
+        self.ry = 0.0
+
+    def reset(self):
+        self.rx = self.ry = 0.0
+
+    def add(self, dx, dy, accelerate=True):
+        """
+        Add a motion delta and return the whole counts to send as a list of int8 (dx, dy) steps.
+        """
+        if accelerate:
+            index = int(math.hypot(dx, dy) * self.inv_step)
+            gain = self.gains[index if index < self.last_index else self.last_index]
+            dx, dy = dx * gain, dy * gain
+
+        x, y = self.rx + dx, self.ry + dy
+        ix, iy = int(x), int(y)
+        self.rx, self.ry = x - ix, y - iy
+
+        if ix == 0 and iy == 0:
+            return []
+        return split_deltas(ix, iy)
@@ -2,9 +2,12 @@ import dbus
 import dbus.exceptions
 import dbus.mainloop.glib
 import dbus.service
+import logging
 
-from gi.repository import GLib as GObject
-from .gatt import Service, Characteristic, Descriptor
+from .gatt import Service, Characteristic, StaticCharacteristic, StaticDescriptor
+from .relative_motion import DeltaAccumulator
+
+logger = logging.getLogger(__name__)
 
 BLUEZ_SERVICE_NAME = 'org.bluez'
 GATT_MANAGER_IFACE = 'org.bluez.GattManager1'
@@ -16,6 +19,44 @@ GATT_CHRC_IFACE =    'org.bluez.GattCharacteristic1'
 GATT_DESC_IFACE =    'org.bluez.GattDescriptor1'
 
 
+MOUSE_REPORT_MAP = [
+    # Report Description: describes what we communicate
+    0x05, 0x01,                    # USAGE_PAGE (Generic Desktop)
+    0x09, 0x02,                    # USAGE (Mouse)
+    0xa1, 0x01,                    # COLLECTION (Application)
+    0x85, 0x01,                    #   REPORT_ID (1)
+    0x09, 0x01,                    #   USAGE (Pointer)
+    0xa1, 0x00,                    #   COLLECTION (Physical)
+    0x05, 0x09,                    #         Usage Page (Buttons)
+    0x19, 0x01,                    #         Usage Minimum (1)
+    0x29, 0x03,                    #         Usage Maximum (3)
+    0x15, 0x00,                    #         Logical Minimum (0)
+    0x25, 0x01,                    #         Logical Maximum (1)
+    0x95, 0x03,                    #         Report Count (3)
+    0x75, 0x01,                    #         Report Size (1)
+    0x81, 0x02,                    #         Input(Data, Variable, Absolute); 3 button bits
+    0x95, 0x01,                    #         Report Count(1)
+    0x75, 0x05,                    #         Report Size(5)
+    0x81, 0x03,                    #         Input(Constant);                 5 bit padding
+    0x05, 0x01,                    #         Usage Page (Generic Desktop)
+    0x09, 0x30,                    #         Usage (X)
+    0x09, 0x31,                    #         Usage (Y)
+    0x09, 0x38,                    #         Usage (Wheel)
+    0x15, 0x81,                    #         Logical Minimum (-127)
+    0x25, 0x7F,                    #         Logical Maximum (127)
+    0x75, 0x08,                    #         Report Size (8)
+    0x95, 0x03,                    #         Report Count (3)
+    0x81, 0x06,                    #         Input(Data, Variable, Relative); 3 position bytes (X,Y,Wheel)
+    0xc0,                          #   END_COLLECTION
+    0xc0                           # END_COLLECTION
+]
+
+
+def to_int8(value):
+    # signed 8 bit report field, clamped to the -127 ~ 127 logical range
+    return max(-127, min(127, int(value))) & 0xff
+
+
 class RelativeMouseService(Service):
     """
     Fake HID Mouse that simulates a mouse controls behaviour.
@@ -28,11 +69,12 @@ class RelativeMouseService(Service):
         self.add_characteristic(InfoChrc(bus, 0, self))
         self.add_characteristic(InputRepMapChrc(bus, 1, self))
         self.add_characteristic(CtrlPntChrc(bus, 2, self))
-        self.add_characteristic(RepChrc(bus, 3, self))
+        self.report = RepChrc(bus, 3, self)
+        self.add_characteristic(self.report)
         self.add_characteristic(ProtoModeChrc(bus, 4, self))
 
 
-class InfoChrc(Characteristic):
+class InfoChrc(StaticCharacteristic):
     """
     HID Information.
     """
@@ -40,16 +82,11 @@ class InfoChrc(Characteristic):
     INFO_UUID = '2a4a'
 
     def __init__(self, bus, index, service):
-        Characteristic.__init__(self, bus, index, self.INFO_UUID, ['read'], service)
-        self.value = dbus.Array(bytearray.fromhex('01010002'), signature=dbus.Signature('y'))
-
-    def ReadValue(self, options):
         # HID info: ver=1.1, country=0, flags=normal
-        print('HID Information Chrc called')
-        return self.value
+        StaticCharacteristic.__init__(self, bus, index, self.INFO_UUID, ['read'], service, bytes.fromhex('01010002'))
 
 
-class InputRepMapChrc(Characteristic):
+class InputRepMapChrc(StaticCharacteristic):
     """
     HID input report map.
     """
@@ -57,45 +94,7 @@ class InputRepMapChrc(Characteristic):
     REP_MAP_UUID = '2a4b'
 
     def __init__(self, bus, index, service):
-        Characteristic.__init__(self, bus, index, self.REP_MAP_UUID, ['read'], service)
-
-    def ReadValue(self, options):
-        print('HID Input Report Map Chrc called')
-        hex_list = [
-            # Report Description: describes what we communicate
-            0x05, 0x01,                    # USAGE_PAGE (Generic Desktop)
-            0x09, 0x02,                    # USAGE (Mouse)
-            0xa1, 0x01,                    # COLLECTION (Application)
-            0x85, 0x01,                    #   REPORT_ID (1)
-            0x09, 0x01,                    #   USAGE (Pointer)
-            0xa1, 0x00,                    #   COLLECTION (Physical)
-            0x05, 0x09,                    #         Usage Page (Buttons)
-            0x19, 0x01,                    #         Usage Minimum (1)
-            0x29, 0x03,                    #         Usage Maximum (3)
-            0x15, 0x00,                    #         Logical Minimum (0)
-            0x25, 0x01,                    #         Logical Maximum (1)
-            0x95, 0x03,                    #         Report Count (3)
-            0x75, 0x01,                    #         Report Size (1)
-            0x81, 0x02,                    #         Input(Data, Variable, Absolute); 3 button bits
-            0x95, 0x01,                    #         Report Count(1)
-            0x75, 0x05,                    #         Report Size(5)
-            0x81, 0x03,                    #         Input(Constant);                 5 bit padding
-            0x05, 0x01,                    #         Usage Page (Generic Desktop)
-            0x09, 0x30,                    #         Usage (X)
-            0x09, 0x31,                    #         Usage (Y)
-            0x09, 0x38,                    #         Usage (Wheel)
-            0x15, 0x81,                    #         Logical Minimum (-127)
-            0x25, 0x7F,                    #         Logical Maximum (127)
-            0x75, 0x08,                    #         Report Size (8)
-            0x95, 0x03,                    #         Report Count (3)
-            0x81, 0x06,                    #         Input(Data, Variable, Relative); 3 position bytes (X,Y,Wheel)
-            0xc0,                          #   END_COLLECTION
-            0xc0                           # END_COLLECTION
-        ]
-
-        hex_string = ''.join(['{:02x}'.format(b) for b in hex_list])
-        print(hex_string)
-        return dbus.Array(bytearray.fromhex(hex_string))
+        StaticCharacteristic.__init__(self, bus, index, self.REP_MAP_UUID, ['read'], service, MOUSE_REPORT_MAP)
 
 
 class CtrlPntChrc(Characteristic):
@@ -126,60 +125,65 @@ class RepChrc(Characteristic):
         self.notifying = False
         # s, x, y, w
         self.value = [dbus.Byte(0x00), dbus.Byte(0x00), dbus.Byte(0x00), dbus.Byte(0x00)]
-        GObject.timeout_add(5000, self.notify_report)
-
-    def notify_report(self):
-        if not self.notifying:
-            return True
-
-        # 1: left click, 2 middle, 3: right click
-        button = 1
-        self.value = [dbus.Byte(button), dbus.Byte(0x00), dbus.Byte(0x00), dbus.Byte(0x00)]
-        self.PropertiesChanged('org.bluez.GattCharacteristic1', {
-            'Value': self.value
-        }, [])
-
-        self.value = [dbus.Byte(0x00), dbus.Byte(0x00), dbus.Byte(0x00), dbus.Byte(0x00)]
-        self.PropertiesChanged('org.bluez.GattCharacteristic1', {
-            'Value': self.value
-        }, [])
-
-        return True
+        self.buttons = 0
+        self.motion = DeltaAccumulator()
+
+    def move(self, dx, dy, wheel=0):
+        # Exact deltas, e.g. from the input server: split, no acceleration
+        self._send_steps(self.motion.add(dx, dy, accelerate=False), wheel)
+
+    def move_by(self, dx, dy):
+        # Continuous motion, e.g. vision-driven: accelerated, fractions carried to the next frame
+        self._send_steps(self.motion.add(dx, dy))
+
+    def _send_steps(self, steps, wheel=0):
+        if not steps and wheel:
+            steps = [(0, 0)]
+        for dx, dy in steps:
+            self.send_report(dx & 0xff, dy & 0xff, to_int8(wheel))
+            wheel = 0
+
+    def set_buttons(self, buttons):
+        self.buttons = buttons
+        self.send_report(0, 0, 0)
+
+    def send_report(self, dx, dy, wheel):
+        self.value = [dbus.Byte(self.buttons), dbus.Byte(dx), dbus.Byte(dy), dbus.Byte(wheel)]
+        if self.notifying:
+            self.PropertiesChanged('org.bluez.GattCharacteristic1', {
+                'Value': self.value
+            }, [])
 
     def ReadValue(self, options):
-        print('Read Report Chrc')
+        logger.debug('Read Report Chrc')
         return self.value
 
     def WriteValue(self, value, options):
-        print(f'Write Report {self.value}')
+        logger.debug('Write Report %s', self.value)
         self.value = value
 
     def StartNotify(self):
-        print('Start Report Chrc Notification')
+        logger.info('Start Report Chrc Notification')
         if self.notifying:
-            print('Already notifying, nothing to do')
+            logger.debug('Already notifying, nothing to do')
             return
 
         self.notifying = True
 
     def StopNotify(self):
         if not self.notifying:
-            print('Not notifying, nothing to do')
+            logger.debug('Not notifying, nothing to do')
             return
 
         self.notifying = False
 
 
-class RepDescriptor(Descriptor):
+class RepDescriptor(StaticDescriptor):
     def __init__(self, bus, index, characteristic):
-        Descriptor.__init__(self, bus, index,
-                            '2908', ['read'],
-                            characteristic)
-
-    def ReadValue(self, options):
-        print('Read Rep Descriptor')
         # HID reference: id=1, type=input
-        return dbus.Array(bytearray.fromhex('0101'), signature=dbus.Signature('y'))
+        StaticDescriptor.__init__(self, bus, index,
+                                  '2908', ['read'],
+                                  characteristic, bytes.fromhex('0101'))
 
 
 class ProtoModeChrc(Characteristic):
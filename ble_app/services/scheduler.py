@@ -0,0 +1,85 @@
+import logging
+import time
+
+from gi.repository import GLib as GObject
+
+logger = logging.getLogger(__name__)
+
+
+class NotifyScheduler:
+    """
+    One main loop timer for the periodic tasks of all notifying characteristics.
+
+    A task is armed with an interval when a client subscribes and disarmed when
+    it unsubscribes, or when it returns False. The GLib timer is set for the
+    earliest due task only, and each wakeup runs every task due within `slack_ms`,
+    so tasks with close deadlines share one wakeup. With nothing armed no timer exists.
+    """
+
+    def __init__(self, slack_ms=5):
+        self.slack = slack_ms / 1000
+        self.tasks = {}
+        self.timer = None
+        self.timer_due = None
+
+    def arm(self, task, interval_ms):
+        """
+        Run `task()` every `interval_ms` until disarmed. Re-arming an armed task changes its interval.
+        """
+        interval = interval_ms / 1000
+        self.tasks[task] = [interval, time.monotonic() + interval]
+        self._reschedule()
+
+    def disarm(self, task):
+        if self.tasks.pop(task, None) is not None:
+            self._reschedule()
+
+    def disarm_owner(self, owner):
+        """
+        Disarm every task that is a method of `owner`, e.g. of a removed characteristic.
+        """
+        for task in [task for task in self.tasks if getattr(task, '__self__', None) is owner]:
+            del self.tasks[task]
+        self._reschedule()
+
+    def armed(self, task):
+        return task in self.tasks
+
+    def _reschedule(self):
+        due = min((entry[1] for entry in self.tasks.values()), default=None)
+        if due == self.timer_due:
+            return
+
+        if self.timer is not None:
+            GObject.source_remove(self.timer)
+            self.timer = None
+        self.timer_due = due
+        if due is not None:
+            delay_ms = max(0, round((due - time.monotonic()) * 1000))
+            self.timer = GObject.timeout_add(delay_ms, self._run)
+
+    def _run(self):
+        self.timer = None
+        self.timer_due = None
+        now = time.monotonic()
+        horizon = now + self.slack
+
+        for task, entry in list(self.tasks.items()):
+            interval, due = entry
+            if due > horizon:
+                continue
+            # Late ticks are dropped rather than run back to back
+            entry[1] = due + interval if due + interval > now else now + interval
+            try:
+                keep = task()
+            except Exception:
+                logger.exception('Periodic task %r failed', task)
+                keep = False
+            if keep is False and self.tasks.get(task) is entry:
+                del self.tasks[task]
+
+        self._reschedule()
+        return False
+
+
+default_scheduler = NotifyScheduler()
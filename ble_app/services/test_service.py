@@ -3,11 +3,13 @@ import dbus
 import dbus.exceptions
 import dbus.mainloop.glib
 import dbus.service
+import logging
 
-from gi.repository import GLib as GObject
 from .errors import NotPermittedException
 from .gatt import Service, Characteristic, Descriptor
 
+logger = logging.getLogger(__name__)
+
 mainloop = None
 
 BLUEZ_SERVICE_NAME = 'org.bluez'
@@ -53,11 +55,11 @@ class TestCharacteristic(Characteristic):
         self.add_descriptor(CharacteristicUserDescriptionDescriptor(bus, 1, self))
 
     def ReadValue(self, options):
-        print('TestCharacteristic Read: ' + repr(self.value))
+        logger.debug('TestCharacteristic Read: %r', self.value)
         return self.value
 
     def WriteValue(self, value, options):
-        print('TestCharacteristic Write: ' + repr(value))
+        logger.debug('TestCharacteristic Write: %r', value)
         self.value = value
 
 
@@ -123,11 +125,11 @@ class TestEncryptCharacteristic(Characteristic):
         self.add_descriptor(CharacteristicUserDescriptionDescriptor(bus, 1, self))
 
     def ReadValue(self, options):
-        print('TestEncryptCharacteristic Read: ' + repr(self.value))
+        logger.debug('TestEncryptCharacteristic Read: %r', self.value)
         return self.value
 
     def WriteValue(self, value, options):
-        print('TestEncryptCharacteristic Write: ' + repr(value))
+        logger.debug('TestEncryptCharacteristic Write: %r', value)
         self.value = value
 
 
@@ -167,11 +169,11 @@ class TestSecureCharacteristic(Characteristic):
         self.add_descriptor(CharacteristicUserDescriptionDescriptor(bus, 1, self))
 
     def ReadValue(self, options):
-        print('TestSecureCharacteristic Read: ' + repr(self.value))
+        logger.debug('TestSecureCharacteristic Read: %r', self.value)
         return self.value
 
     def WriteValue(self, value, options):
-        print('TestSecureCharacteristic Write: ' + repr(value))
+        logger.debug('TestSecureCharacteristic Write: %r', value)
         self.value = value
 
 
@@ -205,7 +207,6 @@ class TestNotificationCharacteristic(Characteristic):
         self.value = 1
         self.add_descriptor(TestNotificationDescriptor(bus, 0, self))
         self.notifying = False
-        GObject.timeout_add(1000, self.notify_report)
 
     def notify_report(self):
         if self.notifying:
@@ -217,23 +218,25 @@ class TestNotificationCharacteristic(Characteristic):
         return True
 
     def ReadValue(self, options):
-        print('TestCharacteristic Read')
+        logger.debug('TestCharacteristic Read')
         # return [dbus.Byte(self.value)]
         return [0x01, 0x02]
 
     def StartNotify(self):
         if self.notifying:
-            print('Already notifying, nothing to do')
+            logger.debug('Already notifying, nothing to do')
             return
 
         self.notifying = True
+        self.arm(self.notify_report, 1000)
 
     def StopNotify(self):
         if not self.notifying:
-            print('Not notifying, nothing to do')
+            logger.debug('Not notifying, nothing to do')
             return
 
         self.notifying = False
+        self.disarm(self.notify_report)
 
 
 class TestNotificationDescriptor(Descriptor):
@@ -0,0 +1,119 @@
+import logging
+import threading
+import time
+
+from gi.repository import GLib as GObject
+
+logger = logging.getLogger(__name__)
+
+
+class TrackerLifecycle:
+    """
+    Opens the camera and hand model only while a host may need them.
+
+    The tracker is built by `factory()` on a background thread (opening the
+    camera and loading and warming up the model), then handed to the main loop.
+    It is closed `linger_s` seconds after the last release, unless acquired
+    again in between. prepare() loads it ahead of a likely acquire, e.g. at
+    registration or when a device connects, and also lets it expire after
+    `linger_s` if nothing acquires it.
+
+    load_time is how long the last load took, an upper bound for the first
+    frame after resuming from idle. resume_latency is the measured time from
+    the last acquire to the first frame.
+    """
+
+    def __init__(self, factory, linger_s=30):
+        self.factory = factory
+        self.linger_s = linger_s
+        self.tracker = None
+        self.loading = False
+        self.active = False
+        self.linger_timer = None
+        self.acquired_at = None
+        self.load_time = None
+        self.resume_latency = None
+
+    def prepare(self):
+        self._load()
+        if not self.active:
+            self._linger()
+
+    def acquire(self):
+        self.active = True
+        self.acquired_at = time.monotonic()
+        self.resume_latency = None
+        self._cancel_linger()
+        self._load()
+
+    def release(self):
+        self.active = False
+        self._linger()
+
+    def update(self, scale=1.0):
+        """
+        Process one frame, or None while the tracker is still loading.
+        """
+        if self.tracker is None:
+            return None
+
+        result = self.tracker.update(scale)
+        if self.resume_latency is None and self.acquired_at is not None:
+            self.resume_latency = time.monotonic() - self.acquired_at
+            logger.info('First frame %.0f ms after resume', self.resume_latency * 1000)
+        return result
+
+    def close(self):
+        self.active = False
+        self._cancel_linger()
+        self._shutdown()
+
+    def _load(self):
+        if self.tracker is not None or self.loading:
+            return
+
+        self.loading = True
+        threading.Thread(target=self._load_thread, name='tracker-load', daemon=True).start()
+
+    def _load_thread(self):
+        start = time.monotonic()
+        try:
+            tracker = self.factory()
+        except Exception:
+            logger.exception('Cannot start the hand tracker')
+            tracker = None
+        GObject.idle_add(self._loaded, tracker, time.monotonic() - start)
+
+    def _loaded(self, tracker, elapsed):
+        self.loading = False
+        if tracker is None:
+            return False
+
+        self.tracker = tracker
+        self.load_time = elapsed
+        logger.info('Hand tracker ready in %.0f ms', elapsed * 1000)
+        if not self.active and self.linger_timer is None:
+            # Released while loading
+            self._shutdown()
+        return False
+
+    def _linger(self):
+        self._cancel_linger()
+        self.linger_timer = GObject.timeout_add(int(self.linger_s * 1000), self._expire)
+
+    def _cancel_linger(self):
+        if self.linger_timer is not None:
+            GObject.source_remove(self.linger_timer)
+            self.linger_timer = None
+
+    def _expire(self):
+        self.linger_timer = None
+        if not self.active:
+            self._shutdown()
+        return False
+
+    def _shutdown(self):
+        if self.tracker is not None:
+            logger.info('Hand tracker idle, closing camera and model')
+            self.tracker.close()
+            self.tracker = None
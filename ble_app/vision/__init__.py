@@ -0,0 +1,14 @@
+from .gesture import HandGestureTracker, PipelinedHandTracker, TwoHandTracker
+from .hands import HandAssociator, hand_features
+from .frame_bus import FrameBus
+from .head import HeadPointerTracker
+from .trackers import create_tracker
+from .placement import Placement
+from .shm_channel import CursorChannel
+from .duty_cycle import DutyCycleController
+from .qos import QosController
+from .frame_ring import FrameRing, RawVideo
+from .pipeline import InferencePool, ReorderBuffer
+from .fusion import CameraMapping, CursorFusion, load_mappings
+from .calibration import CURSOR_MAX, ScreenMapping
+from .classifier import GestureClassifier, landmark_features
@@ -0,0 +1,295 @@
+"""
+Learned gesture classifier over hand landmarks, in place of the pinch threshold.
+
+The fixed `dy < 0.1` pinch rule depends on how big the hand appears, so on
+the hand size and its distance to the camera. landmark_features() makes the
+landmarks relative to the wrist and scales them by the size of the hand; a
+small MLP, or with no hidden layer a logistic regression, classifies them.
+Inference is a few NumPy products over all hands of a frame at once, the
+weights are kept in a compressed .npz file.
+
+Sessions are recorded landmarks with a gesture label per frame, saved as .npz:
+
+    python -m ble_app.vision.classifier record open.npz --label open [--seconds 30]
+    python -m ble_app.vision.classifier record pinch.npz --label pinch
+    python -m ble_app.vision.classifier train gestures.npz open.npz pinch.npz [--hidden 16]
+    python -m ble_app.vision.classifier evaluate gestures.npz test_open.npz test_pinch.npz
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from .hands import INDEX_TIP, THUMB_TIP
+from .shm_channel import LANDMARK_COUNT
+
+WRIST = 0
+MIDDLE_MCP = 9
+FINGER_TIPS = (8, 12, 16, 20)
+COORDINATES = LANDMARK_COUNT * 3
+
+
+def _feature_basis():
+    """
+    Matrix taking flattened landmarks to the landmarks relative to the wrist, followed by
+    the wrist to middle finger base vector and the thumb tip to finger tip vectors.
+    """
+    vectors = [(MIDDLE_MCP, WRIST)] + [(tip, THUMB_TIP) for tip in FINGER_TIPS]
+    basis = np.zeros((LANDMARK_COUNT, 3, LANDMARK_COUNT + len(vectors), 3), dtype=np.float32)
+    eye = np.eye(3, dtype=np.float32)
+    for i in range(LANDMARK_COUNT):
+        basis[i, :, i] += eye
+        basis[WRIST, :, i] -= eye
+    for j, (head, tail) in enumerate(vectors, LANDMARK_COUNT):
+        basis[head, :, j] += eye
+        basis[tail, :, j] -= eye
+    return basis.reshape(COORDINATES, -1)
+
+
+FEATURE_BASIS = _feature_basis()
+
+
+def landmark_features(landmarks):
+    """
+    (hands, features) of a (hands, 21, 3) landmark array: the landmarks relative to
+    the wrist in units of the wrist to middle finger base distance, and the distances
+    from the thumb tip to the other finger tips in the same units.
+    """
+    count = len(landmarks)
+    # One product for all the differences, fewer NumPy calls matter more than flops at this size
+    projected = landmarks.reshape(count, COORDINATES) @ FEATURE_BASIS
+    vectors = projected[:, COORDINATES:].reshape(count, -1, 3)
+    lengths = np.sqrt((vectors * vectors).sum(axis=2))
+    features = projected[:, :COORDINATES + len(FINGER_TIPS)]
+    features[:, COORDINATES:] = lengths[:, 1:]
+    return features / (lengths[:, :1] + 1e-6)
+
+
+class GestureClassifier:
+    """
+    Gesture probabilities of hands from their landmarks.
+
+    `layers` are the (weights, bias) of the layers over landmark_features(),
+    with ReLU between them and a softmax over `classes` at the end. The pinch
+    state follows the confidence of the 'pinch' class with hysteresis: it
+    starts above `press` and ends below `release`, so it doesn't flicker when
+    the confidence hovers around a single threshold.
+    """
+
+    def __init__(self, layers, classes, press=0.6, release=0.4):
+        self.layers = [(np.asarray(weights, dtype=np.float32), np.asarray(bias, dtype=np.float32))
+                       for weights, bias in layers]
+        self.classes = tuple(classes)
+        self.press = press
+        self.release = release
+        self.pinch = self.classes.index('pinch') if 'pinch' in self.classes else None
+        self.pinch_logit = None
+        if self.pinch is not None and len(self.classes) == 2:
+            # A two class softmax is the logistic of the difference of the logits
+            weights, bias = self.layers[-1]
+            self.pinch_logit = (weights[:, self.pinch] - weights[:, 1 - self.pinch],
+                                bias[self.pinch] - bias[1 - self.pinch])
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            layers = [(data[f'weights{i}'], data[f'bias{i}']) for i in range(int(data['layers']))]
+            return cls(layers, data['classes'].tolist(), float(data['press']), float(data['release']))
+
+    def save(self, path):
+        arrays = {}
+        for i, (weights, bias) in enumerate(self.layers):
+            arrays[f'weights{i}'], arrays[f'bias{i}'] = weights, bias
+        np.savez_compressed(path, layers=len(self.layers), classes=np.array(self.classes), press=self.press,
+                            release=self.release, **arrays)
+
+    def _hidden(self, landmarks):
+        activation = landmark_features(np.asarray(landmarks, dtype=np.float32))
+        for weights, bias in self.layers[:-1]:
+            activation = np.maximum(activation @ weights + bias, 0.0)
+        return activation
+
+    def predict(self, landmarks):
+        """
+        (hands, classes) probabilities of a (hands, 21, 3) landmark array.
+        """
+        weights, bias = self.layers[-1]
+        logits = self._hidden(landmarks) @ weights + bias
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def pinch_confidence(self, landmarks):
+        """
+        (hands,) probability of the pinch class.
+        """
+        if self.pinch is None:
+            raise ValueError(f'The classifier has no pinch class, only {", ".join(self.classes)}')
+        if self.pinch_logit is None:
+            return self.predict(landmarks)[:, self.pinch]
+        weights, bias = self.pinch_logit
+        return 1.0 / (1.0 + np.exp(-(self._hidden(landmarks) @ weights + bias)))
+
+    def is_pinched(self, confidence, was_pinched):
+        return bool(confidence >= (self.release if was_pinched else self.press))
+
+
+def train(features, labels, classes, hidden=(16,), epochs=500, learning_rate=0.01, l2=1e-4, seed=0):
+    """
+    Fit a GestureClassifier to (samples, features) and (samples,) class indexes by
+    full batch gradient descent with Adam on the cross-entropy. The features are
+    standardized for training, the standardization is then folded into the first layer.
+    """
+    rng = np.random.default_rng(seed)
+    mean, std = features.mean(axis=0), features.std(axis=0) + 1e-6
+    x = (features - mean) / std
+    targets = np.eye(len(classes))[labels]
+    # Classes weighted by their inverse frequency, sessions are rarely balanced
+    weight = (len(labels) / (len(classes) * np.bincount(labels, minlength=len(classes)).clip(1)))[labels]
+    weight /= weight.sum()
+
+    sizes = [x.shape[1], *hidden, len(classes)]
+    params = []
+    for fan_in, fan_out in zip(sizes[:-1], sizes[1:]):
+        params += [rng.normal(0.0, np.sqrt(2.0 / fan_in), (fan_in, fan_out)), np.zeros(fan_out)]
+    moments = [np.zeros_like(p) for p in params]
+    squares = [np.zeros_like(p) for p in params]
+
+    for step in range(1, epochs + 1):
+        activations = [x]
+        for i in range(0, len(params) - 2, 2):
+            activations.append(np.maximum(activations[-1] @ params[i] + params[i + 1], 0.0))
+        logits = activations[-1] @ params[-2] + params[-1]
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        delta = (exp / exp.sum(axis=1, keepdims=True) - targets) * weight[:, None]
+
+        grads = [None] * len(params)
+        for i in range(len(params) - 2, -1, -2):
+            grads[i] = activations[i // 2].T @ delta + l2 * params[i]
+            grads[i + 1] = delta.sum(axis=0)
+            if i:
+                delta = (delta @ params[i].T) * (activations[i // 2] > 0)
+
+        for p, g, m, v in zip(params, grads, moments, squares):
+            m *= 0.9
+            m += 0.1 * g
+            v *= 0.999
+            v += 0.001 * g * g
+            p -= learning_rate * (m / (1 - 0.9 ** step)) / (np.sqrt(v / (1 - 0.999 ** step)) + 1e-8)
+
+    layers = [(params[i], params[i + 1]) for i in range(0, len(params), 2)]
+    weights, bias = layers[0]
+    layers[0] = (weights / std[:, None], bias - (mean / std) @ weights)
+    return GestureClassifier(layers, classes)
+
+
+def load_sessions(paths):
+    """
+    Landmarks (frames, 21, 3) and labels (frames,) of recorded sessions, concatenated.
+    """
+    landmarks, labels = [], []
+    for path in paths:
+        with np.load(path) as data:
+            landmarks.append(data['landmarks'])
+            labels.append(data['labels'])
+    return np.concatenate(landmarks).astype(np.float32), np.concatenate(labels)
+
+
+def record(tracker, seconds):
+    """
+    Landmarks of the hand over `seconds` of camera frames.
+    """
+    landmarks = []
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        result = tracker.update()
+        if result is not None:
+            landmarks.append(result[3])
+    return np.array(landmarks, dtype=np.float32).reshape(-1, LANDMARK_COUNT, 3)
+
+
+def threshold_rule(landmarks):
+    # The fixed rule the classifier replaces
+    return landmarks[:, THUMB_TIP, 1] - landmarks[:, INDEX_TIP, 1] < 0.1
+
+
+def evaluate(classifier, landmarks, labels):
+    """
+    Accuracy, confusion matrix and single hand pinch confidence time per frame of a classifier
+    on labelled landmarks, with the threshold rule's accuracy on the pinch class for reference.
+    """
+    known = np.isin(labels, classifier.classes)
+    landmarks, labels = landmarks[known], labels[known]
+    truth = np.array([classifier.classes.index(label) for label in labels.tolist()])
+    predicted = classifier.predict(landmarks).argmax(axis=1)
+    print(f'{len(labels)} frames, accuracy {np.mean(predicted == truth) * 100:.1f}%')
+    print('  ' + ' '.join(f'{name:>8}' for name in ('', *classifier.classes)))
+    for i, name in enumerate(classifier.classes):
+        counts = np.bincount(predicted[truth == i], minlength=len(classifier.classes))
+        print('  ' + ' '.join(f'{value:>8}' for value in (name, *counts.tolist())))
+
+    if classifier.pinch is not None:
+        pinched = truth == classifier.pinch
+        rule = np.mean(threshold_rule(landmarks) == pinched) * 100
+        learned = np.mean((predicted == classifier.pinch) == pinched) * 100
+        print(f'pinch vs rest: classifier {learned:.1f}%, dy < 0.1 rule {rule:.1f}%')
+
+    infer = classifier.predict if classifier.pinch is None else classifier.pinch_confidence
+    hand = landmarks[:1]
+    repeats = 10000
+    start = time.perf_counter()
+    for _ in range(repeats):
+        infer(hand)
+    print(f'inference {(time.perf_counter() - start) / repeats * 1e6:.1f} us per frame')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    recorder = commands.add_parser('record', help='record a session of one gesture')
+    recorder.add_argument('output', help='session .npz file')
+    recorder.add_argument('--label', required=True, help='gesture held during the session, e.g. open or pinch')
+    recorder.add_argument('--seconds', type=float, default=30, help='recording time')
+    recorder.add_argument('--camera', type=int, default=0, help='camera index')
+    trainer = commands.add_parser('train', help='train a classifier on recorded sessions')
+    trainer.add_argument('output', help='classifier .npz file')
+    trainer.add_argument('sessions', nargs='+', help='session .npz files')
+    trainer.add_argument('--hidden', type=int, nargs='*', default=[16],
+                         help='hidden layer sizes, none for a logistic regression')
+    trainer.add_argument('--epochs', type=int, default=500, help='training steps')
+    trainer.add_argument('--validation', type=float, default=0.2, help='fraction of frames held out for evaluation')
+    evaluator = commands.add_parser('evaluate', help='evaluate a classifier on recorded sessions')
+    evaluator.add_argument('model', help='classifier .npz file')
+    evaluator.add_argument('sessions', nargs='+', help='session .npz files')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        from .gesture import HandGestureTracker
+
+        tracker = HandGestureTracker(args.camera)
+        try:
+            tracker.warm_up()
+            print(f'Recording "{args.label}" for {args.seconds:.0f} s')
+            landmarks = record(tracker, args.seconds)
+        finally:
+            tracker.close()
+        np.savez_compressed(args.output, landmarks=landmarks, labels=np.full(len(landmarks), args.label))
+        print(f'Saved {len(landmarks)} frames to {args.output}')
+    elif args.command == 'train':
+        landmarks, labels = load_sessions(args.sessions)
+        classes = sorted(set(labels.tolist()))
+        order = np.random.default_rng(0).permutation(len(labels))
+        held_out = order[:int(len(order) * args.validation)]
+        fitted = order[len(held_out):]
+        indexes = np.array([classes.index(label) for label in labels.tolist()])
+        classifier = train(landmark_features(landmarks[fitted]), indexes[fitted], classes, args.hidden, args.epochs)
+        classifier.save(args.output)
+        print(f'Saved the {" / ".join(classes)} classifier to {args.output}')
+        if len(held_out):
+            evaluate(classifier, landmarks[held_out], labels[held_out])
+    else:
+        evaluate(GestureClassifier.load(args.model), *load_sessions(args.sessions))
+
+
+if __name__ == '__main__':
+    main()
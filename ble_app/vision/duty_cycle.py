@@ -0,0 +1,95 @@
+import time
+
+import numpy as np
+
+
+class DutyCycleController:
+    """
+    Frame rate and resolution of the hand tracker depending on whether a hand is in view.
+
+    With no hand for `idle_after_s`, the tracker falls back to a presence scan:
+    `scan_hz` frames per second, downscaled by `scan_scale`. The frame that
+    detects a hand switches back to `active_hz` at full resolution, so the next
+    frame is already a full one.
+
+    Call begin_frame() / end_frame(hand) around each tracker update, and
+    cursor_sent() when a cursor report goes out. summary() reports the average
+    CPU load of the frames and the time to first cursor, measured from the last
+    frame without a hand, an upper bound of the time since the hand appeared.
+    """
+
+    def __init__(self, active_hz=20, scan_hz=4, scan_scale=0.5, idle_after_s=1.0, history=64):
+        self.active_interval = 1.0 / active_hz
+        # Shortest active interval, other controllers may only lengthen it
+        self.min_active_interval = self.active_interval
+        self.scan_interval = 1.0 / scan_hz
+        self.scan_scale = scan_scale
+        self.idle_after = idle_after_s
+        self.scanning = True
+        self.last_hand = None
+        self.last_empty = None
+        self.appeared_at = None
+        self.frame_start = None
+        self.frame_cpu = None
+        self.cpu_time = 0.0
+        self.started = time.monotonic()
+        self.frames = [0, 0]        # active, scan
+        self.cursor_latency = np.zeros(history)
+        self.appearances = 0
+
+    @property
+    def interval(self):
+        return self.scan_interval if self.scanning else self.active_interval
+
+    @property
+    def interval_ms(self):
+        return max(1, round(self.interval * 1000))
+
+    @property
+    def scale(self):
+        return self.scan_scale if self.scanning else 1.0
+
+    def begin_frame(self):
+        self.frame_start = time.monotonic()
+        self.frame_cpu = time.process_time()
+
+    def end_frame(self, hand):
+        """
+        Record whether the frame found a hand. Returns True when the frame interval changed.
+        """
+        now = time.monotonic()
+        self.cpu_time += time.process_time() - self.frame_cpu
+        self.frames[self.scanning] += 1
+        scanning = self.scanning
+
+        if hand:
+            if self.appeared_at is None and self.last_hand is None:
+                self.appeared_at = self.last_empty if self.last_empty is not None else self.frame_start
+            self.last_hand = now
+            self.scanning = False
+        else:
+            self.last_empty = self.frame_start
+            if self.last_hand is not None and now - self.last_hand >= self.idle_after:
+                self.last_hand = None
+                self.scanning = True
+
+        return scanning != self.scanning
+
+    def cursor_sent(self):
+        if self.appeared_at is not None:
+            self.cursor_latency[self.appearances % self.cursor_latency.size] = time.monotonic() - self.appeared_at
+            self.appearances += 1
+            self.appeared_at = None
+
+    def summary(self):
+        """
+        Returns (CPU %, share of scan frames, mean and max time to first cursor in ms).
+        """
+        elapsed = time.monotonic() - self.started
+        frames = sum(self.frames)
+        n = min(self.appearances, self.cursor_latency.size)
+        latency = self.cursor_latency[:n] * 1000
+        return (100.0 * self.cpu_time / elapsed if elapsed > 0 else 0.0,
+                self.frames[1] / frames if frames else 0.0,
+                float(latency.mean()) if n else 0.0,
+                float(latency.max()) if n else 0.0)
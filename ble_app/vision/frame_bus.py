@@ -0,0 +1,118 @@
+import threading
+import time
+
+import cv2
+
+
+class DetectorWorker:
+    """
+    Thread running one detector on the frames of a FrameBus at up to `rate_hz`.
+
+    The bus requests a frame from the worker when it is due, the worker runs
+    `detector.process(frame)` on the newest frame and keeps the result with the
+    sequence number and timestamp of its frame. `lock` is held while the
+    detector runs, take it to reconfigure the detector from another thread.
+    """
+
+    def __init__(self, bus, detector, rate_hz=None, name='detector'):
+        self.bus = bus
+        self.detector = detector
+        self.interval = 1.0 / rate_hz if rate_hz else 0.0
+        self.lock = threading.Lock()
+        self.requested = 0
+        self.completed = 0
+        self.last_request = None
+        self.result = None
+        self.timestamp = None
+        self.latency = 0.0
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def due(self, now):
+        return self.last_request is None or now - self.last_request >= self.interval
+
+    def _run(self):
+        condition = self.bus.condition
+        while True:
+            with condition:
+                condition.wait_for(lambda: self.requested > self.completed or self.bus.closed)
+                if self.bus.closed:
+                    break
+                seq, timestamp, frame = self.bus.seq, self.bus.timestamp, self.bus.frame
+
+            with self.lock:
+                start = time.perf_counter()
+                result = self.detector.process(frame)
+                latency = time.perf_counter() - start
+
+            with condition:
+                self.result, self.timestamp, self.latency, self.completed = result, timestamp, latency, seq
+                condition.notify_all()
+
+        with self.lock:
+            self.detector.close()
+
+
+class FrameBus:
+    """
+    Captures each camera frame once and fans it out to several detectors.
+
+    capture() reads a frame from `cap`, downscales and converts it to RGB once
+    and publishes it read-only; each DetectorWorker added with add() that is
+    due at its own rate then runs on it in parallel. wait() blocks until the
+    workers requested for a frame are done with it, so a caller can merge their
+    results. Only the newest frame is kept, a slow worker skips frames.
+    """
+
+    def __init__(self, cap):
+        self.cap = cap
+        self.condition = threading.Condition()
+        self.workers = []
+        self.seq = 0
+        self.frame = None
+        self.timestamp = None
+        self.closed = False
+
+    def add(self, detector, rate_hz=None, name='detector'):
+        worker = DetectorWorker(self, detector, rate_hz, name)
+        self.workers.append(worker)
+        return worker
+
+    def capture(self, scale=1.0):
+        """
+        Capture, convert and publish one frame. Returns its sequence number, or None without a frame.
+        """
+        success, image = self.cap.read()
+        if not success:
+            return None
+
+        timestamp = time.monotonic()
+        if scale < 1.0:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        frame = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        frame.flags.writeable = False
+
+        with self.condition:
+            self.seq += 1
+            self.frame, self.timestamp = frame, timestamp
+            for worker in self.workers:
+                if worker.due(timestamp):
+                    worker.requested, worker.last_request = self.seq, timestamp
+            self.condition.notify_all()
+        return self.seq
+
+    def wait(self, seq, timeout=None):
+        """
+        Wait until every worker requested for frame `seq` has a result for it or a newer frame.
+        Workers still busy with an older frame are not waited for. Returns False on timeout.
+        """
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: all(worker.requested != seq or worker.completed >= seq for worker in self.workers), timeout)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        for worker in self.workers:
+            worker.thread.join(timeout=2)
@@ -0,0 +1,192 @@
+"""
+Ring of camera frames in shared memory, written in place by one process and
+read without copying by others.
+
+The block starts with the ring layout, so readers attach by name only. Each
+slot has a header with the sequence number of its frame, 0 while it is being
+written, the capture timestamp and the frame shape. Each reader has its own
+reference flag per slot, written by that reader only: the writer never
+reuses a slot a reader holds. A reader checks the sequence number when
+it acquires a slot and again when it releases it, so it knows whether the
+frame stayed intact while it was in use, as with the CursorChannel seqlock.
+"""
+
+import numpy as np
+
+from multiprocessing import resource_tracker, shared_memory
+
+LAYOUT = np.dtype([('slots', '<u8'), ('frame_bytes', '<u8'), ('readers', '<u8'), ('head', '<u8')])
+
+SLOT_HEADER = np.dtype([
+    ('seq', '<u8'),                # frame sequence number, 0 while written
+    ('timestamp', '<f8'),
+    ('shape', '<u4', (3,)),
+    ('pad', '<u4'),
+])
+
+
+def _align(size, alignment=64):
+    return (size + alignment - 1) // alignment * alignment
+
+
+class FrameRing:
+    """
+    `slots` frame slots of up to `frame_bytes` each, for up to `readers` readers.
+
+    Create it with `create=True` in the writing process and attach with the
+    name elsewhere, with `track=False` in a process not started by the owner
+    (see CursorChannel). The writer writes a frame with write(), or claims a
+    slot, fills the view frame() returns, e.g. straight from the camera, and
+    commits it. Reader `reader` gets a read-only view of a slot with acquire()
+    and gives it back with release().
+    """
+
+    def __init__(self, name=None, create=False, slots=8, frame_bytes=640 * 480 * 3, readers=1, track=True):
+        if create:
+            size = self._size(slots, frame_bytes, readers)
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            if not track:
+                resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self.name = self.shm.name
+        self.owner = create
+
+        buf = self.shm.buf
+        self.layout = np.ndarray((), dtype=LAYOUT, buffer=buf)
+        if create:
+            self.layout['slots'], self.layout['frame_bytes'], self.layout['readers'] = slots, frame_bytes, readers
+            self.layout['head'] = 0
+        self.slots = int(self.layout['slots'])
+        self.frame_bytes = int(self.layout['frame_bytes'])
+        self.readers = int(self.layout['readers'])
+
+        offset = _align(LAYOUT.itemsize)
+        self.headers = np.ndarray((self.slots,), dtype=SLOT_HEADER, buffer=buf, offset=offset)
+        offset = _align(offset + SLOT_HEADER.itemsize * self.slots)
+        self.refs = np.ndarray((self.readers, self.slots), dtype=np.uint8, buffer=buf, offset=offset)
+        offset = _align(offset + self.readers * self.slots)
+        self.frames = np.ndarray((self.slots, self.frame_bytes), dtype=np.uint8, buffer=buf, offset=offset)
+        if create:
+            self.headers.fill(0)
+            self.refs.fill(0)
+        self.next_slot = 0
+
+    @staticmethod
+    def _size(slots, frame_bytes, readers):
+        header = _align(LAYOUT.itemsize) + _align(SLOT_HEADER.itemsize * slots) + _align(readers * slots)
+        return header + slots * frame_bytes
+
+    def close(self):
+        del self.layout, self.headers, self.refs, self.frames
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    # Writer
+
+    def claim(self, exclude=()):
+        """
+        Take the next slot no reader holds, skipping the slots in `exclude`. Returns None if there is none.
+        """
+        for i in range(self.slots):
+            slot = (self.next_slot + i) % self.slots
+            if slot in exclude:
+                continue
+            seq = int(self.headers[slot]['seq'])
+            # Mark it as being written before looking at the references, a reader
+            # acquiring it meanwhile then sees it changed
+            self.headers[slot]['seq'] = 0
+            if self.refs[:, slot].any():
+                self.headers[slot]['seq'] = seq
+                continue
+            self.next_slot = (slot + 1) % self.slots
+            return slot
+        return None
+
+    def frame(self, slot, shape):
+        """
+        Writable view of a claimed slot for a frame of `shape`.
+        """
+        size = int(np.prod(shape))
+        if size > self.frame_bytes:
+            raise ValueError(f'Frame of {size} bytes does not fit in {self.frame_bytes} byte slots')
+        return self.frames[slot, :size].reshape(shape)
+
+    def commit(self, slot, shape, timestamp=0.0):
+        """
+        Publish the frame written in a claimed slot. Returns its sequence number.
+        """
+        header = self.headers[slot]
+        header['shape'] = shape
+        header['timestamp'] = timestamp
+        seq = int(self.layout['head']) + 1
+        self.layout['head'] = seq
+        header['seq'] = seq
+        return seq
+
+    def write(self, image, timestamp=0.0, exclude=()):
+        """
+        Copy a frame into the ring. Returns (slot, seq), or None when every slot is held.
+        """
+        slot = self.claim(exclude)
+        if slot is None:
+            return None
+        np.copyto(self.frame(slot, image.shape), image)
+        return slot, self.commit(slot, image.shape, timestamp)
+
+    # Readers
+
+    def acquire(self, reader, slot, seq):
+        """
+        Read-only view of frame `seq` in `slot`, held for `reader` until released,
+        or None if the slot was reused for another frame.
+        """
+        self.refs[reader, slot] = 1
+        if int(self.headers[slot]['seq']) != seq:
+            self.refs[reader, slot] = 0
+            return None
+        view = self.frames[slot, :int(np.prod(self.headers[slot]['shape']))].reshape(self.headers[slot]['shape'])
+        view.flags.writeable = False
+        return view
+
+    def acquire_latest(self, reader):
+        """
+        Returns (slot, seq, timestamp, view) of the newest frame, or None.
+        """
+        seq = int(self.layout['head'])
+        slots = np.flatnonzero(self.headers['seq'] == seq)
+        if seq == 0 or slots.size == 0:
+            return None
+        slot = int(slots[0])
+        view = self.acquire(reader, slot, seq)
+        if view is None:
+            return None
+        return slot, seq, float(self.headers[slot]['timestamp']), view
+
+    def release(self, reader, slot, seq):
+        """
+        Give a slot back. Returns False if the frame was overwritten while held, its result should be dropped.
+        """
+        intact = int(self.headers[slot]['seq']) == seq
+        self.refs[reader, slot] = 0
+        return intact
+
+
+class RawVideo:
+    """
+    Frames of a raw video file, e.g. `ffmpeg -i in.mp4 -f rawvideo -pix_fmt bgr24 out.raw`,
+    memory-mapped as a (frames, height, width, channels) array read at disk speed.
+    """
+
+    def __init__(self, path, shape=(480, 640, 3)):
+        self.shape = tuple(shape)
+        data = np.memmap(path, dtype=np.uint8, mode='r')
+        count = data.size // int(np.prod(self.shape))
+        self.frames = data[:count * int(np.prod(self.shape))].reshape((count,) + self.shape)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        return self.frames[index]
@@ -0,0 +1,149 @@
+"""
+Fuses the cursor channels of several cameras into one cursor stream.
+
+Each camera has its own vision process publishing into its own CursorChannel,
+so a slow or stalled camera never delays the others: the fusion only reads the
+latest state of every channel. A CameraMapping brings each camera's cursor into
+the shared cursor space, calibrated with an affine transform.
+"""
+
+import json
+import time
+
+import numpy as np
+
+from .calibration import CURSOR_MAX
+
+
+class CameraMapping:
+    """
+    Affine map from the cursor space of one camera to the shared cursor space,
+    both normalized to 0 ~ 1, as a 2x3 matrix.
+    """
+
+    def __init__(self, matrix=((1.0, 0.0, 0.0), (0.0, 1.0, 0.0))):
+        self.matrix = np.asarray(matrix, dtype=np.float64).reshape(2, 3)
+
+    @classmethod
+    def fit(cls, source, target):
+        """
+        Least squares mapping from at least 3 (x, y) points seen by the camera to where they are in the shared space.
+        """
+        source = np.asarray(source, dtype=np.float64)
+        target = np.asarray(target, dtype=np.float64)
+        design = np.hstack([source, np.ones((len(source), 1))])
+        solution, _, _, _ = np.linalg.lstsq(design, target, rcond=None)
+        return cls(solution.T)
+
+    def __call__(self, x, y):
+        mx, my = self.matrix @ (x, y, 1.0)
+        return min(max(mx, 0.0), 1.0), min(max(my, 0.0), 1.0)
+
+
+def load_mappings(path, cameras):
+    """
+    Read the calibration of `cameras` from a JSON file keyed by camera index. An entry is
+    either a 2x3 "matrix", or "points" as [camera x, camera y, shared x, shared y] rows to fit.
+    Cameras without an entry keep the identity.
+    """
+    with open(path) as f:
+        calibration = json.load(f)
+
+    mappings = []
+    for camera in cameras:
+        entry = calibration.get(str(camera))
+        if entry is None:
+            mappings.append(CameraMapping())
+        elif 'matrix' in entry:
+            mappings.append(CameraMapping(entry['matrix']))
+        else:
+            points = np.asarray(entry['points'], dtype=np.float64)
+            mappings.append(CameraMapping.fit(points[:, :2], points[:, 2:]))
+    return mappings
+
+
+class CursorFusion:
+    """
+    One cursor from the CursorChannels of several cameras, read like a single channel.
+
+    Only cameras that see a hand and published within `max_age_ms` take part.
+    With mode 'best' the cursor follows the camera with the highest detection
+    score, switching camera only when another one beats it by `switch_margin`,
+    so two cameras of similar confidence don't make the cursor jump back and
+    forth. With 'blend' it is the score weighted average of the mapped cursors.
+    Clicks come from the primary camera only, the one 'best' would follow, as
+    the other cameras may detect the same pinch.
+    """
+
+    def __init__(self, channels, mappings=None, mode='best', max_age_ms=150, switch_margin=0.1):
+        self.channels = channels
+        self.mappings = mappings or [CameraMapping() for _ in channels]
+        self.mode = mode
+        self.max_age = max_age_ms / 1000
+        self.switch_margin = switch_margin
+        self.snapshots = [None] * len(channels)
+        self.last_clicks = [None] * len(channels)
+        self.primary = None
+        self.seq = 0
+        self.clicks = 0
+
+    def read_new(self):
+        """
+        Returns a fused (seq, x, y, buttons, hand, clicks, timestamp, score) like
+        CursorChannel.read_new(), or None when no camera published since the last call.
+        """
+        fresh = False
+        for i, channel in enumerate(self.channels):
+            snapshot = channel.read_new()
+            if snapshot is not None:
+                self.snapshots[i] = snapshot
+                fresh = True
+        if not fresh:
+            return None
+
+        now = time.monotonic()
+        candidates = [i for i, snapshot in enumerate(self.snapshots)
+                      if snapshot is not None and snapshot[4] and now - snapshot[6] <= self.max_age]
+        primary = self._select(candidates)
+
+        for i, snapshot in enumerate(self.snapshots):
+            if snapshot is None:
+                continue
+            clicks = snapshot[5]
+            if i == primary and self.last_clicks[i] is not None and clicks != self.last_clicks[i]:
+                self.clicks += 1
+            self.last_clicks[i] = clicks
+
+        self.seq += 1
+        if primary is None:
+            latest = max((snapshot[6] for snapshot in self.snapshots if snapshot is not None), default=now)
+            return self.seq, 0.0, 0.0, 0, 0, self.clicks, latest, 0.0
+
+        if self.mode == 'blend':
+            weights = np.array([self.snapshots[i][7] for i in candidates]) + 1e-6
+            points = np.array([self._map(i) for i in candidates])
+            x, y = weights @ points / weights.sum()
+        else:
+            x, y = self._map(primary)
+        _, _, _, buttons, _, _, timestamp, score = self.snapshots[primary]
+        return self.seq, float(x) * CURSOR_MAX, float(y) * CURSOR_MAX, buttons, 1, self.clicks, timestamp, score
+
+    def _map(self, i):
+        snapshot = self.snapshots[i]
+        return self.mappings[i](snapshot[1] / CURSOR_MAX, snapshot[2] / CURSOR_MAX)
+
+    def _select(self, candidates):
+        if not candidates:
+            self.primary = None
+            return None
+
+        best = max(candidates, key=lambda i: self.snapshots[i][7])
+        if self.primary in candidates and \
+                self.snapshots[self.primary][7] + self.switch_margin >= self.snapshots[best][7]:
+            return self.primary
+        self.primary = best
+        return best
+
+    def close(self):
+        for channel in self.channels:
+            channel.close()
@@ -0,0 +1,322 @@
+import logging
+import time
+from collections import namedtuple
+
+import numpy as np
+import cv2
+import mediapipe as mp
+
+from .calibration import ScreenMapping
+from .hands import HandAssociator, PinchClick, hand_features
+from .pipeline import InferencePool, ReorderBuffer
+
+logger = logging.getLogger(__name__)
+
+
+Landmark = namedtuple('Landmark', 'x y z')
+Hand = namedtuple('Hand', 'points score handedness')
+
+
+class HandDetector:
+    """
+    MediaPipe Hands on RGB frames. process() returns a Hand for each of up to
+    `max_num_hands` hands: its landmarks as (x, y, z) tuples normalized to the
+    frame, its detection confidence and its handedness, 'Left' or 'Right'.
+    """
+
+    def __init__(self, model_complexity=0, max_num_hands=1):
+        self.max_num_hands = max_num_hands
+        self.model_complexity = None
+        self.hands = None
+        self.set_model_complexity(model_complexity)
+
+    def set_model_complexity(self, model_complexity):
+        if model_complexity == self.model_complexity:
+            return
+        if self.hands is not None:
+            self.hands.close()
+        self.model_complexity = model_complexity
+        self.hands = mp.solutions.hands.Hands(model_complexity=model_complexity, max_num_hands=self.max_num_hands,
+                                              min_detection_confidence=0.5, min_tracking_confidence=0.5)
+
+    def process(self, image):
+        detection_result = self.hands.process(image)
+        if not detection_result.multi_hand_landmarks:
+            return []
+        hands = []
+        for landmarks, handedness in zip(detection_result.multi_hand_landmarks, detection_result.multi_handedness):
+            classification = handedness.classification[0]
+            hands.append(Hand([(point.x, point.y, point.z) for point in landmarks.landmark],
+                              classification.score, classification.label))
+        return hands
+
+    def close(self):
+        self.hands.close()
+
+
+class HandGestureTracker:
+    """
+    Webcam hand tracker turning the index finger tip into a cursor position and
+    a thumb / index finger pinch into a click. The tip goes through `mapping`,
+    a ScreenMapping, to the absolute cursor. The pinch is the thumb tip being
+    less than 0.1 frame below the index finger tip or, with a `classifier`, the
+    pinch confidence of a GestureClassifier.
+
+    With `roi_margin` set, a frame following a detection is cropped to the last
+    hand bounding box grown by `roi_margin` (a fraction of the frame) on each
+    side. `latency` is the processing time of the last frame, camera read excluded,
+    and `score` the detection confidence of the last hand, 0 without one.
+    """
+
+    def __init__(self, camera_index=0, model_complexity=0, detector=None, mapping=None, classifier=None):
+        self.cap = cv2.VideoCapture(camera_index)
+        self.click = PinchClick()
+        self.detector = detector or HandDetector(model_complexity)
+        self.mapping = mapping or ScreenMapping()
+        self.classifier = classifier
+        self.pinched = False
+        self.roi_margin = None
+        self.last_box = None
+        self.latency = 0.0
+        self.score = 0.0
+
+    @property
+    def model_complexity(self):
+        return self.detector.model_complexity
+
+    def set_model_complexity(self, model_complexity):
+        self.detector.set_model_complexity(model_complexity)
+
+    def warm_up(self, size=(240, 320)):
+        """
+        Run the detector once on a blank frame, so its graph is initialized before the first camera frame.
+        """
+        blank = np.zeros((size[0], size[1], 3), dtype=np.uint8)
+        self.detector.process(blank)
+
+    def crop(self, image, scale=1.0):
+        """
+        Downscale a BGR camera frame by `scale` and crop it to the region of interest.
+        Returns the RGB image and the region as normalized (x0, y0, x1, y1) of the frame.
+        """
+        if scale < 1.0:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        x0, y0, x1, y1 = 0.0, 0.0, 1.0, 1.0
+        if self.roi_margin is not None and self.last_box is not None:
+            m = self.roi_margin
+            bx0, by0, bx1, by1 = self.last_box
+            x0, y0, x1, y1 = max(0.0, bx0 - m), max(0.0, by0 - m), min(1.0, bx1 + m), min(1.0, by1 + m)
+            h, w = image.shape[:2]
+            image = np.ascontiguousarray(image[int(y0 * h):int(y1 * h), int(x0 * w):int(x1 * w)])
+
+        image.flags.writeable = False
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB), (x0, y0, x1, y1)
+
+    def update(self, scale=1.0):
+        """
+        Process one camera frame. Returns (button, x, y, landmark) with x, y in 0 ~ CURSOR_MAX,
+        or None when there is no frame or no hand.
+
+        With scale < 1 the frame is downscaled before detection, landmarks being
+        normalized the cursor keeps its range.
+        """
+        success, image = self.cap.read()
+
+        if not success:
+            logger.warning('Ignoring empty camera frame')
+            return None
+
+        start = time.perf_counter()
+        image, box = self.crop(image, scale)
+        hands = self.detector.process(image)
+        self.latency = time.perf_counter() - start
+        return self.interpret(hands, box)
+
+    def interpret(self, hands, box=(0.0, 0.0, 1.0, 1.0)):
+        """
+        Turn the Hands detected in the `box` region of a frame into (button, x, y, landmark),
+        or None without a hand. Frames must be interpreted in capture order for the click detection.
+        """
+        if not hands:
+            self.click.reset()
+            self.pinched = False
+            self.last_box = None
+            self.score = 0.0
+            return None
+
+        hand = hands[0]
+
+        x0, y0, x1, y1 = box
+        landmark = [Landmark(x0 + px * (x1 - x0), y0 + py * (y1 - y0), pz) for px, py, pz in hand.points]
+        self.score = hand.score
+        xs = [point.x for point in landmark]
+        ys = [point.y for point in landmark]
+        self.last_box = min(xs), min(ys), max(xs), max(ys)
+        x, y = self.mapping(landmark[8].x, landmark[8].y)
+
+        if self.classifier is None:
+            dy = landmark[4].y - landmark[8].y
+            self.pinched = dy < 0.1
+        else:
+            confidence = self.classifier.pinch_confidence(np.array([landmark], dtype=np.float32))[0]
+            self.pinched = self.classifier.is_pinched(confidence, self.pinched)
+        button = self.click.update(self.pinched)
+        return button, x, y, landmark
+
+    def close(self):
+        self.cap.release()
+        self.detector.close()
+
+
+class TwoHandTracker(HandGestureTracker):
+    """
+    HandGestureTracker following two hands, each with its own gesture state.
+
+    The `pointer` hand, by its MediaPipe handedness label, moves the cursor and
+    left clicks with a pinch as with one hand; a pinch of the other hand is a
+    right click. With a single hand in view, that hand is the pointer. The
+    hands of a frame go through hand_features() together and keep their
+    identity across frames with a HandAssociator. `tracks` are the hands of the
+    last frame.
+    """
+
+    def __init__(self, camera_index=0, model_complexity=0, detector=None, pointer='Right', mapping=None,
+                 classifier=None):
+        HandGestureTracker.__init__(self, camera_index, model_complexity,
+                                    detector=detector or HandDetector(model_complexity, max_num_hands=2),
+                                    mapping=mapping, classifier=classifier)
+        self.pointer = pointer
+        self.associator = HandAssociator(max_hands=2)
+        self.tracks = []
+        self.pointer_id = None
+
+    def interpret(self, hands, box=(0.0, 0.0, 1.0, 1.0)):
+        if not hands:
+            self.associator.update([], np.empty((0, 2)))
+            self.tracks = []
+            self.last_box = None
+            self.score = 0.0
+            return None
+
+        x0, y0, x1, y1 = box
+        points = np.array([hand.points for hand in hands], dtype=np.float32)
+        points[:, :, 0] = x0 + points[:, :, 0] * (x1 - x0)
+        points[:, :, 1] = y0 + points[:, :, 1] * (y1 - y0)
+        features = hand_features(points)
+        assigned = self.associator.update([hand.handedness for hand in hands], features.centroid)
+
+        self.tracks = []
+        pinched = features.pinched
+        if self.classifier is not None:
+            pinched = self.classifier.pinch_confidence(points)
+        for track, hand_points, tip, hand_pinched in zip(assigned, points, features.tip, pinched):
+            if track is None:
+                continue
+            track.landmark = [Landmark(*point) for point in hand_points.tolist()]
+            track.x, track.y = self.mapping(tip[0], tip[1])
+            if self.classifier is None:
+                track.pinched = bool(hand_pinched)
+            else:
+                track.pinched = self.classifier.is_pinched(hand_pinched, track.pinched)
+            track.button = track.click.update(track.pinched)
+            self.tracks.append(track)
+
+        if not self.tracks:
+            # The hands jumped away from tracks not dropped yet, they get new tracks once these are
+            self.last_box = None
+            self.score = 0.0
+            return None
+
+        self.last_box = (float(features.box[:, 0].min()), float(features.box[:, 1].min()),
+                         float(features.box[:, 2].max()), float(features.box[:, 3].max()))
+        self.score = max(hand.score for hand in hands)
+
+        pointer = self._pointer()
+        button = pointer.button
+        if any(track.button for track in self.tracks if track is not pointer):
+            button |= 2
+        return button, pointer.x, pointer.y, pointer.landmark
+
+    def _pointer(self):
+        labelled = [track for track in self.tracks if track.handedness == self.pointer]
+        if len(labelled) == 1:
+            pointer = labelled[0]
+        else:
+            # Ambiguous labels, keep the pointer on the same hand while it stays in view
+            pointer = next((track for track in self.tracks if track.id == self.pointer_id), self.tracks[0])
+        self.pointer_id = pointer.id
+        return pointer
+
+
+class PipelinedHandTracker(HandGestureTracker):
+    """
+    HandGestureTracker running detection in a pool of `workers` processes.
+
+    Each camera frame is cropped here and handed round-robin to the next
+    detector with room, so up to `workers` frames are detected in parallel.
+    Results are put back in capture order by a ReorderBuffer waiting at most
+    `max_delay_ms` for a late one, then interpreted in that order. update()
+    returns the newest interpreted result, one or more frames behind the camera,
+    with the clicks of every result interpreted since the last call. Until the
+    next result comes in it is returned again with the button cleared, so a
+    click isn't repeated. Frames overwritten in the ring before a worker read
+    them have no result and are skipped.
+
+    `latency` is the detection time of the last result divided by the number of
+    workers, the processing time per frame the pool sustains.
+    """
+
+    def __init__(self, camera_index=0, model_complexity=0, workers=2, depth=2, max_delay_ms=100, placement=None,
+                 mapping=None, classifier=None):
+        pool = InferencePool(HandDetector, workers, model_complexity, depth, placement=placement)
+        HandGestureTracker.__init__(self, camera_index, model_complexity, detector=pool, mapping=mapping,
+                                    classifier=classifier)
+        self.pool = pool
+        self.reorder = ReorderBuffer(max_delay_ms)
+        self.result = None
+        self.buttons = 0
+        self.last_hand = None
+
+    def warm_up(self, size=(240, 320)):
+        """
+        Wait for every detector process to load and warm up its model.
+        """
+        self.pool.wait_ready()
+
+    def update(self, scale=1.0):
+        success, image = self.cap.read()
+
+        if not success:
+            logger.warning('Ignoring empty camera frame')
+            return None
+
+        if self.pool.busy:
+            # Wait for a detector rather than drop the newest frame
+            self._collect(self.reorder.max_delay)
+        image, box = self.crop(image, scale)
+        self.pool.submit(image, box)
+        self._collect()
+        result = self.result
+        if result is not None:
+            self.result = (0,) + result[1:]
+        if self.buttons:
+            # The hand may have been lost since the result clicking
+            result = (self.buttons,) + (result or self.last_hand)[1:]
+            self.buttons = 0
+        return result
+
+    def _collect(self, timeout=0.0):
+        for seq, latency, hands, box in self.pool.collect(timeout):
+            self.reorder.push(seq, (latency, hands, box))
+        for seq, (latency, hands, box) in self.reorder.pop():
+            if hands is None:
+                # Overwritten in the ring: the frame wasn't detected, which is not a frame without a hand
+                continue
+            self.latency = latency / self.pool.workers
+            result = self.interpret(hands, box)
+            if result is not None:
+                # Several results can be interpreted in one call, PinchClick reports each click once
+                self.buttons |= result[0]
+                self.last_hand = result
+            self.result = result
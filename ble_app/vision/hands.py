@@ -0,0 +1,161 @@
+"""
+Gesture state of several hands tracked across frames.
+
+The landmarks of all hands in a frame are stacked into one (hands, 21, 3)
+array and their features computed together by hand_features(). A
+HandAssociator keeps the identity of each hand from frame to frame, matching
+detections to tracks by handedness and nearest centroid, and every track has
+its own gesture state.
+"""
+
+import math
+from collections import namedtuple
+from itertools import permutations
+
+import numpy as np
+
+THUMB_TIP = 4
+INDEX_TIP = 8
+
+HandFeatures = namedtuple('HandFeatures', 'centroid box tip pinched')
+
+
+def hand_features(landmarks):
+    """
+    Features of a (hands, 21, 3) landmark array, for all hands at once: centroid (hands, 2),
+    bounding box as x0, y0, x1, y1 (hands, 4), index finger tip (hands, 2) and pinched (hands,).
+    """
+    xy = landmarks[:, :, :2]
+    low, high = xy.min(axis=1), xy.max(axis=1)
+    tip = xy[:, INDEX_TIP]
+    pinched = (landmarks[:, THUMB_TIP, 1] - landmarks[:, INDEX_TIP, 1]) < 0.1
+    return HandFeatures(xy.mean(axis=1), np.hstack([low, high]), tip, pinched)
+
+
+class PinchClick:
+    """
+    Click detection from the pinch state of one hand over the last `max_history_count` frames.
+    """
+
+    def __init__(self, max_history_count=60):
+        self.max_history_count = max_history_count
+        self.history = np.array([], dtype=np.uint8)
+
+    def reset(self):
+        self.history = np.array([], dtype=np.uint8)
+
+    def update(self, pinched):
+        """
+        Record the pinch state of a frame. Returns 1 when it completes a click, else 0.
+        """
+        button = 0
+        self.history = np.append(self.history, 1 if pinched else 0)[-self.max_history_count:]
+        grad = self.history[1:] - self.history[:-1]
+
+        if self.history.size == self.max_history_count:
+            state_on_at, state_off_at, on_off_count = 0, 0, 0
+            # Nothing changes between edges, checking at the edges only is enough
+            for i, edge in zip(np.flatnonzero(grad).tolist(), grad[grad != 0].tolist()):
+                if edge == 1:
+                    state_on_at = i
+                    on_off_count += 1
+                elif edge == -1:
+                    state_off_at = i
+                    on_off_count += 1
+
+                if (state_off_at - state_on_at < 10) and on_off_count == 2:
+                    button = 1
+                    self.history = np.array([], dtype=np.uint8)
+
+        return button
+
+
+class HandTrack:
+    """
+    One hand followed across frames, with its own gesture state.
+    """
+
+    def __init__(self, track_id, handedness, centroid):
+        self.id = track_id
+        self.handedness = handedness
+        self.centroid = centroid
+        self.missed = 0
+        self.click = PinchClick()
+        self.landmark = None
+        self.x = 0
+        self.y = 0
+        self.pinched = False
+        self.button = 0
+
+
+class HandAssociator:
+    """
+    Keeps the identity of up to `max_hands` hands from frame to frame.
+
+    Each frame, the detections are matched to the tracks by the assignment of
+    least total cost, the cost of a pair being the distance of their centroids
+    plus `handedness_penalty` when the handedness differs, so a hand keeps its
+    identity when it crosses the other one or its handedness flickers. A pair
+    further than `max_distance` apart is not matched. Unmatched detections start
+    new tracks, and a track without detection for more than `max_missed` frames
+    is dropped with its gesture state.
+    """
+
+    def __init__(self, max_hands=2, max_distance=0.25, handedness_penalty=0.2, max_missed=3):
+        self.max_hands = max_hands
+        self.max_distance = max_distance
+        self.handedness_penalty = handedness_penalty
+        self.max_missed = max_missed
+        self.tracks = []
+        self.next_id = 0
+
+    def reset(self):
+        self.tracks = []
+
+    def update(self, handedness, centroids):
+        """
+        Match the detections of a frame, their handedness labels and (hands, 2) centroids,
+        to tracks. Returns the track of each detection, in detection order.
+        """
+        count = len(handedness)
+        centroids = centroids.tolist()
+        distance = [[math.dist(track.centroid, centroid) for centroid in centroids] for track in self.tracks]
+        cost = [[distance[t][d] + self.handedness_penalty * (track.handedness != handedness[d]) for d in range(count)]
+                for t, track in enumerate(self.tracks)]
+
+        assigned = [None] * count
+        best = None
+        # At most a few hands, trying every assignment is cheaper than anything smarter.
+        # Each pair lowers the total by 1, more than any cost, so more pairs always win.
+        if len(self.tracks) >= count:
+            candidates = ([(t, d) for d, t in enumerate(order)]
+                          for order in permutations(range(len(self.tracks)), count))
+        else:
+            candidates = (list(enumerate(order)) for order in permutations(range(count), len(self.tracks)))
+        for pairs in candidates:
+            pairs = [(t, d) for t, d in pairs if distance[t][d] <= self.max_distance]
+            total = sum(cost[t][d] for t, d in pairs) - len(pairs)
+            if best is None or total < best[0]:
+                best = total, pairs
+        for t, d in best[1] if best else ():
+            assigned[d] = self.tracks[t]
+
+        matched = {id(track) for track in assigned if track is not None}
+        for track in self.tracks:
+            if id(track) not in matched:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        for d in range(count):
+            track = assigned[d]
+            if track is None:
+                if len(self.tracks) >= self.max_hands:
+                    continue
+                track = HandTrack(self.next_id, handedness[d], centroids[d])
+                self.next_id += 1
+                self.tracks.append(track)
+                assigned[d] = track
+            track.missed = 0
+            track.handedness = handedness[d]
+            track.centroid = centroids[d]
+        return assigned
@@ -0,0 +1,138 @@
+import logging
+import time
+
+import numpy as np
+import mediapipe as mp
+
+from .calibration import CURSOR_MAX
+from .frame_bus import FrameBus
+from .gesture import HandGestureTracker
+
+logger = logging.getLogger(__name__)
+
+NOSE_TIP = 1
+
+
+class FaceDetector:
+    """
+    MediaPipe Face Mesh on RGB frames. process() returns the nose tip as (x, y)
+    normalized to the frame, or None without a face.
+    """
+
+    def __init__(self, model_complexity=0):
+        # Face Mesh has a single model, the complexity is kept for the detector interface
+        self.model_complexity = model_complexity
+        self.mesh = mp.solutions.face_mesh.FaceMesh(max_num_faces=1, refine_landmarks=False,
+                                                    min_detection_confidence=0.5, min_tracking_confidence=0.5)
+
+    def set_model_complexity(self, model_complexity):
+        self.model_complexity = model_complexity
+
+    def process(self, image):
+        detection_result = self.mesh.process(image)
+        if not detection_result.multi_face_landmarks:
+            return None
+        nose = detection_result.multi_face_landmarks[0].landmark[NOSE_TIP]
+        return nose.x, nose.y
+
+    def close(self):
+        self.mesh.close()
+
+
+class HeadPointer:
+    """
+    Cursor from the head position. The nose tip moving away from where it was
+    first seen moves the cursor from the center, amplified by `gain` and
+    smoothed with an exponential moving average. recenter() makes the next
+    position the new center.
+    """
+
+    def __init__(self, gain=3.0, alpha=0.5):
+        self.gain = gain
+        self.alpha = alpha
+        self.center = None
+        self.x = 0.5
+        self.y = 0.5
+
+    def recenter(self):
+        self.center = None
+
+    def update(self, nose):
+        """
+        Returns the absolute cursor (x, y) in 0 ~ CURSOR_MAX for a nose tip position.
+        """
+        if self.center is None:
+            self.center = nose
+        # Mirrored like the hand cursor
+        x = min(max(0.5 - self.gain * (nose[0] - self.center[0]), 0.0), 1.0)
+        y = min(max(0.5 + self.gain * (nose[1] - self.center[1]), 0.0), 1.0)
+        self.x += self.alpha * (x - self.x)
+        self.y += self.alpha * (y - self.y)
+        return int(CURSOR_MAX * self.x), int(CURSOR_MAX * self.y)
+
+
+class HeadPointerTracker(HandGestureTracker):
+    """
+    Head pointer with hand clicks, both detected on the same camera frames.
+
+    A FrameBus captures and converts each frame once for a hand and a face
+    detector, running in parallel on their own threads at up to `hand_hz` and
+    `face_hz`. The merge follows the head with the cursor and clicks with a
+    hand pinch; without a face in view the hand moves the cursor as usual.
+    ROI cropping doesn't apply, the frame being shared. `latency` is the time
+    from capture until the detectors due for the frame are done.
+    """
+
+    def __init__(self, camera_index=0, model_complexity=0, hand_hz=None, face_hz=None, timeout_ms=200, mapping=None,
+                 classifier=None):
+        HandGestureTracker.__init__(self, camera_index, model_complexity, mapping=mapping, classifier=classifier)
+        self.bus = FrameBus(self.cap)
+        self.hands = self.bus.add(self.detector, hand_hz, name='hand-detector')
+        self.face = self.bus.add(FaceDetector(model_complexity), face_hz, name='face-detector')
+        self.head = HeadPointer()
+        self.timeout = timeout_ms / 1000
+        self.hand_seq = 0
+        self.face_seq = 0
+        self.hand_result = None
+        self.cursor = None
+
+    def set_model_complexity(self, model_complexity):
+        with self.hands.lock:
+            self.detector.set_model_complexity(model_complexity)
+
+    def warm_up(self, size=(240, 320)):
+        blank = np.zeros((size[0], size[1], 3), dtype=np.uint8)
+        for worker in self.bus.workers:
+            with worker.lock:
+                worker.detector.process(blank)
+
+    def update(self, scale=1.0):
+        start = time.perf_counter()
+        seq = self.bus.capture(scale)
+        if seq is None:
+            logger.warning('Ignoring empty camera frame')
+            return None
+
+        self.bus.wait(seq, self.timeout)
+        self.latency = time.perf_counter() - start
+
+        button = 0
+        if self.hands.completed != self.hand_seq:
+            self.hand_seq = self.hands.completed
+            self.hand_result = self.interpret(self.hands.result)
+            if self.hand_result is not None:
+                button = self.hand_result[0]
+
+        if self.face.completed != self.face_seq:
+            self.face_seq = self.face.completed
+            nose = self.face.result
+            self.cursor = None if nose is None else self.head.update(nose)
+
+        if self.cursor is None:
+            return None if self.hand_result is None else (button,) + self.hand_result[1:]
+        landmark = [] if self.hand_result is None else self.hand_result[3]
+        return (button,) + self.cursor + (landmark,)
+
+    def close(self):
+        self.bus.close()
+        self.cap.release()
@@ -0,0 +1,256 @@
+import multiprocessing
+import queue
+import time
+
+import numpy as np
+
+from .frame_ring import FrameRing
+
+
+def _serve(index, factory, model_complexity, ring_name, placement, frames, results, ready):
+    """
+    Detector process: detect the frames of its queue until a None arrives.
+
+    A frame is either an image, or the (slot, seq) of a frame in the ring.
+    """
+    if placement is not None:
+        placement.pin('inference', index)
+        placement.configure_process(inference=True)
+    detector = factory(model_complexity)
+    detector.process(np.zeros((240, 320, 3), dtype=np.uint8))
+    ring = FrameRing(ring_name)
+    ready.release()
+    try:
+        while True:
+            message = frames.get()
+            if message is None:
+                break
+            if isinstance(message, int):
+                detector.set_model_complexity(message)
+                continue
+            seq, frame, tag = message
+            start = time.perf_counter()
+            if isinstance(frame, tuple):
+                image = ring.acquire(index, *frame)
+                points = None if image is None else detector.process(image)
+                if image is None or not ring.release(index, *frame):
+                    # Overwritten while detected, the writer gave up on it
+                    points = None
+            else:
+                points = detector.process(frame)
+            results.put((seq, index, time.perf_counter() - start, points, tag))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        detector.close()
+        ring.close()
+
+
+class InferencePool:
+    """
+    `workers` detector processes fed frames round-robin.
+
+    `factory(model_complexity)` builds the detector of each process, an object
+    with process(image), set_model_complexity(model_complexity) and close(); it
+    must be picklable, the processes being spawned. submit() numbers a frame
+    and queues it on the next worker with less than `depth` frames in flight.
+    collect() returns the results in completion order, which with more than one
+    worker is not the submission order, see ReorderBuffer. process() detects
+    one frame synchronously, so the pool can stand in for a single detector.
+
+    Frames of up to `frame_bytes` are passed through a FrameRing, the workers
+    reading them in place; only larger ones are pickled through the queue.
+    With a `placement`, each worker is pinned to one of the inference CPUs.
+    """
+
+    def __init__(self, factory, workers=2, model_complexity=0, depth=2, frame_bytes=1280 * 720 * 3,
+                 placement=None):
+        ctx = multiprocessing.get_context('spawn')
+        self.model_complexity = model_complexity
+        self.depth = depth
+        # One slot more than frames in flight, so a free one is always left
+        self.ring = FrameRing(create=True, slots=workers * depth + 1, frame_bytes=frame_bytes, readers=workers)
+        self.ring_slots = {}
+        if placement is not None:
+            placement.configure_children()
+        self.results = ctx.Queue()
+        self.ready = ctx.Semaphore(0)
+        self.queues = []
+        self.processes = []
+        for index in range(workers):
+            frames = ctx.Queue()
+            process = ctx.Process(target=_serve, name=f'detector-{index}', daemon=True,
+                                  args=(index, factory, model_complexity, self.ring.name, placement, frames,
+                                        self.results, self.ready))
+            process.start()
+            self.queues.append(frames)
+            self.processes.append(process)
+        self.in_flight = [0] * workers
+        self.next_worker = 0
+        self.seq = 0
+        self.dropped = 0
+        # Results completed while process() waited for its own
+        self.backlog = []
+
+    @property
+    def workers(self):
+        return len(self.processes)
+
+    @property
+    def busy(self):
+        return all(count >= self.depth for count in self.in_flight)
+
+    def wait_ready(self, timeout=None):
+        """
+        Wait until every detector is loaded and warmed up. Returns False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for _ in self.processes:
+            while not self.ready.acquire(timeout=0.5):
+                if not all(process.is_alive() for process in self.processes):
+                    raise RuntimeError('A detector process failed to start')
+                if deadline is not None and time.monotonic() > deadline:
+                    return False
+        return True
+
+    def set_model_complexity(self, model_complexity):
+        if model_complexity == self.model_complexity:
+            return
+        self.model_complexity = model_complexity
+        for frames in self.queues:
+            frames.put(model_complexity)
+
+    def submit(self, image, tag=None):
+        """
+        Queue a frame, `tag` being returned with its result. Returns the sequence
+        number of the frame, or None when every worker is full and the frame is dropped.
+        """
+        for i in range(self.workers):
+            index = (self.next_worker + i) % self.workers
+            if self.in_flight[index] < self.depth:
+                break
+        else:
+            self.dropped += 1
+            return None
+
+        seq = self.seq
+        self.seq += 1
+        self.in_flight[index] += 1
+        self.next_worker = (index + 1) % self.workers
+        frame = None
+        if image.nbytes <= self.ring.frame_bytes:
+            frame = self.ring.write(image, exclude=set(self.ring_slots.values()))
+        if frame is None:
+            frame = image
+        else:
+            self.ring_slots[seq] = frame[0]
+        self.queues[index].put((seq, frame, tag))
+        return seq
+
+    def collect(self, timeout=0.0):
+        """
+        Completed (seq, latency, result, tag), waiting up to `timeout` seconds for the first one.
+        """
+        completed, self.backlog = self.backlog, []
+        return completed + self._receive(0.0 if completed else timeout)
+
+    def _receive(self, timeout):
+        completed = []
+        try:
+            message = self.results.get(timeout=timeout) if timeout > 0 else self.results.get_nowait()
+            while True:
+                seq, index, latency, result, tag = message
+                self.in_flight[index] -= 1
+                self.ring_slots.pop(seq, None)
+                completed.append((seq, latency, result, tag))
+                message = self.results.get_nowait()
+        except queue.Empty:
+            pass
+        return completed
+
+    def process(self, image):
+        """
+        Detect one frame and wait for its result. Results of other frames
+        completing meanwhile are kept for the next collect().
+        """
+        while self.busy:
+            self.backlog += self._wait()
+        seq = self.submit(image)
+        while True:
+            for completed in self._wait():
+                if completed[0] == seq:
+                    return completed[2]
+                self.backlog.append(completed)
+
+    def _wait(self, timeout=0.5):
+        completed = self._receive(timeout)
+        if not completed and not all(process.is_alive() for process in self.processes):
+            raise RuntimeError('A detector process died')
+        return completed
+
+    def close(self):
+        for frames in self.queues:
+            frames.put(None)
+        for process in self.processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        self.results.close()
+        for frames in self.queues:
+            frames.close()
+        self.ring.close()
+
+
+class ReorderBuffer:
+    """
+    Restores the capture order of results completed out of order.
+
+    Results are pushed with the sequence number of their frame, numbered from
+    0 without gaps, and popped in sequence order. A result waits for the ones
+    before it at most `max_delay_ms` after its arrival; past that the missing
+    ones are skipped, and dropped as stale if they complete later. The latency
+    added by reordering is so bounded by `max_delay_ms`, plus the time to the
+    next pop().
+
+    stale counts the late results dropped, skipped the sequence numbers given
+    up on, and max_wait is the longest time a popped result was held.
+    """
+
+    def __init__(self, max_delay_ms=100):
+        self.max_delay = max_delay_ms / 1000
+        self.next_seq = 0
+        self.pending = {}   # seq -> (arrival, result)
+        self.stale = 0
+        self.skipped = 0
+        self.max_wait = 0.0
+
+    def push(self, seq, result, now=None):
+        """
+        Returns False when the result is stale and dropped.
+        """
+        if seq < self.next_seq:
+            self.stale += 1
+            return False
+        self.pending[seq] = (time.monotonic() if now is None else now, result)
+        return True
+
+    def pop(self, now=None):
+        """
+        Returns the results ready for output as (seq, result), in sequence order.
+        """
+        now = time.monotonic() if now is None else now
+        ready = []
+        while self.pending:
+            if self.next_seq not in self.pending:
+                oldest = min(arrival for arrival, _ in self.pending.values())
+                if now - oldest < self.max_delay:
+                    break
+                first = min(self.pending)
+                self.skipped += first - self.next_seq
+                self.next_seq = first
+
+            arrival, result = self.pending.pop(self.next_seq)
+            self.max_wait = max(self.max_wait, now - arrival)
+            ready.append((self.next_seq, result))
+            self.next_seq += 1
+        return ready
@@ -0,0 +1,127 @@
+"""
+Thread counts and CPU placement of the main loop, capture and inference.
+
+OpenCV and MediaPipe start thread pools sized to the machine. On a small
+board these threads compete with the GLib main loop that sends the reports.
+A Placement limits those pools and pins each role to its own CPUs.
+
+Linux CPU affinity is per thread and inherited by the threads a thread
+starts. So a role is pinned from the thread that then creates the role's
+threads. For example, the hand model is loaded from a thread pinned to the
+inference CPUs, so the MediaPipe graph threads stay there.
+"""
+
+import os
+
+import cv2
+
+# Math libraries read these when they load, so they only apply to processes started afterwards
+THREAD_ENV = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+
+
+def parse_cpus(spec):
+    """
+    CPU set of a '0', '2-3' or '0+2-3' spec.
+    """
+    cpus = set()
+    for part in spec.split('+'):
+        first, _, last = part.partition('-')
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+class Placement:
+    """
+    CPU sets of the `main` loop, `capture` and `inference` threads, None to
+    let a role run on any CPU, and thread counts: `cv_threads` for cv2.setNumThreads
+    in the main and capture processes, `inference_threads` for OpenCV and the
+    math libraries in the inference processes. MediaPipe has no thread count
+    setting, its threads follow the inference CPUs.
+    """
+
+    def __init__(self, main=None, capture=None, inference=None, cv_threads=None, inference_threads=None):
+        self.main = main
+        self.capture = capture
+        self.inference = inference
+        self.cv_threads = cv_threads
+        self.inference_threads = inference_threads
+        self.available = os.sched_getaffinity(0)
+
+    @classmethod
+    def profile(cls, name, cpus=None):
+        """
+        A named profile for `cpus`, by default the CPUs this process may run on:
+
+        none: no change.
+        shared: single threaded OpenCV and math libraries, no pinning.
+        isolated: the main loop on the first CPU, capture on the second and inference on the others.
+        """
+        cpus = sorted(os.sched_getaffinity(0) if cpus is None else cpus)
+        if name == 'none':
+            return cls()
+        if name == 'shared':
+            return cls(cv_threads=1, inference_threads=1)
+        if name == 'isolated':
+            main = {cpus[0]}
+            capture = {cpus[1]} if len(cpus) > 1 else main
+            inference = set(cpus[2:]) or {cpus[-1]}
+            return cls(main, capture, inference, cv_threads=1, inference_threads=1)
+        raise ValueError(f'Unknown placement profile {name}')
+
+    @classmethod
+    def parse(cls, spec):
+        """
+        A profile name, or comma separated settings such as
+        'main=0,capture=1,inference=2-3,cv-threads=1,inference-threads=1'.
+        """
+        if '=' not in spec:
+            return cls.profile(spec)
+
+        placement = cls()
+        for item in spec.split(','):
+            key, _, value = item.partition('=')
+            key = key.strip().replace('-', '_')
+            if key in ('main', 'capture', 'inference'):
+                cpus = parse_cpus(value)
+                if not cpus <= placement.available:
+                    raise ValueError(f'CPUs {sorted(cpus - placement.available)} of {key} are not available, '
+                                     f'this process may use {sorted(placement.available)}')
+                setattr(placement, key, cpus)
+            elif key in ('cv_threads', 'inference_threads'):
+                setattr(placement, key, int(value))
+            else:
+                raise ValueError(f'Unknown placement setting {key}')
+        return placement
+
+    def pin(self, role, index=None):
+        """
+        Pin the calling thread to the CPUs of `role`. With `index`, e.g. of an
+        inference worker, to a single CPU of the role picked round-robin.
+        """
+        if not (self.main or self.capture or self.inference):
+            return
+        # Unpinned roles still undo a pinning inherited from the creating thread
+        cpus = getattr(self, role) or self.available
+        if index is not None and getattr(self, role):
+            cpus = {sorted(cpus)[index % len(cpus)]}
+        os.sched_setaffinity(0, cpus)
+
+    def configure_process(self, inference=False):
+        """
+        Apply the thread counts of a main / capture process, or of an inference process.
+        """
+        threads = self.inference_threads if inference else self.cv_threads
+        if threads is not None:
+            cv2.setNumThreads(threads)
+
+    def configure_children(self):
+        """
+        Cap the math library threads of inference processes started from now on.
+        """
+        if self.inference_threads is not None:
+            for name in THREAD_ENV:
+                os.environ[name] = str(self.inference_threads)
+
+    def __repr__(self):
+        return (f'Placement(main={self.main}, capture={self.capture}, inference={self.inference}, '
+                f'cv_threads={self.cv_threads}, inference_threads={self.inference_threads})')
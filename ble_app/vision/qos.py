@@ -0,0 +1,88 @@
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+QosLevel = namedtuple('QosLevel', 'model_complexity scale roi_margin fps')
+
+# Best quality first. Each step trades a little accuracy for time per frame,
+# so the delivered cursor rate degrades in small steps.
+QOS_LEVELS = (
+    QosLevel(1, 1.0, None, 30),
+    QosLevel(0, 1.0, None, 30),
+    QosLevel(0, 1.0, 0.25, 30),
+    QosLevel(0, 0.75, 0.2, 24),
+    QosLevel(0, 0.5, 0.15, 20),
+    QosLevel(0, 0.5, 0.1, 15),
+    QosLevel(0, 0.35, 0.1, 10),
+)
+
+
+class QosController:
+    """
+    Keeps the hand tracker frame latency under `target_ms` by stepping through `levels`.
+
+    The latency is smoothed with an exponential moving average. It steps to a
+    cheaper level after `down_after` consecutive frames over the target, and
+    back to a better one only after `up_after` consecutive frames under
+    `headroom * target_ms`. The gap between both thresholds and the longer wait
+    before stepping up keep it from oscillating between two levels.
+    """
+
+    def __init__(self, target_ms=40.0, levels=QOS_LEVELS, level=1, down_after=5, up_after=90, headroom=0.6, alpha=0.2):
+        self.target = target_ms / 1000
+        self.levels = levels
+        self.index = level
+        self.down_after = down_after
+        self.up_after = up_after
+        self.headroom = headroom
+        self.alpha = alpha
+        self.average = None
+        self.over = 0
+        self.under = 0
+
+    @property
+    def level(self):
+        return self.levels[self.index]
+
+    @property
+    def scale(self):
+        return self.level.scale
+
+    def observe(self, latency):
+        """
+        Record the latency of a full rate frame in seconds. Returns True when the level changed.
+        """
+        self.average = latency if self.average is None else self.average + self.alpha * (latency - self.average)
+
+        if self.average > self.target:
+            self.over, self.under = self.over + 1, 0
+            if self.over >= self.down_after and self.index < len(self.levels) - 1:
+                return self._step(1)
+        elif self.average < self.headroom * self.target:
+            self.over, self.under = 0, self.under + 1
+            if self.under >= self.up_after and self.index > 0:
+                return self._step(-1)
+        else:
+            self.over = self.under = 0
+        return False
+
+    def _step(self, direction):
+        previous = self.index
+        self.index += direction
+        self.over = self.under = 0
+        level = self.level
+        logger.info('QoS level %d -> %d (latency %.1f ms, target %.1f ms): model complexity %d, scale %.2f, '
+                    'ROI margin %s, %d fps', previous, self.index, self.average * 1000, self.target * 1000,
+                    level.model_complexity, level.scale, level.roi_margin, level.fps)
+        return True
+
+    def apply(self, tracker, duty=None):
+        """
+        Configure a tracker, and the active frame rate of a DutyCycleController, for the current level.
+        """
+        level = self.level
+        tracker.set_model_complexity(level.model_complexity)
+        tracker.roi_margin = level.roi_margin
+        if duty is not None:
+            duty.active_interval = max(duty.min_active_interval, 1.0 / level.fps)
@@ -0,0 +1,102 @@
+"""
+Latest-value cursor channel in shared memory, guarded by a seqlock.
+
+The vision process is the only writer. It bumps the sequence number to an odd
+value, writes the fields in place and bumps it again to even. Readers never
+block the writer: they retry when the sequence was odd or changed while they
+were reading. Only the latest state is kept, there is no queue.
+"""
+
+import numpy as np
+
+from multiprocessing import resource_tracker, shared_memory
+
+LANDMARK_COUNT = 21
+
+CURSOR_STATE = np.dtype([
+    ('seq', '<u4'),
+    ('clicks', '<u4'),             # incremented on every detected click, so readers can't miss one
+    ('timestamp', '<f8'),          # time.monotonic() of the frame the state was computed from
+    ('x', '<f4'),
+    ('y', '<f4'),
+    ('buttons', '<u4'),            # button bits of the last click
+    ('hand', '<u4'),               # 1 while a hand is in view
+    ('score', '<f4'),              # detection confidence of the hand, 0 ~ 1
+    ('landmarks', '<f4', (LANDMARK_COUNT, 3)),
+])
+
+
+class CursorChannel:
+    """
+    Shared memory block holding one CURSOR_STATE record.
+
+    Create it with `create=True` in the owning process and pass `name` to the
+    other process, which attaches with `CursorChannel(name)`. A process that was
+    not started by the owner (so doesn't share its resource tracker) attaches with
+    `track=False`, otherwise its tracker unlinks the block when it exits.
+    """
+
+    def __init__(self, name=None, create=False, track=True):
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=CURSOR_STATE.itemsize)
+        self.name = self.shm.name
+        self.owner = create
+        if not create and not track:
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self.state = np.ndarray((), dtype=CURSOR_STATE, buffer=self.shm.buf)
+        self.seq = np.ndarray((1,), dtype='<u4', buffer=self.shm.buf)
+        if create:
+            self.state.fill(0)
+        self.last_seq = 0
+
+    def close(self):
+        del self.state, self.seq
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def publish(self, x, y, buttons=0, hand=1, clicked=False, landmarks=None, timestamp=0.0, score=0.0):
+        state = self.state
+        seq = int(self.seq[0])
+        self.seq[0] = seq + 1
+
+        state['x'] = x
+        state['y'] = y
+        state['buttons'] = buttons
+        state['hand'] = hand
+        state['timestamp'] = timestamp
+        state['score'] = score
+        if clicked:
+            state['clicks'] += 1
+        if landmarks is not None:
+            state['landmarks'] = landmarks
+
+        self.seq[0] = seq + 2
+
+    def read(self, landmarks_out=None):
+        """
+        Returns (seq, x, y, buttons, hand, clicks, timestamp, score) of a consistent snapshot.
+        When `landmarks_out` is a (LANDMARK_COUNT, 3) float32 array it is filled in the same snapshot.
+        """
+        state, seq_view = self.state, self.seq
+        while True:
+            seq = int(seq_view[0])
+            if seq & 1:
+                continue
+
+            snapshot = (seq, float(state['x']), float(state['y']), int(state['buttons']),
+                        int(state['hand']), int(state['clicks']), float(state['timestamp']), float(state['score']))
+            if landmarks_out is not None:
+                np.copyto(landmarks_out, state['landmarks'])
+
+            if int(seq_view[0]) == seq:
+                return snapshot
+
+    def read_new(self, landmarks_out=None):
+        """
+        Like read(), but returns None when nothing was published since the last call.
+        """
+        if int(self.seq[0]) == self.last_seq:
+            return None
+        snapshot = self.read(landmarks_out)
+        self.last_seq = snapshot[0]
+        return snapshot
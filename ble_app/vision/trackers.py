@@ -0,0 +1,23 @@
+from .gesture import HandGestureTracker, PipelinedHandTracker, TwoHandTracker
+from .head import HeadPointerTracker
+
+
+def create_tracker(camera_index=0, model_complexity=0, workers=1, two_hands=False, head_pointer=False,
+                   placement=None, mapping=None, classifier=None):
+    """
+    The hand tracker for a configuration: a pool of `workers` detector processes,
+    two hand tracking, or the head pointer with hand clicks. These are exclusive.
+    `mapping` is the ScreenMapping of the camera, by default the full frame, and
+    `classifier` the GestureClassifier telling pinches, by default a threshold.
+
+    Call it from a thread pinned to the inference CPUs, the detector threads it
+    starts inherit them; the pool processes are pinned by `placement`.
+    """
+    if workers > 1:
+        return PipelinedHandTracker(camera_index, model_complexity, workers, placement=placement, mapping=mapping,
+                                    classifier=classifier)
+    if two_hands:
+        return TwoHandTracker(camera_index, model_complexity, mapping=mapping, classifier=classifier)
+    if head_pointer:
+        return HeadPointerTracker(camera_index, model_complexity, mapping=mapping, classifier=classifier)
+    return HandGestureTracker(camera_index, model_complexity, mapping=mapping, classifier=classifier)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: LGPL-2.1-or-later
+
+"""
+Standalone vision process. Runs the hand tracker and publishes the cursor state
+into a CursorChannel that the GATT server reads.
+
+    python -m ble_app.vision.worker <channel name>
+"""
+
+import argparse
+import logging
+import time
+
+import numpy as np
+
+from ..services import setup_logging
+from .calibration import ScreenMapping
+from .classifier import GestureClassifier
+from .duty_cycle import DutyCycleController
+from .qos import QosController
+from .shm_channel import CursorChannel, LANDMARK_COUNT
+from .placement import Placement
+from .trackers import create_tracker
+
+# __spec__ keeps the module name under `python -m`, where __name__ is '__main__'
+logger = logging.getLogger(__spec__.name)
+
+
+def run(channel_name, camera_index=0, stop_event=None, track=True, duty_cycle=None, qos=None, workers=1,
+        two_hands=False, head_pointer=False, placement=None, mapping=None, classifier=None, log_level=logging.INFO):
+    # A spawned process starts with logging unconfigured, records below WARNING would be lost
+    setup_logging(log_level)
+    channel = CursorChannel(channel_name, track=track)
+    duty = duty_cycle or DutyCycleController()
+    qos = qos or QosController()
+    placement = placement or Placement()
+    placement.configure_process()
+    # The detector threads inherit the affinity of the thread creating them
+    placement.pin('inference')
+    tracker = create_tracker(camera_index, qos.level.model_complexity, workers, two_hands, head_pointer, placement,
+                             mapping, classifier)
+    qos.apply(tracker, duty)
+    tracker.warm_up()
+    placement.pin('capture')
+    landmarks = np.zeros((LANDMARK_COUNT, 3), dtype=np.float32)
+
+    try:
+        while stop_event is None or not stop_event.is_set():
+            scanning = duty.scanning
+            duty.begin_frame()
+            result = tracker.update(duty.scale * qos.scale)
+            duty.end_frame(result is not None)
+            if not scanning and qos.observe(tracker.latency):
+                qos.apply(tracker, duty)
+            now = time.monotonic()
+            if result is None:
+                channel.publish(0, 0, hand=0, timestamp=now)
+            else:
+                button, x, y, landmark = result
+                for i, point in enumerate(landmark):
+                    landmarks[i] = point.x, point.y, point.z
+                channel.publish(x, y, buttons=button, clicked=button != 0, landmarks=landmarks, timestamp=now,
+                                score=tracker.score)
+                duty.cursor_sent()
+
+            time.sleep(max(0.0, duty.frame_start + duty.interval - time.monotonic()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cpu, scan, latency, worst = duty.summary()
+        logger.info('Vision worker CPU %.1f%%, %.0f%% scan frames, first cursor %.0f ms mean %.0f ms max',
+                    cpu, scan * 100, latency, worst)
+        tracker.close()
+        channel.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hand tracking vision worker')
+    parser.add_argument('channel', help='shared memory name of the cursor channel')
+    parser.add_argument('--camera', type=int, default=0, help='camera index')
+    parser.add_argument('--active-fps', type=float, default=20, help='frame rate while a hand is in view')
+    parser.add_argument('--scan-fps', type=float, default=4, help='frame rate of the presence scan without a hand')
+    parser.add_argument('--scan-scale', type=float, default=0.5, help='frame scale of the presence scan')
+    parser.add_argument('--target-latency', type=float, default=40, help='per frame processing time target in ms')
+    parser.add_argument('--workers', type=int, default=1, help='detector processes, frames are detected in parallel above 1')
+    parser.add_argument('--two-hands', action='store_true',
+                        help='track two hands, the right one points and a pinch of the left one right clicks')
+    parser.add_argument('--head-pointer', action='store_true',
+                        help='move the cursor with the head, detected on the same frames as the hand that clicks')
+    parser.add_argument('--placement', default='none',
+                        help='thread and CPU placement, a profile (none, shared, isolated) or settings such as '
+                             '"capture=1,inference=2-3,cv-threads=1,inference-threads=1"')
+    parser.add_argument('--screen-calibration',
+                        help='JSON file of the camera to screen mapping, see vision.calibration')
+    parser.add_argument('--gesture-model',
+                        help='GestureClassifier .npz file telling pinches, see vision.classifier')
+    parser.add_argument('--log-level', default='INFO', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'))
+    args = parser.parse_args()
+    if (args.workers > 1) + args.two_hands + args.head_pointer > 1:
+        parser.error('--workers, --two-hands and --head-pointer cannot be combined')
+    run(args.channel, args.camera, track=False,
+        duty_cycle=DutyCycleController(args.active_fps, args.scan_fps, args.scan_scale),
+        qos=QosController(args.target_latency), workers=args.workers, two_hands=args.two_hands,
+        head_pointer=args.head_pointer, placement=Placement.parse(args.placement),
+        mapping=ScreenMapping.load(args.screen_calibration, args.camera) if args.screen_calibration else None,
+        classifier=GestureClassifier.load(args.gesture_model) if args.gesture_model else None, log_level=args.log_level)
+
+
+if __name__ == '__main__':
+    main()